@@ -0,0 +1,253 @@
+"""
+Execution log retention and cold archive.
+
+Logs older than their owner's retention are moved out of the database
+into append-only segment files under LOG_ARCHIVE_DIR:
+
+    <user_id>/<first id>-<last id>-<unix time>.ndjson.gz
+    <user_id>/<first id>-<last id>-<unix time>.ndjson.gz.idx
+
+A segment is a series of gzip members of up to ARCHIVE_BLOCK_SIZE NDJSON
+records each, so `zcat` reads it whole while a single entry only needs
+its own block decompressed. The .idx sidecar has one NDJSON line per
+record: {"id", "time", "offset", "length"}, offset/length being the byte
+range of the gzip member that holds it. Segments are never rewritten;
+the log_archive_segments table records which ids and times each covers.
+"""
+import asyncio
+import gzip
+import json
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import IS_SQLITE, AsyncSessionLocal
+from models import ExecutionJob, ExecutionLog, LogArchiveSegment, User
+from leases import acquire_lease, renew_lease
+from config import (
+    LOG_ARCHIVE_DIR,
+    LOG_COMPACTION_BATCH_SIZE,
+    LOG_COMPACTION_INTERVAL,
+    LOG_RETENTION_DAYS,
+)
+
+LEASE_NAME = "log-compaction"
+ARCHIVE_BLOCK_SIZE = 256
+ARCHIVED_COLUMNS = [
+    "id", "workflow_id", "user_id", "status", "execution_time", "n8n_execution_id",
+    "details", "last_synced_at", "finished_at",
+]
+
+def _record(row) -> Dict:
+    record = {}
+    for name in ARCHIVED_COLUMNS:
+        value = row[name]
+        record[name] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+def write_segment(user_id: int, records: List[Dict]) -> Dict:
+    """Write one segment and its index; returns the LogArchiveSegment columns"""
+    name = f"{records[0]['id']}-{records[-1]['id']}-{int(time.time())}.ndjson.gz"
+    path = os.path.join(str(user_id), name)
+    full_path = os.path.join(LOG_ARCHIVE_DIR, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    index = []
+    with open(full_path + ".tmp", "wb") as segment:
+        for start in range(0, len(records), ARCHIVE_BLOCK_SIZE):
+            block = records[start:start + ARCHIVE_BLOCK_SIZE]
+            data = gzip.compress("".join(json.dumps(r, default=str) + "\n" for r in block).encode(), mtime=0)
+            offset = segment.tell()
+            segment.write(data)
+            index.extend(
+                {"id": r["id"], "time": r["execution_time"], "offset": offset, "length": len(data)}
+                for r in block
+            )
+        segment.flush()
+        os.fsync(segment.fileno())
+        size = segment.tell()
+    with open(full_path + ".idx.tmp", "w") as sidecar:
+        sidecar.writelines(json.dumps(entry) + "\n" for entry in index)
+        sidecar.flush()
+        os.fsync(sidecar.fileno())
+    # Index first: a segment file is only visible once it can be looked up
+    os.replace(full_path + ".idx.tmp", full_path + ".idx")
+    os.replace(full_path + ".tmp", full_path)
+
+    times = [r["execution_time"] for r in records if r["execution_time"]]
+    return {
+        "user_id": user_id,
+        "path": path,
+        "first_log_id": records[0]["id"],
+        "last_log_id": records[-1]["id"],
+        "first_time": datetime.fromisoformat(min(times)) if times else None,
+        "last_time": datetime.fromisoformat(max(times)) if times else None,
+        "entry_count": len(records),
+        "size_bytes": size
+    }
+
+def remove_segment(path: str) -> None:
+    for suffix in ("", ".idx"):
+        try:
+            os.remove(os.path.join(LOG_ARCHIVE_DIR, path + suffix))
+        except FileNotFoundError:
+            pass
+
+def read_entry(path: str, log_id: int) -> Optional[Dict]:
+    """Find one record through the sidecar index, decompressing only its block"""
+    full_path = os.path.join(LOG_ARCHIVE_DIR, path)
+    try:
+        with open(full_path + ".idx") as sidecar:
+            entry = next((e for e in map(json.loads, sidecar) if e["id"] == log_id), None)
+        if entry is None:
+            return None
+        with open(full_path, "rb") as segment:
+            segment.seek(entry["offset"])
+            block = gzip.decompress(segment.read(entry["length"]))
+    except FileNotFoundError:
+        print(f"Archive segment missing: {path}")
+        return None
+    for line in block.splitlines():
+        record = json.loads(line)
+        if record["id"] == log_id:
+            return record
+    return None
+
+def read_segment(path: str) -> List[Dict]:
+    """Every record of a segment, in log id order"""
+    try:
+        with gzip.open(os.path.join(LOG_ARCHIVE_DIR, path), "rt") as segment:
+            return [json.loads(line) for line in segment]
+    except FileNotFoundError:
+        print(f"Archive segment missing: {path}")
+        return []
+
+async def read_archived_log(db: AsyncSession, user_id: int, log_id: int) -> Optional[Dict]:
+    """An archived log as a dict, or None if no segment of the user holds it"""
+    paths = (await db.scalars(
+        select(LogArchiveSegment.path)
+        .where(
+            LogArchiveSegment.user_id == user_id,
+            LogArchiveSegment.first_log_id <= log_id,
+            LogArchiveSegment.last_log_id >= log_id
+        )
+        .order_by(LogArchiveSegment.id.desc())
+    )).all()
+    loop = asyncio.get_running_loop()
+    for path in paths:
+        record = await loop.run_in_executor(None, read_entry, path, log_id)
+        if record is not None:
+            return record
+    return None
+
+class LogCompactor:
+    """Moves logs past their retention from the database into archive segments.
+
+    Runs under a lease, so one instance compacts at a time; each batch
+    renews it first, so a long drain keeps it and a compactor that stalled
+    past it stops. Segment files are written and synced before the
+    transaction that records them and deletes the rows; if that
+    transaction fails, or deletes fewer rows than the segments hold, it is
+    rolled back and the files are removed. An orphan left by a crash is
+    harmless because nothing points to it. Runs still in the queue or not
+    yet folded into the rollups wait for the next round.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await self._acquire():
+                    while await self.compact_batch() >= LOG_COMPACTION_BATCH_SIZE:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Log compaction error: {str(e)}")
+            await asyncio.sleep(LOG_COMPACTION_INTERVAL)
+
+    async def _acquire(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=LOG_COMPACTION_INTERVAL * 3)
+
+    async def compact_batch(self) -> int:
+        """Archive up to one batch of expired logs; returns how many were archived"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            if not await renew_lease(db, LEASE_NAME, ttl=LOG_COMPACTION_INTERVAL * 3):
+                await db.rollback()
+                print("Log compaction lost its lease")
+                return 0
+            # One query per distinct retention setting; there are only a handful
+            settings = (await db.scalars(select(User.log_retention_days).distinct())).all()
+            # SQLite hands the largest rowid out again once it is deleted; keeping
+            # the newest log means an archived id is never reused
+            newest = [ExecutionLog.id < select(func.max(ExecutionLog.id)).scalar_subquery()] if IS_SQLITE else []
+            rows = []
+            for setting in settings:
+                days = LOG_RETENTION_DAYS if setting is None else setting
+                # 0 opts out of archiving (per user, or for everyone as the default)
+                if days <= 0 or len(rows) >= LOG_COMPACTION_BATCH_SIZE:
+                    continue
+                same_setting = User.log_retention_days.is_(None) if setting is None else User.log_retention_days == setting
+                rows.extend((await db.execute(
+                    select(*[ExecutionLog.__table__.c[name] for name in ARCHIVED_COLUMNS])
+                    .join(User, User.id == ExecutionLog.user_id)
+                    .where(
+                        same_setting,
+                        ExecutionLog.execution_time < now - timedelta(days=days),
+                        ExecutionLog.rollup_pending.isnot(True),
+                        *newest,
+                        ~exists().where(
+                            ExecutionJob.log_id == ExecutionLog.id,
+                            ExecutionJob.state.in_(("queued", "running"))
+                        )
+                    )
+                    .order_by(ExecutionLog.user_id, ExecutionLog.id)
+                    .limit(LOG_COMPACTION_BATCH_SIZE - len(rows))
+                )).mappings().all())
+            if not rows:
+                return 0
+
+            by_user = defaultdict(list)
+            for row in rows:
+                by_user[row["user_id"]].append(_record(row))
+            loop = asyncio.get_running_loop()
+            segments = []
+            try:
+                for user_id, records in by_user.items():
+                    segments.append(await loop.run_in_executor(None, write_segment, user_id, records))
+                ids = [row["id"] for row in rows]
+                db.add_all([LogArchiveSegment(**segment) for segment in segments])
+                # Finished queue jobs only point back at their log
+                await db.execute(delete(ExecutionJob).where(ExecutionJob.log_id.in_(ids)))
+                deleted = await db.execute(delete(ExecutionLog).where(ExecutionLog.id.in_(ids)))
+                if deleted.rowcount != len(ids):
+                    # Some rows were archived (or deleted) by someone else meanwhile
+                    raise RuntimeError(f"archived {len(ids)} log(s) but deleted {deleted.rowcount}; rolled back")
+                await db.commit()
+            except BaseException:
+                for segment in segments:
+                    remove_segment(segment["path"])
+                raise
+            print(f"Archived {len(rows)} execution log(s) into {len(segments)} segment(s)")
+            return len(rows)
+
+log_compactor = LogCompactor()
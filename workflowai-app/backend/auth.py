@@ -1,35 +1,97 @@
-from google.auth.transport import requests
-from google.oauth2 import id_token
-from google.auth.transport.requests import Request
+import asyncio
+import hashlib
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import User
-from database import get_db
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from database import get_async_db
+from cache import TTLCache
+from revocation import revocation_store
+from config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    TOKEN_CACHE_SIZE,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL_SECONDS,
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max to the configured cost flags hashes made at any other
+# cost for a rehash on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Verified tokens (keyed by token hash, kept until the token's exp) and
+# recently seen users, so authenticated requests normally skip the DB
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE)
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+class PasswordHashPool:
+    """Runs bcrypt on a small thread pool so logins don't block the event loop.
 
-def get_user(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+    bcrypt releases the GIL while hashing, so threads run in parallel.
+    Work beyond `max_pending` is refused with a 503 instead of queueing
+    without bound behind a login storm.
+    """
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = get_user(db, email)
-    if not user:
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.max_pending = max_pending
+        self.pending = 0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many logins in progress, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+password_pool = PasswordHashPool(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+async def verify_password(plain_password, hashed_password):
+    """Returns (valid, new_hash); new_hash is set when the stored hash needs upgrading"""
+    return await password_pool.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await password_pool.run(pwd_context.hash, password)
+
+async def get_user(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user(db, email)
+    if not user or not user.hashed_password:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Transparently move the stored hash to the configured cost
+        user.hashed_password = new_hash
+        invalidate_user(db, user.email)
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -38,39 +100,65 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # jti lets a single token be revoked without touching the user row
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    request: Request,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
-    # Debug: Print request details
-    print("\n=== Authentication Debug ===")
-    print(f"Request URL: {request.url}")
-    print(f"Request Method: {request.method}")
-    print("Request Headers:", dict(request.headers))
-    print("Request Cookies:", request.cookies)
-    
-    # Try to get token from Authorization header first
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _snapshot(user: User) -> User:
+    """Detached copy of the columns request handlers read"""
+    return User(
+        id=user.id,
+        email=user.email,
+        username=user.username,
+        hashed_password=user.hashed_password,
+        is_active=user.is_active,
+        is_admin=user.is_admin,
+        created_at=user.created_at,
+        log_retention_days=user.log_retention_days
+    )
+
+def invalidate_user(db: AsyncSession, email: str) -> None:
+    """Drop a cached user on every worker after logout, (de)activation, a new
+    password hash or a settings change; the caller commits"""
+    revocation_store.invalidate_user(db, email)
+
+revocation_store.user_listeners.append(_user_cache.pop)
+
+async def revoke_token(db: AsyncSession, token: str) -> Optional[str]:
+    """Revoke a token by its jti; returns the token's subject, if any"""
+    _token_cache.pop(_token_key(token))
+    try:
+        # Expired or tampered tokens still get evicted, they just need no revocation
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("jti"):
+        await revocation_store.revoke(db, payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+    return payload.get("sub")
+
+def extract_token(request: Request) -> Optional[str]:
+    """Read the bearer token from the Authorization header, cookie or query string"""
     auth_header = request.headers.get("Authorization")
     if auth_header and auth_header.startswith("Bearer "):
-        token = auth_header.split(" ")[1]
-        print("Found token in Authorization header")
-    
-    # Then try to get token from cookie
-    elif "access_token" in request.cookies:
+        return auth_header.split(" ")[1]
+    if "access_token" in request.cookies:
         cookie_token = request.cookies["access_token"]
         if cookie_token.startswith("Bearer "):
-            token = cookie_token.split(" ")[1]
-            print("Found token in access_token cookie")
-    
-    # If still no token, try to get from query parameters (for testing)
-    elif "token" in request.query_params:
-        token = request.query_params["token"]
-        print("Found token in query parameters")
+            return cookie_token.split(" ")[1]
+        return None
+    # Query parameter is accepted for testing
+    return request.query_params.get("token")
+
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> User:
+    token = extract_token(request) or token
     
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -79,37 +167,33 @@ async def get_current_user(
     )
     
     if not token:
-        print("No token found in headers, cookies, or query parameters")
         raise credentials_exception
     
-    try:
-        # Print token for debugging (only first 10 chars for security)
-        print(f"Token (first 10 chars): {token[:10]}..." if token else "No token")
-        
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            print("No email in token payload")
+    # Tokens that already passed signature verification skip the decode
+    key = _token_key(token)
+    claims = _token_cache.get(key)
+    if claims is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise credentials_exception
-            
-        print(f"Token payload: {payload}")
-    except JWTError as e:
-        print(f"JWT Error: {str(e)}")
-        raise credentials_exception
+        if payload.get("sub") is None or payload.get("jti") is None:
+            raise credentials_exception
+        claims = (payload["sub"], payload["jti"])
+        _token_cache.set(key, claims, expires_at=payload.get("exp"))
+    email, jti = claims
     
-    # Get user from database
-    user = get_user(db, email=email)
-    if user is None:
-        print(f"User not found in database: {email}")
+    if await revocation_store.is_revoked(db, jti):
         raise credentials_exception
     
-    # Verify token matches the one in the database
-    if not hasattr(user, 'token') or user.token != token:
-        print("Token does not match the one in database")
-        print(f"DB Token: {user.token[:10]}..." if hasattr(user, 'token') and user.token else "No token in database")
-        raise credentials_exception
+    user = _user_cache.get(email)
+    if user is None:
+        db_user = await get_user(db, email=email)
+        if db_user is None:
+            raise credentials_exception
+        user = _snapshot(db_user)
+        _user_cache.set(email, user)
     
-    print(f"Successfully authenticated user: {user.email}")
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
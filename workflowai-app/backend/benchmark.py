@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Compare the sync Session against AsyncSession under concurrent load.
+
+Runs the logs-page query through three handler styles on the app's own
+engines and prints requests/second and latency for each:
+
+  async+Session    async def handler calling the sync Session (blocks the loop)
+  def+Session      def handler calling the sync Session (runs on the threadpool)
+  async+AsyncSession  async def handler awaiting AsyncSession
+
+Usage:
+  python benchmark.py [--requests 2000] [--concurrency 100] [--db-latency-ms 2]
+
+Set DATABASE_URL to benchmark Postgres; the default is a scratch SQLite
+file. On SQLite, --db-latency-ms adds a per-query delay inside the
+database call to stand in for the network round trip to a real server.
+
+Once concurrency exceeds the sync pool (pool_size + max_overflow), the
+async+Session handler blocks the event loop waiting for a connection that
+only the blocked loop can release, so every such request stalls for the
+full pool timeout. --pool-timeout keeps that case short enough to measure.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./benchmark.db")
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, sessionmaker
+from database import (
+    DATABASE_URL, IS_SQLITE, Base, SessionLocal, async_engine, engine, engine_options,
+    get_async_db, set_sqlite_pragmas,
+)
+from models import ExecutionLog, User, Workflow
+
+USER_ID = 1
+
+def add_latency(ms: int, *engines) -> None:
+    """Register delay(ms) on every new SQLite connection"""
+    def sleep_ms(value):
+        time.sleep(value / 1000)
+        return 0
+
+    def register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("delay", 1, sleep_ms)
+
+    for target in engines:
+        event.listen(target, "connect", register)
+
+def seed(rows: int) -> None:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(ExecutionLog).filter(ExecutionLog.user_id == USER_ID).count() >= rows:
+            return
+        if db.get(User, USER_ID) is None:
+            db.add(User(id=USER_ID, email="bench@example.com", username="bench", hashed_password="x"))
+            db.add(Workflow(id=USER_ID, name="bench", description="", n8n_workflow_id="bench", owner_id=USER_ID))
+            db.commit()
+        db.add_all([ExecutionLog(workflow_id=USER_ID, user_id=USER_ID, status="success") for _ in range(rows)])
+        db.commit()
+    finally:
+        db.close()
+
+def build_app(latency_ms: int, sync_sessions: sessionmaker) -> FastAPI:
+    app = FastAPI()
+
+    def get_db():
+        db = sync_sessions()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def logs_query():
+        query = (
+            select(ExecutionLog)
+            .where(ExecutionLog.user_id == USER_ID)
+            .order_by(ExecutionLog.execution_time.desc())
+            .limit(20)
+        )
+        if latency_ms and IS_SQLITE:
+            # Uncorrelated subquery, so SQLite runs it once per query, not per row
+            query = query.where(select(func.delay(latency_ms)).scalar_subquery() == 0)
+        return query
+
+    @app.get("/async-sync-session")
+    async def async_sync_session(db: Session = Depends(get_db)):
+        return len(db.scalars(logs_query()).all())
+
+    @app.get("/def-sync-session")
+    def def_sync_session(db: Session = Depends(get_db)):
+        return len(db.scalars(logs_query()).all())
+
+    @app.get("/async-async-session")
+    async def async_async_session(db: AsyncSession = Depends(get_async_db)):
+        return len((await db.scalars(logs_query())).all())
+
+    return app
+
+async def run(app: FastAPI, path: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code != 200:
+                        errors += 1
+                except Exception as e:
+                    if not errors:
+                        print(f"   ❌ {path}: {type(e).__name__}: {e}")
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--db-latency-ms", type=int, default=2)
+    parser.add_argument("--pool-timeout", type=float, default=2)
+    args = parser.parse_args()
+
+    print(f"📍 Database: {engine.url.render_as_string(hide_password=True)}")
+    print(f"   {args.requests} requests, concurrency {args.concurrency}, db latency {args.db_latency_ms}ms")
+    seed(args.rows)
+    # Same settings as the app's sync engine, apart from the pool timeout
+    sync_engine = create_engine(DATABASE_URL, **{**engine_options(), "pool_timeout": args.pool_timeout})
+    if IS_SQLITE:
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+        if args.db_latency_ms:
+            add_latency(args.db_latency_ms, sync_engine, async_engine.sync_engine)
+    app = build_app(args.db_latency_ms, sessionmaker(autocommit=False, autoflush=False, bind=sync_engine))
+
+    # One event loop for every run: asyncpg/aiosqlite connections belong to the loop that opened them
+    asyncio.run(run_all(app, args.requests, args.concurrency))
+
+async def run_all(app: FastAPI, total: int, concurrency: int) -> None:
+    for path in ("/async-sync-session", "/def-sync-session", "/async-async-session"):
+        # Warm the pools before measuring
+        await run(app, path, concurrency, concurrency)
+        result = await run(app, path, total, concurrency)
+        print(
+            f"{path:<22} {result['rps']:8.1f} req/s   p50 {result['p50']:7.1f}ms"
+            f"   p99 {result['p99']:7.1f}ms   errors {result['errors']}"
+        )
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    main()
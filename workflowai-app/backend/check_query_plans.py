@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression check for the hot API and worker queries.
+
+Builds a scratch SQLite database with migration.py, runs EXPLAIN QUERY
+PLAN on each query below and exits non-zero if any of them scans a
+whole table, or sorts rows that should come off an index in order.
+
+Usage:
+  python check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Point the app at a throwaway database before anything imports database.py
+_scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+_scratch.close()
+os.environ["DATABASE_URL"] = f"sqlite:///{_scratch.name}"
+
+from sqlalchemy import func, select, text, tuple_
+from database import engine
+from migration import migrate
+from models import (
+    ExecutionJob, ExecutionLog, HourlyExecutionRollup, LogArchiveSegment, RevokedToken, Template, User, Workflow,
+    WorkflowSchedule
+)
+from templates import keyword_filter
+
+NOW = datetime(2026, 1, 1)
+# Scanning a partial index only reads the rows it covers
+PARTIAL_INDEXES = {
+    index.name
+    for table in ExecutionLog.metadata.tables.values()
+    for index in table.indexes
+    if index.dialect_options["sqlite"]["where"] is not None
+}
+TABLES = {
+    table.name
+    for table in (
+        ExecutionJob.__table__, ExecutionLog.__table__, HourlyExecutionRollup.__table__,
+        LogArchiveSegment.__table__, Template.__table__, User.__table__, Workflow.__table__,
+        WorkflowSchedule.__table__,
+    )
+}
+
+def claim_candidates():
+    rank = func.row_number().over(
+        partition_by=ExecutionJob.user_id,
+        order_by=(ExecutionJob.next_attempt_at, ExecutionJob.id)
+    ).label("rank")
+    return (
+        select(ExecutionJob.id, ExecutionJob.user_id, rank)
+        .where(ExecutionJob.state == "queued", ExecutionJob.next_attempt_at <= NOW)
+    )
+
+# (name, statement, must come off an index already ordered)
+HOT_QUERIES = [
+    ("user by email", select(User).where(User.email == "a@example.com"), False),
+    ("workflow by id and owner", select(Workflow).where(Workflow.id == 1, Workflow.owner_id == 1), False),
+    ("workflows of owner", select(Workflow).where(Workflow.owner_id == 1).limit(100), False),
+    (
+        "logs page",
+        select(ExecutionLog)
+        .where(ExecutionLog.user_id == 1)
+        .order_by(ExecutionLog.execution_time.desc(), ExecutionLog.id.desc())
+        .limit(100),
+        True
+    ),
+    (
+        "logs page after cursor",
+        select(ExecutionLog)
+        .where(ExecutionLog.user_id == 1, tuple_(ExecutionLog.execution_time, ExecutionLog.id) < tuple_(NOW, 50))
+        .order_by(ExecutionLog.execution_time.desc(), ExecutionLog.id.desc())
+        .limit(100),
+        True
+    ),
+    (
+        "logs page for one workflow",
+        select(ExecutionLog)
+        .where(ExecutionLog.user_id == 1, ExecutionLog.workflow_id == 1)
+        .order_by(ExecutionLog.execution_time.desc(), ExecutionLog.id.desc())
+        .limit(20),
+        True
+    ),
+    (
+        "workflow executions",
+        select(ExecutionLog)
+        .where(ExecutionLog.workflow_id == 1, ExecutionLog.user_id == 1)
+        .order_by(ExecutionLog.execution_time.desc())
+        .limit(20),
+        True
+    ),
+    ("log by n8n execution id", select(ExecutionLog).where(ExecutionLog.n8n_execution_id == "42"), False),
+    (
+        "reconciler due rows",
+        select(ExecutionLog.id)
+        .where(ExecutionLog.next_sync_at <= NOW)
+        .order_by(ExecutionLog.next_sync_at)
+        .limit(100),
+        True
+    ),
+    ("queue claim candidates", claim_candidates(), False),
+    (
+        "running jobs per user",
+        select(ExecutionJob.user_id, func.count(ExecutionJob.id))
+        .where(ExecutionJob.state == "running")
+        .group_by(ExecutionJob.user_id),
+        False
+    ),
+    (
+        "rollup pending runs",
+        select(ExecutionLog.id)
+        .where(ExecutionLog.rollup_pending.is_(True))
+        .order_by(ExecutionLog.id)
+        .limit(1000),
+        True
+    ),
+    (
+        "hourly rollups of user",
+        select(HourlyExecutionRollup)
+        .where(HourlyExecutionRollup.user_id == 1, HourlyExecutionRollup.bucket_start >= NOW)
+        .order_by(HourlyExecutionRollup.bucket_start),
+        True
+    ),
+    (
+        "archive segment for log id",
+        select(LogArchiveSegment.path)
+        .where(LogArchiveSegment.user_id == 1, LogArchiveSegment.first_log_id <= 50, LogArchiveSegment.last_log_id >= 50),
+        False
+    ),
+    ("templates by category", select(Template).where(Template.category == "sales").order_by(Template.id).limit(100), True),
+    ("template keyword search", select(Template).where(keyword_filter(["invoice"])).order_by(Template.id).limit(100), False),
+    ("schedules due soon", select(WorkflowSchedule.next_fire_at, WorkflowSchedule.id).where(WorkflowSchedule.next_fire_at <= NOW).order_by(WorkflowSchedule.next_fire_at).limit(20000), True),
+    ("schedules of workflow", select(WorkflowSchedule).where(WorkflowSchedule.workflow_id == 1).order_by(WorkflowSchedule.id), False),
+    ("revoked token", select(RevokedToken.expires_at).where(RevokedToken.jti == "abc"), False),
+]
+
+def plan_problems(conn, statement, ordered):
+    sql = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        words = detail.split()
+        if words[0] == "SCAN" and words[1] in TABLES and words[-1] not in PARTIAL_INDEXES:
+            problems.append(detail)
+        if ordered and "TEMP B-TREE FOR ORDER BY" in detail:
+            problems.append(detail)
+    return [row[-1] for row in rows], problems
+
+def main():
+    migrate(engine)
+    failures = 0
+    with engine.connect() as conn:
+        for name, statement, ordered in HOT_QUERIES:
+            plan, problems = plan_problems(conn, statement, ordered)
+            if problems:
+                failures += 1
+                print(f"❌ {name}")
+                for line in plan:
+                    print(f"     {line}")
+            else:
+                print(f"✅ {name}: {'; '.join(plan)}")
+    engine.dispose()
+    os.remove(_scratch.name)
+
+    if failures:
+        print(f"\n{failures} hot quer{'y' if failures == 1 else 'ies'} without a usable index")
+        sys.exit(1)
+    print("\nAll hot queries use an index")
+
+if __name__ == "__main__":
+    main()
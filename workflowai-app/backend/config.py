@@ -10,6 +10,7 @@ IS_PRODUCTION = os.getenv('VERCEL_ENV') == 'production'
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "10"))
 
 # Set redirect URI based on environment
 if IS_PRODUCTION:
@@ -21,6 +22,18 @@ else:
     GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", f"{BASE_URL}/api/auth/google/callback")
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./workflowai.db")
 
+# Database engine tuning (pool settings apply to Postgres, pragmas to SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
 # JWT Configuration
 SECRET_KEY = os.getenv("JWT_SECRET") or os.getenv("SECRET_KEY")
 if not SECRET_KEY and IS_PRODUCTION:
@@ -52,10 +65,116 @@ print(f"Base URL: {BASE_URL}")
 print(f"Google Redirect URI: {GOOGLE_REDIRECT_URI}")
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Password hashing
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "16"))
+
+# Auth caches
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+# Changes to a user reach every worker within REVOCATION_SYNC_SECONDS; the TTL is a backstop
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+# Token revocation (shared across workers through the revoked_tokens table)
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+REVOCATION_PRUNE_SECONDS = float(os.getenv("REVOCATION_PRUNE_SECONDS", "3600"))
+
 # n8n
 N8N_BASE_URL = os.getenv("N8N_BASE_URL", "http://localhost:5678")
 N8N_API_KEY = os.getenv("N8N_API_KEY", "")
+N8N_CONNECT_TIMEOUT = float(os.getenv("N8N_CONNECT_TIMEOUT", "5"))
+N8N_READ_TIMEOUT = float(os.getenv("N8N_READ_TIMEOUT", "30"))
+N8N_MAX_CONNECTIONS = int(os.getenv("N8N_MAX_CONNECTIONS", "200"))
+N8N_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("N8N_MAX_KEEPALIVE_CONNECTIONS", "50"))
+# Per-call timeouts: lookups, writes (create/update/activate/...) and synchronous runs
+N8N_LOOKUP_TIMEOUT = float(os.getenv("N8N_LOOKUP_TIMEOUT", "10"))
+N8N_WRITE_TIMEOUT = float(os.getenv("N8N_WRITE_TIMEOUT", str(N8N_READ_TIMEOUT)))
+N8N_EXECUTE_TIMEOUT = float(os.getenv("N8N_EXECUTE_TIMEOUT", "60"))
+# Idempotent calls (GET, activate/deactivate) are retried with jittered backoff
+N8N_RETRY_ATTEMPTS = int(os.getenv("N8N_RETRY_ATTEMPTS", "3"))
+N8N_RETRY_BASE_SECONDS = float(os.getenv("N8N_RETRY_BASE_SECONDS", "0.2"))
+# Consecutive failures that open the circuit, and how long it stays open before a probe
+N8N_BREAKER_FAILURE_THRESHOLD = int(os.getenv("N8N_BREAKER_FAILURE_THRESHOLD", "5"))
+N8N_BREAKER_RESET_SECONDS = float(os.getenv("N8N_BREAKER_RESET_SECONDS", "30"))
+# Calls in flight per worker; callers wait this long for a slot before a 503
+N8N_MAX_CONCURRENT = int(os.getenv("N8N_MAX_CONCURRENT", "50"))
+N8N_QUEUE_WAIT_SECONDS = float(os.getenv("N8N_QUEUE_WAIT_SECONDS", "2"))
+# Per-process cache of n8n lookups; writes made by this process invalidate it
+N8N_CACHE_SIZE = int(os.getenv("N8N_CACHE_SIZE", "1024"))
+N8N_WORKFLOW_CACHE_TTL = float(os.getenv("N8N_WORKFLOW_CACHE_TTL", "30"))
+N8N_EXECUTIONS_CACHE_TTL = float(os.getenv("N8N_EXECUTIONS_CACHE_TTL", "5"))
+N8N_EXECUTION_CACHE_TTL = float(os.getenv("N8N_EXECUTION_CACHE_TTL", "5"))
+# Shared secret n8n uses to sign execution-completion webhooks; unset turns the webhook off.
+# Never reuse JWT_SECRET here: whoever holds it can sign any user's token.
+N8N_WEBHOOK_SECRET = os.getenv("N8N_WEBHOOK_SECRET", "")
+WEBHOOK_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_FLUSH_INTERVAL", "0.5"))
+WEBHOOK_FLUSH_BATCH_SIZE = int(os.getenv("WEBHOOK_FLUSH_BATCH_SIZE", "1000"))
+WEBHOOK_BUFFER_MAX = int(os.getenv("WEBHOOK_BUFFER_MAX", "50000"))
+
+# Template catalogue cache (per process; every request checks the catalogue version in the DB)
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "256"))
+TEMPLATE_CACHE_TTL_SECONDS = float(os.getenv("TEMPLATE_CACHE_TTL_SECONDS", "300"))
+# How long a cached n8n template definition is used before it is checked again
+TEMPLATE_DEFINITION_TTL_SECONDS = float(os.getenv("TEMPLATE_DEFINITION_TTL_SECONDS", "3600"))
+
+# Bulk workflow operations: ids per request and n8n calls in flight per request
+WORKFLOW_BULK_MAX = int(os.getenv("WORKFLOW_BULK_MAX", "500"))
+WORKFLOW_BULK_CONCURRENCY = int(os.getenv("WORKFLOW_BULK_CONCURRENCY", "20"))
+# Periodic repair of is_active drift against n8n (one process at a time, under a lease)
+WORKFLOW_SYNC_INTERVAL = float(os.getenv("WORKFLOW_SYNC_INTERVAL", "600"))
+WORKFLOW_SYNC_PAGE_SIZE = int(os.getenv("WORKFLOW_SYNC_PAGE_SIZE", "250"))
+WORKFLOW_SYNC_BATCH_SIZE = int(os.getenv("WORKFLOW_SYNC_BATCH_SIZE", "500"))
+
+# Workflow schedules: one leader fires them from an in-memory heap of the next few seconds
+SCHEDULER_LEASE_TTL = float(os.getenv("SCHEDULER_LEASE_TTL", "15"))
+SCHEDULER_REFILL_SECONDS = float(os.getenv("SCHEDULER_REFILL_SECONDS", "5"))
+SCHEDULER_LOOKAHEAD_SECONDS = float(os.getenv("SCHEDULER_LOOKAHEAD_SECONDS", "30"))
+SCHEDULER_LOAD_LIMIT = int(os.getenv("SCHEDULER_LOAD_LIMIT", "20000"))
+SCHEDULER_FIRE_BATCH_SIZE = int(os.getenv("SCHEDULER_FIRE_BATCH_SIZE", "500"))
+# Occurrences later than this follow the schedule's misfire policy; fire_all replays at most SCHEDULER_MAX_CATCHUP
+SCHEDULER_MISFIRE_GRACE_SECONDS = float(os.getenv("SCHEDULER_MISFIRE_GRACE_SECONDS", "60"))
+SCHEDULER_MAX_CATCHUP = int(os.getenv("SCHEDULER_MAX_CATCHUP", "10"))
+SCHEDULES_MAX_PER_WORKFLOW = int(os.getenv("SCHEDULES_MAX_PER_WORKFLOW", "20"))
 
 # Paystack
 PAYSTACK_PUBLIC_KEY = os.getenv("PAYSTACK_PUBLIC_KEY", "")
 PAYSTACK_SECRET_KEY = os.getenv("PAYSTACK_SECRET_KEY", "")
+
+# Execution queue
+EXECUTION_WORKERS = int(os.getenv("EXECUTION_WORKERS", "20"))
+EXECUTION_MAX_PER_USER = int(os.getenv("EXECUTION_MAX_PER_USER", "5"))
+EXECUTION_MAX_ATTEMPTS = int(os.getenv("EXECUTION_MAX_ATTEMPTS", "5"))
+EXECUTION_RETRY_BASE_SECONDS = float(os.getenv("EXECUTION_RETRY_BASE_SECONDS", "2"))
+EXECUTION_RETRY_MAX_SECONDS = float(os.getenv("EXECUTION_RETRY_MAX_SECONDS", "300"))
+EXECUTION_POLL_INTERVAL = float(os.getenv("EXECUTION_POLL_INTERVAL", "1"))
+EXECUTION_VISIBILITY_TIMEOUT = float(os.getenv("EXECUTION_VISIBILITY_TIMEOUT", "300"))
+
+# Execution status reconciler
+RECONCILE_MIN_INTERVAL = float(os.getenv("RECONCILE_MIN_INTERVAL", "2"))
+RECONCILE_MAX_INTERVAL = float(os.getenv("RECONCILE_MAX_INTERVAL", "30"))
+RECONCILE_BATCH_SIZE = int(os.getenv("RECONCILE_BATCH_SIZE", "100"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "10"))
+RECONCILE_ROW_MAX_INTERVAL = float(os.getenv("RECONCILE_ROW_MAX_INTERVAL", "300"))
+
+# Execution rollups (hourly/daily buckets for charts and SLA reports)
+ROLLUP_INTERVAL = float(os.getenv("ROLLUP_INTERVAL", "60"))
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "1000"))
+
+# Execution log retention: older rows are compacted into gzip NDJSON segments
+# under LOG_ARCHIVE_DIR (shared storage when running several instances).
+# Users can override the retention; 0 keeps logs in the database forever.
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "./archive")
+LOG_COMPACTION_INTERVAL = float(os.getenv("LOG_COMPACTION_INTERVAL", "3600"))
+LOG_COMPACTION_BATCH_SIZE = int(os.getenv("LOG_COMPACTION_BATCH_SIZE", "1000"))
+LOG_EXPORT_CHUNK_SIZE = int(os.getenv("LOG_EXPORT_CHUNK_SIZE", "1000"))
+
+# Live execution updates (Server-Sent Events)
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "100"))
+LIVE_MAX_STREAMS_PER_USER = int(os.getenv("LIVE_MAX_STREAMS_PER_USER", "10"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_POLL_INTERVAL = float(os.getenv("LIVE_POLL_INTERVAL", "0.5"))
+LIVE_OUTBOX_RETENTION_SECONDS = float(os.getenv("LIVE_OUTBOX_RETENTION_SECONDS", "60"))
@@ -1,10 +1,90 @@
-from sqlalchemy import create_engine
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from config import (
+    DATABASE_URL,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_SYNCHRONOUS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_MMAP_SIZE,
+)
+
+def normalize_database_url(url: str) -> str:
+    # Vercel/Heroku hand out postgres:// URLs, which SQLAlchemy no longer accepts;
+    # pin the driver so the URL means the same thing on every SQLAlchemy version
+    for prefix in ("postgres://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+psycopg2://" + url[len(prefix):]
+    return url
+
+DATABASE_URL = normalize_database_url(DATABASE_URL)
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
+
+def async_database_url(url: str):
+    """The same database through its asyncio driver (aiosqlite / asyncpg)"""
+    url = make_url(url)
+    if IS_SQLITE:
+        return url.set(drivername="sqlite+aiosqlite")
+    # asyncpg takes ssl=<mode> rather than libpq's sslmode query parameter
+    return url.set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+
+def engine_options(is_async: bool = False) -> dict:
+    """Backend-specific create_engine() arguments"""
+    if IS_SQLITE:
+        connect_args = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if not is_async:
+            connect_args["check_same_thread"] = False
+        return {"connect_args": connect_args}
+    connect_args = {}
+    if is_async:
+        sslmode = make_url(DATABASE_URL).query.get("sslmode")
+        if sslmode and sslmode != "disable":
+            connect_args["ssl"] = sslmode
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    elif DB_STATEMENT_TIMEOUT_MS:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": connect_args
+    }
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout makes
+    writers wait for the lock instead of failing with "database is locked"."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+# Sync engine for scripts, migrations and schema creation
+engine = create_engine(DATABASE_URL, **engine_options())
+# Async engine used by the API and the background workers
+async_engine = create_async_engine(async_database_url(DATABASE_URL), **engine_options(is_async=True))
+if IS_SQLITE:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: handlers return ORM objects after committing, and
+# an expired attribute cannot be lazily reloaded outside an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -14,3 +94,36 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """DateTime columns hold naive UTC; convert an aware value (e.g. a ...Z query parameter) to match"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def engine_settings() -> dict:
+    """Effective engine settings, read back from a live connection"""
+    settings = {
+        "backend": engine.dialect.name,
+        "url": engine.url.render_as_string(hide_password=True),
+        "async_driver": async_engine.dialect.driver,
+        "pool": type(engine.pool).__name__
+    }
+    with engine.connect() as conn:
+        if IS_SQLITE:
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size"):
+                settings[pragma] = conn.execute(text(f"PRAGMA {pragma}")).scalar()
+        else:
+            settings.update({
+                "pool_size": engine.pool.size(),
+                "max_overflow": DB_MAX_OVERFLOW,
+                "pool_timeout": DB_POOL_TIMEOUT,
+                "pool_recycle": DB_POOL_RECYCLE,
+                "pool_pre_ping": DB_POOL_PRE_PING,
+                "statement_timeout": conn.execute(text("SHOW statement_timeout")).scalar()
+            })
+    return settings
@@ -0,0 +1,271 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update, func
+from database import AsyncSessionLocal
+from models import ExecutionJob, ExecutionLog, Workflow
+from n8n_service import n8n
+from resilience import HALF_OPEN, OPEN
+from leases import WORKER_ID
+from config import (
+    EXECUTION_WORKERS,
+    EXECUTION_MAX_PER_USER,
+    EXECUTION_MAX_ATTEMPTS,
+    EXECUTION_RETRY_BASE_SECONDS,
+    EXECUTION_RETRY_MAX_SECONDS,
+    EXECUTION_POLL_INTERVAL,
+    EXECUTION_VISIBILITY_TIMEOUT,
+)
+
+def _retryable(error: Exception) -> bool:
+    """Whether a failed run may be sent again: n8n 5xx/429 or unreachable, and
+    503s from the circuit breaker or load shedding. n8n refusing the run (a
+    4xx, e.g. an unknown workflow) would only fail the same way again, and
+    after a timeout or a dropped connection n8n may already be running it;
+    /execute isn't idempotent, so those are not retried."""
+    if not isinstance(error, HTTPException):
+        return False
+    upstream_status = getattr(error, "upstream_status", None)
+    if upstream_status is not None:
+        return upstream_status >= 500 or upstream_status == 429
+    if getattr(error, "maybe_received", False):
+        return False
+    return error.status_code >= 500
+
+class ExecutionQueue:
+    """DB-backed queue of workflow runs drained by a bounded pool of workers.
+
+    Every gunicorn worker runs one dispatcher; rows are claimed with a
+    conditional UPDATE so a job is only ever picked up by one of them.
+    """
+
+    def __init__(self, concurrency: int = EXECUTION_WORKERS):
+        self.concurrency = concurrency
+        self.worker_id = WORKER_ID
+        self._in_flight: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    async def enqueue(self, db, workflow: Workflow, user_id: int, execution_data: Optional[Dict] = None) -> ExecutionLog:
+        """Create the execution log and its queued job (the caller commits)"""
+        return (await self.enqueue_many(db, [(workflow.id, user_id, execution_data)]))[0]
+
+    async def enqueue_many(self, db, runs: List[Tuple[int, int, Optional[Dict]]]) -> List[ExecutionLog]:
+        """enqueue for many (workflow_id, user_id, execution_data) runs, in two batched flushes"""
+        logs = [ExecutionLog(workflow_id=workflow_id, user_id=user_id, status="queued") for workflow_id, user_id, _ in runs]
+        db.add_all(logs)
+        await db.flush()
+        db.add_all([
+            ExecutionJob(log_id=log.id, workflow_id=workflow_id, user_id=user_id, payload=execution_data or {})
+            for log, (workflow_id, user_id, execution_data) in zip(logs, runs)
+        ])
+        return logs
+
+    async def discard(self, db, workflow_ids: List[int]) -> None:
+        """Delete the jobs of workflows that are being deleted and cancel their
+        queued runs (the caller commits). Runs a worker already claimed are
+        left for it to finish recording."""
+        # Deleting with state='queued' takes each job from the dispatcher atomically
+        queued = (await db.execute(
+            delete(ExecutionJob)
+            .where(ExecutionJob.workflow_id.in_(workflow_ids), ExecutionJob.state == "queued")
+            .returning(ExecutionJob.log_id)
+        )).scalars().all()
+        for log in (await db.scalars(select(ExecutionLog).where(ExecutionLog.id.in_(queued)))).all():
+            log.status = "canceled"
+            log.details = {"error": "Workflow deleted"}
+        await db.execute(delete(ExecutionJob).where(ExecutionJob.workflow_id.in_(workflow_ids)))
+
+    def notify(self) -> None:
+        """Wake the local dispatcher after new jobs were committed"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def stop(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        # Let runs that already reached n8n record their outcome
+        if self._in_flight:
+            await asyncio.wait(self._in_flight, timeout=EXECUTION_VISIBILITY_TIMEOUT)
+
+    async def _dispatch_loop(self) -> None:
+        last_recovery = datetime.min
+        while True:
+            try:
+                if datetime.utcnow() - last_recovery > timedelta(seconds=EXECUTION_VISIBILITY_TIMEOUT / 2):
+                    await self._requeue_stale()
+                    last_recovery = datetime.utcnow()
+
+                free = self.concurrency - len(self._in_flight)
+                # Don't spend attempts on runs n8n would refuse; half-open lets one probe through
+                if n8n.breaker.state == OPEN:
+                    free = 0
+                elif n8n.breaker.state == HALF_OPEN:
+                    free = min(free, 1)
+                if free > 0:
+                    for job_id in await self._claim(free):
+                        task = asyncio.create_task(self._run(job_id))
+                        self._in_flight.add(task)
+                        task.add_done_callback(self._on_done)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Execution queue dispatcher error: {str(e)}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=EXECUTION_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        # A slot just freed up; pick up more work without waiting for the poll
+        self.notify()
+
+    async def _claim(self, limit: int) -> list:
+        """Claim up to `limit` due jobs, round-robin across users"""
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            running = dict((await db.execute(
+                select(ExecutionJob.user_id, func.count(ExecutionJob.id))
+                .where(ExecutionJob.state == "running")
+                .group_by(ExecutionJob.user_id)
+            )).all())
+
+            # Rank each user's due jobs so the first pass takes every user's
+            # oldest job before anyone gets a second one
+            rank = func.row_number().over(
+                partition_by=ExecutionJob.user_id,
+                order_by=(ExecutionJob.next_attempt_at, ExecutionJob.id)
+            ).label("rank")
+            due = (
+                select(ExecutionJob.id, ExecutionJob.user_id, ExecutionJob.next_attempt_at, rank)
+                .where(ExecutionJob.state == "queued", ExecutionJob.next_attempt_at <= now)
+                .subquery()
+            )
+            candidates = (await db.execute(
+                select(due.c.id, due.c.user_id)
+                .where(due.c.rank <= EXECUTION_MAX_PER_USER)
+                .order_by(due.c.rank, due.c.next_attempt_at, due.c.id)
+                .limit(limit * 4)
+            )).all()
+
+            claimed = []
+            for job_id, user_id in candidates:
+                if len(claimed) >= limit:
+                    break
+                if running.get(user_id, 0) >= EXECUTION_MAX_PER_USER:
+                    continue
+                result = await db.execute(
+                    update(ExecutionJob)
+                    .where(ExecutionJob.id == job_id, ExecutionJob.state == "queued")
+                    .values(
+                        state="running",
+                        locked_by=self.worker_id,
+                        locked_at=now,
+                        attempts=ExecutionJob.attempts + 1
+                    )
+                )
+                if result.rowcount == 1:
+                    claimed.append(job_id)
+                    running[user_id] = running.get(user_id, 0) + 1
+            await db.commit()
+            return claimed
+
+    async def _requeue_stale(self) -> None:
+        """Return jobs whose worker died mid-run to the queue.
+
+        Every claim counted an attempt, so a job that keeps outliving its
+        worker (or EXECUTION_VISIBILITY_TIMEOUT) goes dead like one that
+        keeps failing.
+        """
+        async with AsyncSessionLocal() as db:
+            cutoff = datetime.utcnow() - timedelta(seconds=EXECUTION_VISIBILITY_TIMEOUT)
+            stale = (ExecutionJob.state == "running", ExecutionJob.locked_at < cutoff)
+            error = f"Worker stopped responding on all {EXECUTION_MAX_ATTEMPTS} attempts"
+            dead_log_ids = (await db.execute(
+                update(ExecutionJob)
+                .where(*stale, ExecutionJob.attempts >= EXECUTION_MAX_ATTEMPTS)
+                .values(state="dead", last_error=error, locked_by=None, locked_at=None)
+                .returning(ExecutionJob.log_id)
+            )).scalars().all()
+            await db.execute(
+                update(ExecutionJob)
+                .where(*stale)
+                .values(state="queued", locked_by=None, locked_at=None)
+            )
+            # Through the ORM so the stats and rollup hooks see the failure
+            for log in await db.scalars(select(ExecutionLog).where(ExecutionLog.id.in_(dead_log_ids))):
+                log.status = "failed"
+                log.details = {"error": error}
+            await db.commit()
+
+    async def _load(self, job_id: int):
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ExecutionJob, job_id)
+            if job is None:
+                # Deleted along with its workflow
+                return None, None, None
+            workflow = await db.get(Workflow, job.workflow_id)
+            return (workflow.n8n_workflow_id if workflow else None), job.payload, job.log_id
+
+    async def _run(self, job_id: int) -> None:
+        n8n_workflow_id, payload, log_id = await self._load(job_id)
+        if n8n_workflow_id is None:
+            await self._fail(job_id, log_id, "Workflow no longer exists", False)
+            return
+        try:
+            execution = await n8n.execute_workflow(n8n_workflow_id, payload)
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            await self._fail(job_id, log_id, detail, _retryable(e))
+            return
+        await self._complete(job_id, log_id, execution)
+
+    async def _complete(self, job_id: int, log_id: Optional[int], execution: Dict) -> None:
+        async with AsyncSessionLocal() as db:
+            # Plain UPDATEs: the job is gone if its workflow was deleted mid-run,
+            # and the run still gets recorded on its log
+            await db.execute(update(ExecutionJob).where(ExecutionJob.id == job_id).values(state="done", last_error=None))
+            log = await db.get(ExecutionLog, log_id) if log_id is not None else None
+            if log is not None:
+                log.status = "started"
+                if execution.get("id") is not None:
+                    log.n8n_execution_id = str(execution["id"])
+                    # Hand the run over to the status reconciler
+                    log.next_sync_at = datetime.utcnow()
+                log.details = execution
+            await db.commit()
+
+    async def _fail(self, job_id: int, log_id: Optional[int], error: str, retryable: bool) -> None:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(ExecutionJob, job_id)
+            values = {"state": "dead", "last_error": error, "locked_by": None, "locked_at": None}
+            if job is not None and retryable and job.attempts < EXECUTION_MAX_ATTEMPTS:
+                # Exponential backoff with jitter so retries of a burst spread out
+                delay = min(EXECUTION_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1), EXECUTION_RETRY_MAX_SECONDS)
+                delay = delay / 2 + random.uniform(0, delay / 2)
+                values.update(state="queued", next_attempt_at=datetime.utcnow() + timedelta(seconds=delay))
+            requeued = (await db.execute(
+                update(ExecutionJob).where(ExecutionJob.id == job_id).values(**values).returning(ExecutionJob.id)
+            )).first() is not None and values["state"] == "queued"
+            if not requeued:
+                log = await db.get(ExecutionLog, log_id) if log_id is not None else None
+                if log is not None:
+                    log.status = "failed"
+                    log.details = {"error": error}
+            await db.commit()
+
+execution_queue = ExecutionQueue()
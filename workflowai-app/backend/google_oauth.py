@@ -0,0 +1,138 @@
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+import httpx
+from jose import JWTError, jwt
+from fastapi import HTTPException
+from config import (
+    GOOGLE_CLIENT_ID,
+    GOOGLE_CLIENT_SECRET,
+    GOOGLE_REDIRECT_URI,
+    GOOGLE_HTTP_TIMEOUT,
+)
+
+DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+DEFAULT_KEYS_TTL = 3600
+REFRESH_RETRY_SECONDS = 60
+# Unknown kids may trigger an early refresh at most this often
+MIN_REFRESH_INTERVAL = 30
+
+def _max_age(response: httpx.Response) -> float:
+    match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+    return float(match.group(1)) if match else DEFAULT_KEYS_TTL
+
+class GoogleOAuthClient:
+    """Google sign-in over a pooled async client.
+
+    The discovery document and signing keys are cached for as long as
+    Google's Cache-Control allows and refreshed in the background, so a
+    login costs one token exchange plus a local ID-token check.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._discovery: Optional[Dict] = None
+        self._keys: Dict[str, Dict] = {}
+        self._keys_expire_at = 0.0
+        self._last_refresh = 0.0
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=GOOGLE_HTTP_TIMEOUT)
+        return self._client
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh_keys()
+                # Refresh a little before Google rotates the cached keys
+                delay = max(self._keys_expire_at - time.time() - 60, REFRESH_RETRY_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Google key refresh failed: {str(e)}")
+                delay = REFRESH_RETRY_SECONDS
+            await asyncio.sleep(delay)
+
+    async def _get_discovery(self) -> Dict:
+        if self._discovery is None:
+            response = await self.client.get(DISCOVERY_URL)
+            response.raise_for_status()
+            self._discovery = response.json()
+        return self._discovery
+
+    async def refresh_keys(self) -> None:
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            discovery = await self._get_discovery()
+            response = await self.client.get(discovery["jwks_uri"])
+            response.raise_for_status()
+            self._keys = {key["kid"]: key for key in response.json().get("keys", [])}
+            self._keys_expire_at = time.time() + _max_age(response)
+            self._last_refresh = time.time()
+
+    async def exchange_code(self, code: str) -> Dict:
+        """Trade an authorization code for Google's tokens"""
+        discovery = await self._get_discovery()
+        response = await self.client.post(discovery["token_endpoint"], data={
+            "code": code,
+            "client_id": GOOGLE_CLIENT_ID,
+            "client_secret": GOOGLE_CLIENT_SECRET,
+            "redirect_uri": GOOGLE_REDIRECT_URI,
+            "grant_type": "authorization_code"
+        })
+        if response.is_error:
+            raise HTTPException(status_code=400, detail=f"Failed to get access token: {response.text}")
+        return response.json()
+
+    async def verify_id_token(self, id_token: str, access_token: Optional[str] = None) -> Dict:
+        """Verify an ID token's signature and claims against the cached keys"""
+        try:
+            kid = jwt.get_unverified_header(id_token).get("kid")
+        except JWTError:
+            raise HTTPException(status_code=400, detail="Malformed ID token")
+        stale = time.time() >= self._keys_expire_at
+        if stale or (kid not in self._keys and time.time() - self._last_refresh > MIN_REFRESH_INTERVAL):
+            # Unknown kid usually means Google rotated keys since the last refresh
+            await self.refresh_keys()
+        key = self._keys.get(kid)
+        if key is None:
+            raise HTTPException(status_code=400, detail="ID token signed with an unknown key")
+
+        try:
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=GOOGLE_CLIENT_ID,
+                issuer=GOOGLE_ISSUERS,
+                access_token=access_token
+            )
+        except JWTError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid ID token: {str(e)}")
+        if not claims.get("email") or not claims.get("email_verified"):
+            raise HTTPException(status_code=400, detail="Google account email is not verified")
+        return claims
+
+google_oauth = GoogleOAuthClient()
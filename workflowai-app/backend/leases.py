@@ -0,0 +1,53 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from models import Lease
+
+# Identifies this process when claiming jobs or holding leases
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+async def acquire_lease(db, name: str, ttl: float, holder: str = WORKER_ID) -> bool:
+    """Take or renew the named lease; True if this process now holds it"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl)
+    result = await db.execute(
+        update(Lease)
+        .where(Lease.name == name, or_(Lease.holder == holder, Lease.expires_at < now))
+        .values(holder=holder, expires_at=expires_at)
+    )
+    if result.rowcount == 1:
+        await db.commit()
+        return True
+
+    # Either nobody has created the lease yet or another process holds it
+    try:
+        db.add(Lease(name=name, holder=holder, expires_at=expires_at))
+        await db.commit()
+        return True
+    except IntegrityError:
+        await db.rollback()
+        return False
+
+async def release_lease(db, name: str, holder: str = WORKER_ID) -> None:
+    await db.execute(
+        update(Lease)
+        .where(Lease.name == name, Lease.holder == holder)
+        .values(expires_at=datetime.utcnow())
+    )
+    await db.commit()
+
+async def renew_lease(db, name: str, ttl: float, holder: str = WORKER_ID) -> bool:
+    """Extend a lease this process still holds, inside the caller's transaction.
+
+    Run it first in a transaction that acts as the leader: the write proves
+    the lease was not taken over and, until the commit, keeps a successor
+    from taking it (row lock on PostgreSQL, write lock on SQLite).
+    """
+    result = await db.execute(
+        update(Lease)
+        .where(Lease.name == name, Lease.holder == holder)
+        .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl))
+    )
+    return result.rowcount == 1
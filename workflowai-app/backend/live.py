@@ -0,0 +1,209 @@
+"""
+Live execution updates pushed to the dashboard and builder over SSE.
+
+Writers publish an event for every new execution log and status change
+inside their own transaction, so nothing is announced that later rolls
+back. On Postgres that is a pg_notify on CHANNEL, which every worker
+receives on its LISTEN connection at commit. SQLite has no NOTIFY, so
+events go to the execution_event_outbox table, which each worker polls.
+
+Each worker fans events out to the open streams of the owning user.
+Every stream has a bounded queue; a client that falls behind has its
+backlog dropped and gets a single `resync` event telling it to refetch.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+from database import IS_SQLITE, AsyncSessionLocal, async_engine
+from models import ExecutionEventOutbox, ExecutionLog, User
+from auth import get_current_active_user
+from config import (
+    LIVE_HEARTBEAT_SECONDS,
+    LIVE_MAX_STREAMS_PER_USER,
+    LIVE_OUTBOX_RETENTION_SECONDS,
+    LIVE_POLL_INTERVAL,
+    LIVE_QUEUE_SIZE,
+)
+
+router = APIRouter()
+
+CHANNEL = "execution_events"
+RESYNC = {"type": "resync"}
+
+def execution_event(log_id, workflow_id, user_id, status, execution_time, previous_status=None) -> Dict:
+    return {
+        "type": "execution",
+        "id": log_id,
+        "workflow_id": workflow_id,
+        "user_id": user_id,
+        "status": status,
+        "previous_status": previous_status,
+        "execution_time": execution_time.isoformat() if isinstance(execution_time, datetime) else execution_time
+    }
+
+def publish_execution_events(conn, events: List[Dict]) -> None:
+    """Queue events for delivery when the transaction on `conn` commits"""
+    events = [e for e in events if e["user_id"] is not None]
+    if not events:
+        return
+    if conn.dialect.name == "postgresql":
+        for e in events:
+            conn.execute(select(func.pg_notify(CHANNEL, json.dumps(e))))
+    else:
+        now = datetime.utcnow()
+        conn.execute(
+            insert(ExecutionEventOutbox),
+            [{"user_id": e["user_id"], "payload": e, "created_at": now} for e in events]
+        )
+
+@event.listens_for(Session, "after_flush")
+def _publish_changes(session, flush_context):
+    """Announce logs created or moved to another status through the ORM"""
+    events = []
+    for obj in session.new:
+        if isinstance(obj, ExecutionLog):
+            events.append(execution_event(obj.id, obj.workflow_id, obj.user_id, obj.status, obj.execution_time))
+    for obj in session.dirty:
+        if isinstance(obj, ExecutionLog):
+            history = inspect(obj).attrs.status.history
+            if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                events.append(execution_event(
+                    obj.id, obj.workflow_id, obj.user_id, obj.status, obj.execution_time,
+                    previous_status=history.deleted[0]
+                ))
+    if events:
+        publish_execution_events(session.connection(), events)
+
+class Subscriber:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_QUEUE_SIZE)
+
+    def put(self, item: Dict) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and have the client refetch
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+class ExecutionHub:
+    """Delivers execution events from every worker to this worker's open streams"""
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscriber]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, user_id: int) -> Subscriber:
+        if len(self._subscribers[user_id]) >= LIVE_MAX_STREAMS_PER_USER:
+            raise HTTPException(status_code=429, detail="Too many open live streams")
+        subscriber = Subscriber(user_id)
+        self._subscribers[user_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscribers = self._subscribers.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.user_id]
+
+    def dispatch(self, item: Dict) -> None:
+        for subscriber in list(self._subscribers.get(item.get("user_id"), ())):
+            subscriber.put(item)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._poll() if IS_SQLITE else self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with async_engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    await raw.driver_connection.add_listener(
+                        CHANNEL, lambda connection, pid, channel, payload: self.dispatch(json.loads(payload))
+                    )
+                    # Events missed while reconnecting are recovered by a resync
+                    for subscribers in list(self._subscribers.values()):
+                        for subscriber in list(subscribers):
+                            subscriber.put(RESYNC)
+                    await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Live update listener error: {str(e)}")
+                await asyncio.sleep(LIVE_POLL_INTERVAL * 10)
+
+    async def _poll(self) -> None:
+        last_id = None
+        last_prune = datetime.utcnow()
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    if last_id is None:
+                        last_id = await db.scalar(select(func.max(ExecutionEventOutbox.id))) or 0
+                    rows = (await db.execute(
+                        select(ExecutionEventOutbox.id, ExecutionEventOutbox.payload)
+                        .where(ExecutionEventOutbox.id > last_id)
+                        .order_by(ExecutionEventOutbox.id)
+                    )).all()
+                    for row in rows:
+                        self.dispatch(row.payload)
+                        last_id = row.id
+
+                    now = datetime.utcnow()
+                    if now - last_prune > timedelta(seconds=LIVE_OUTBOX_RETENTION_SECONDS):
+                        await db.execute(delete(ExecutionEventOutbox).where(
+                            ExecutionEventOutbox.created_at < now - timedelta(seconds=LIVE_OUTBOX_RETENTION_SECONDS)
+                        ))
+                        await db.commit()
+                        last_prune = now
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Live update poll error: {str(e)}")
+            await asyncio.sleep(LIVE_POLL_INTERVAL)
+
+execution_hub = ExecutionHub()
+
+@router.get("/executions/stream")
+async def stream_executions(request: Request, current_user: User = Depends(get_current_active_user)):
+    """Server-Sent Events: `execution` for new logs and status changes, `resync` to refetch"""
+    subscriber = execution_hub.subscribe(current_user.id)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    item = await asyncio.wait_for(subscriber.queue.get(), LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {item['type']}\ndata: {json.dumps(item)}\n\n"
+        finally:
+            execution_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,42 +1,295 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from models import ExecutionLog, User
-from database import get_db
-from auth import get_current_active_user
-from pydantic import BaseModel
+import asyncio
+import base64
+import csv
+import io
+import json
+import zlib
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, or_, select, tuple_, literal, update, DateTime, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Tuple
+from models import ExecutionLog, LogArchiveSegment, User
+from database import AsyncSessionLocal, get_async_db, naive_utc
+from auth import get_current_active_user, invalidate_user
+from archive import read_archived_log, read_segment
+from config import LOG_EXPORT_CHUNK_SIZE, LOG_RETENTION_DAYS
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 router = APIRouter()
 
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(log: ExecutionLog) -> str:
+    raw = f"{log.execution_time.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        execution_time, log_id = raw.split("|")
+        return datetime.fromisoformat(execution_time), int(log_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 class LogResponse(BaseModel):
     id: int
-    workflow_id: int
+    workflow_id: Optional[int] = None  # None once the workflow was deleted
     status: str
     execution_time: datetime
-    details: str
+    n8n_execution_id: Optional[str] = None
+    details: Optional[Any] = None
+    last_synced_at: Optional[datetime] = None
     
     class Config:
         orm_mode = True
 
+def _filters(workflow_id, status, since, until) -> list:
+    conditions = []
+    if workflow_id is not None:
+        conditions.append(ExecutionLog.workflow_id == workflow_id)
+    if status is not None:
+        conditions.append(ExecutionLog.status == status)
+    if since is not None:
+        conditions.append(ExecutionLog.execution_time >= since)
+    if until is not None:
+        conditions.append(ExecutionLog.execution_time < until)
+    return conditions
+
 @router.get("/logs/", response_model=List[LogResponse])
-def read_logs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
-    logs = (
-        db.query(ExecutionLog)
-        .filter(ExecutionLog.user_id == current_user.id)
-        .order_by(ExecutionLog.execution_time.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+async def read_logs(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    workflow_id: Optional[int] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Newest logs first. When more may follow, the X-Next-Cursor header
+    holds the value to pass as `cursor` for the next page."""
+    query = select(ExecutionLog).where(
+        ExecutionLog.user_id == current_user.id,
+        *_filters(workflow_id, status, naive_utc(since), naive_utc(until))
     )
+    if cursor is not None:
+        # Seek past the last row of the previous page instead of counting rows with OFFSET
+        last_time, last_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(ExecutionLog.execution_time, ExecutionLog.id)
+            < tuple_(literal(last_time, DateTime), literal(last_id, Integer))
+        )
+
+    logs = (await db.scalars(
+        query.order_by(ExecutionLog.execution_time.desc(), ExecutionLog.id.desc()).limit(limit)
+    )).all()
+    if len(logs) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(logs[-1])
     return logs
 
+EXPORT_FORMATS = {"ndjson": ("application/x-ndjson", "ndjson"), "csv": ("text/csv", "csv")}
+EXPORT_COLUMNS = [
+    "id", "workflow_id", "status", "execution_time", "finished_at", "last_synced_at",
+    "n8n_execution_id", "details", "cursor",
+]
+
+def encode_export_cursor(*parts) -> str:
+    return base64.urlsafe_b64encode("|".join(map(str, parts)).encode()).decode()
+
+def decode_export_cursor(cursor: str) -> Tuple[str, List[int]]:
+    """("d", [log_id]) while in the database, ("a", [bound, segment_id, log_id]) in the archive"""
+    try:
+        phase, *numbers = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        numbers = [int(number) for number in numbers]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (phase, len(numbers)) not in (("d", 1), ("a", 3)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return phase, numbers
+
+def _export_row(record, cursor: str) -> Dict:
+    row = {}
+    for name in EXPORT_COLUMNS[:-1]:
+        value = record[name]
+        row[name] = value.isoformat() if isinstance(value, datetime) else value
+    row["cursor"] = cursor
+    return row
+
+def _archived_match(record: Dict, workflow_id, status, since, until) -> bool:
+    """The _filters conditions, applied to an archived record"""
+    if workflow_id is not None and record["workflow_id"] != workflow_id:
+        return False
+    if status is not None and record["status"] != status:
+        return False
+    if since is not None or until is not None:
+        if not record["execution_time"]:
+            return False
+        execution_time = datetime.fromisoformat(record["execution_time"])
+        if since is not None and execution_time < since:
+            return False
+        if until is not None and execution_time >= until:
+            return False
+    return True
+
+async def _export_rows(user_id: int, cursor: Tuple[str, List[int]], workflow_id, status, since, until) -> AsyncIterator[List[Dict]]:
+    """Chunks of at most LOG_EXPORT_CHUNK_SIZE rows: database rows by id, then archived ones.
+
+    The database phase reads one server-side cursor. The archive bound is
+    read after that cursor opens, so a log compacted meanwhile is either
+    still in the cursor's snapshot or in a segment up to the bound; later
+    segments only hold logs already exported, and are skipped.
+    """
+    phase, numbers = cursor
+    if phase == "d":
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                select(*[ExecutionLog.__table__.c[name] for name in EXPORT_COLUMNS[:-1]])
+                .where(
+                    ExecutionLog.user_id == user_id,
+                    ExecutionLog.id > numbers[0],
+                    *_filters(workflow_id, status, since, until)
+                )
+                .order_by(ExecutionLog.id)
+                .execution_options(yield_per=LOG_EXPORT_CHUNK_SIZE)
+            )
+            bound = await db.scalar(
+                select(func.max(LogArchiveSegment.id)).where(LogArchiveSegment.user_id == user_id)
+            ) or 0
+            async for chunk in result.mappings().partitions():
+                yield [_export_row(row, encode_export_cursor("d", row["id"])) for row in chunk]
+        numbers = [bound, 0, 0]
+
+    bound, segment_id, after_id = numbers
+    loop = asyncio.get_running_loop()
+    while True:
+        query = select(LogArchiveSegment).where(
+            LogArchiveSegment.user_id == user_id,
+            LogArchiveSegment.id >= segment_id,
+            LogArchiveSegment.id <= bound
+        )
+        if since is not None:
+            query = query.where(or_(LogArchiveSegment.last_time.is_(None), LogArchiveSegment.last_time >= since))
+        if until is not None:
+            query = query.where(or_(LogArchiveSegment.first_time.is_(None), LogArchiveSegment.first_time < until))
+        async with AsyncSessionLocal() as db:
+            segment = await db.scalar(query.order_by(LogArchiveSegment.id).limit(1))
+        if segment is None:
+            return
+        records = await loop.run_in_executor(None, read_segment, segment.path)
+        rows = [
+            _export_row(record, encode_export_cursor("a", bound, segment.id, record["id"]))
+            for record in records
+            if (segment.id != segment_id or record["id"] > after_id)
+            and _archived_match(record, workflow_id, status, since, until)
+        ]
+        for start in range(0, len(rows), LOG_EXPORT_CHUNK_SIZE):
+            yield rows[start:start + LOG_EXPORT_CHUNK_SIZE]
+        segment_id, after_id = segment.id + 1, 0
+
+async def _encode(chunks: AsyncIterator[List[Dict]], format: str, header: bool) -> AsyncIterator[bytes]:
+    if format == "csv" and header:
+        yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+    async for rows in chunks:
+        if format == "ndjson":
+            yield "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
+            continue
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        for row in rows:
+            details = row["details"]
+            writer.writerow({**row, "details": "" if details is None else json.dumps(details, default=str)})
+        yield buffer.getvalue().encode()
+
+async def _gzip(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+@router.get("/logs/export")
+async def export_logs(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    cursor: Optional[str] = None,
+    workflow_id: Optional[int] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Stream the user's whole execution history, archived logs included.
+
+    Every row carries a `cursor`; after an interrupted download, pass the
+    last one received to continue right after it. Memory use is bounded
+    by LOG_EXPORT_CHUNK_SIZE rows whatever the size of the history.
+    """
+    position = decode_export_cursor(cursor) if cursor else ("d", [0])
+    media_type, extension = EXPORT_FORMATS[format]
+    body = _encode(
+        _export_rows(current_user.id, position, workflow_id, status, naive_utc(since), naive_utc(until)),
+        format,
+        header=cursor is None
+    )
+    filename = f"execution-logs.{extension}"
+    if gzip:
+        body, media_type, filename = _gzip(body), "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+class RetentionSettings(BaseModel):
+    # None (or omitted): the server default; 0: never archive this user's logs
+    retention_days: Optional[int] = Field(None, ge=0)
+
+class RetentionResponse(BaseModel):
+    retention_days: Optional[int] = None
+    default_days: int
+    effective_days: Optional[int] = None  # None: logs are never archived
+
+def _retention(retention_days: Optional[int]) -> dict:
+    effective = LOG_RETENTION_DAYS if retention_days is None else retention_days
+    return {
+        "retention_days": retention_days,
+        "default_days": LOG_RETENTION_DAYS,
+        "effective_days": effective if effective > 0 else None
+    }
+
+@router.get("/logs/retention", response_model=RetentionResponse)
+async def read_retention(current_user: User = Depends(get_current_active_user)):
+    return _retention(current_user.log_retention_days)
+
+@router.put("/logs/retention", response_model=RetentionResponse)
+async def update_retention(
+    settings: RetentionSettings,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Days to keep logs in the database before they move to the archive;
+    0 keeps them forever and null goes back to the server default"""
+    await db.execute(
+        update(User).where(User.id == current_user.id).values(log_retention_days=settings.retention_days)
+    )
+    invalidate_user(db, current_user.email)
+    await db.commit()
+    return _retention(settings.retention_days)
+
 @router.get("/logs/{log_id}", response_model=LogResponse)
-def read_log(log_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_active_user)):
-    log = db.query(ExecutionLog).filter(
+async def read_log(log_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_active_user)):
+    log = await db.scalar(select(ExecutionLog).where(
         ExecutionLog.id == log_id,
         ExecutionLog.user_id == current_user.id
-    ).first()
+    ))
+    if log is None:
+        # Logs past their retention live in the archive
+        log = await read_archived_log(db, current_user.id, log_id)
     if log is None:
         raise HTTPException(status_code=404, detail="Log not found")
     return log
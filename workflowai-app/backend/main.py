@@ -6,11 +6,12 @@ from fastapi.security import OAuth2PasswordRequestForm
 import os
 import secrets
 import hashlib
-import requests
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uvicorn
-from .database import engine, Base, get_db
+from database import get_async_db, engine_settings
+from migration import pending_migrations
 from models import User, Workflow, ExecutionLog, Template
 from auth import (
     authenticate_user, 
@@ -18,23 +19,76 @@ from auth import (
     get_password_hash, 
     get_current_active_user,
     get_current_user,
+    extract_token,
+    invalidate_user,
+    revoke_token,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
 # Utility function to get user by email
-def get_user(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user(db: AsyncSession, email: str):
+    return await db.scalar(select(User).where(User.email == email))
 from datetime import timedelta
 from pydantic import BaseModel
 from workflows import router as workflows_router
+from n8n_service import n8n
+from execution_queue import execution_queue
+from reconciler import execution_reconciler
 from templates import router as templates_router
 from logs import router as logs_router
+# Importing stats also registers the flush hook that maintains its counters
+from stats import router as stats_router
+from rollups import router as rollups_router, execution_rollups
+from archive import log_compactor
+# Importing live also registers the flush hook that publishes execution events
+from live import router as live_router, execution_hub
+from webhooks import router as webhooks_router, execution_events
+from workflow_sync import router as workflow_sync_router, workflow_sync
+from scheduler import router as scheduler_router, workflow_scheduler
+from revocation import revocation_store
+from google_oauth import google_oauth
+from config import N8N_WEBHOOK_SECRET
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Tables are created and upgraded by migration.py, not at import time;
+# startup checks that it has run
 
 app = FastAPI(title="WorkflowAI API", description="Business automation tool for Nigerian SMEs")
 
+@app.on_event("startup")
+async def start_background_workers():
+    print(f"Database settings: {engine_settings()}")
+    # Fail fast rather than answer every request with "no such table"
+    pending = pending_migrations()
+    if pending:
+        raise RuntimeError(f"Database schema is behind, pending migrations: {pending}. Run `python migration.py` first")
+    if not N8N_WEBHOOK_SECRET:
+        print("Warning: N8N_WEBHOOK_SECRET is not set; the execution webhook is disabled and runs finish through the reconciler")
+    await revocation_store.start()
+    await google_oauth.start()
+    await execution_queue.start()
+    await execution_reconciler.start()
+    await execution_events.start()
+    await execution_rollups.start()
+    await log_compactor.start()
+    await execution_hub.start()
+    await workflow_sync.start()
+    await workflow_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """Drain the execution workers, then release the pooled n8n connections"""
+    await workflow_scheduler.stop()
+    await workflow_sync.stop()
+    await execution_hub.stop()
+    await log_compactor.stop()
+    await execution_rollups.stop()
+    await execution_events.stop()
+    await execution_reconciler.stop()
+    await execution_queue.stop()
+    await revocation_store.stop()
+    await google_oauth.stop()
+    await n8n.close()
+
 # API routes and OAuth routes go first
 @app.get("/auth/google/login")
 async def google_login():
@@ -70,7 +124,7 @@ async def google_login():
     return RedirectResponse(url=authorization_url, status_code=302)
 
 @app.get("/auth/google/callback")
-async def google_callback(request: Request, db: Session = Depends(get_db)):
+async def google_callback(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Handle Google OAuth callback"""
     # Get the authorization code
     code = request.query_params.get('code')
@@ -79,41 +133,17 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
     
     try:
         # Exchange code for tokens
-        from config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_REDIRECT_URI
-        token_url = "https://oauth2.googleapis.com/token"
-        token_data = {
-            "code": code,
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "redirect_uri": GOOGLE_REDIRECT_URI,
-            "grant_type": "authorization_code"
-        }
-        
-        print("Exchanging code for token...")  # Debug print
-        token_response = requests.post(token_url, data=token_data)
-        print(f"Token response status: {token_response.status_code}")  # Debug print
+        token_info = await google_oauth.exchange_code(code)
+        id_token = token_info.get('id_token')
         
-        if not token_response.ok:
-            print('Google token error:', token_response.text)
-            raise HTTPException(status_code=400, detail=f"Failed to get access token: {token_response.text}")
+        if not id_token:
+            raise HTTPException(status_code=400, detail="No ID token in response")
         
-        token_info = token_response.json()
-        access_token = token_info.get('access_token')
-        
-        if not access_token:
-            raise HTTPException(status_code=400, detail="No access token in response")
-        
-        # Get user info from Google
-        print("Getting user info...")  # Debug print
-        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
-        user_info_response = requests.get(user_info_url, headers={
-            "Authorization": f"Bearer {access_token}"
-        })
-        user_info_response.raise_for_status()
-        user_info = user_info_response.json()
+        # The ID token already carries the profile, so no userinfo round trip is needed
+        user_info = await google_oauth.verify_id_token(id_token, token_info.get('access_token'))
         
         # Create or update user in database
-        db_user = get_user(db, user_info['email'])
+        db_user = await get_user(db, user_info['email'])
         if not db_user:
             # Create new user with Google info
             db_user = User(
@@ -123,13 +153,14 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
                 is_active=True
             )
             db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
+            await db.commit()
+            await db.refresh(db_user)
         elif not db_user.is_active:
             # If user exists but is inactive, activate them
             db_user.is_active = True
-            db.commit()
-            db.refresh(db_user)
+            invalidate_user(db, db_user.email)
+            await db.commit()
+            await db.refresh(db_user)
         
         # Generate JWT token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -137,11 +168,6 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
             data={"sub": db_user.email}, expires_delta=access_token_expires
         )
         
-        # Update user with new token
-        db_user.token = token
-        db.commit()
-        db.refresh(db_user)
-        
         # Debug: Print token for verification
         print(f"Generated JWT token for {db_user.email}: {token}")
         
@@ -182,6 +208,8 @@ async def google_callback(request: Request, db: Session = Depends(get_db)):
         
         return response
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in callback: {str(e)}")  # Debug print
         raise HTTPException(status_code=500, detail=f"Authentication failed: {str(e)}")
@@ -218,6 +246,13 @@ app.add_middleware(
 app.include_router(workflows_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
 app.include_router(templates_router, prefix="/api")
 app.include_router(logs_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
+app.include_router(stats_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
+app.include_router(rollups_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
+app.include_router(live_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
+app.include_router(workflow_sync_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
+app.include_router(scheduler_router, prefix="/api", dependencies=[Depends(get_current_active_user)])
+# Webhooks authenticate with an HMAC signature instead of a user token
+app.include_router(webhooks_router, prefix="/api")
 
 # Pydantic models
 class Token(BaseModel):
@@ -246,11 +281,12 @@ class UserResponse(BaseModel):
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    # n8n trouble is reported but doesn't make this instance unhealthy
+    return {"status": "healthy", "n8n": n8n.health(), "rollups": execution_rollups.snapshot()}
 
 @app.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -264,20 +300,20 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/users/", response_model=UserResponse)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    db_user = db.query(User).filter(User.username == user.username).first()
+    db_user = await db.scalar(select(User).where(User.username == user.username))
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     db_user = User(email=user.email, username=user.username, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @app.get("/users/me/", response_model=UserResponse)
@@ -285,7 +321,14 @@ async def read_users_me(request: Request, current_user: User = Depends(get_curre
     return current_user
 
 @app.post("/auth/logout")
-async def logout():
+async def logout(request: Request, db: AsyncSession = Depends(get_async_db)):
+    token = extract_token(request)
+    if token:
+        # Other workers pick the revocation up on their next sync
+        email = await revoke_token(db, token)
+        if email:
+            invalidate_user(db, email)
+            await db.commit()
     response = RedirectResponse(url="/login.html")
     response.delete_cookie(key="access_token")
     return response
@@ -1,20 +1,282 @@
-import sqlite3
-import os
-
-# Connect to the database
-conn = sqlite3.connect('workflowai.db')
-cursor = conn.cursor()
-
-# Add token column to users table
-try:
-    cursor.execute("ALTER TABLE users ADD COLUMN token TEXT")
-    conn.commit()
-    print("Successfully added token column to users table")
-except sqlite3.OperationalError as e:
-    if "duplicate column name" in str(e):
-        print("Token column already exists in users table")
+"""
+Versioned schema migrations.
+
+Run before starting the app (the Procfile release step and the render.yaml
+start command do this); the app refuses to start while any are pending:
+
+    python migration.py
+
+Applied versions are recorded in the schema_migrations table. A fresh
+database is created straight from the models and stamped as current;
+an existing one runs every step it has not recorded yet. Steps check
+the live schema before changing it, so databases that were upgraded by
+the old ad-hoc script are brought in line without errors.
+"""
+import ast
+import json
+from datetime import datetime
+from sqlalchemy import (
+    Column, Date, DateTime, Integer, MetaData, String, Table,
+    bindparam, case, cast, delete, func, inspect, insert, select, text, update
+)
+from database import Base, engine
+from models import (
+    DailyExecutionRollup, DailyExecutionStats, ExecutionEventOutbox, ExecutionLog, HourlyExecutionRollup,
+    LogArchiveSegment, Template, TemplateDefinition, User, UserInvalidation, UserStats, Workflow, WorkflowSchedule,
+    TEMPLATE_SEARCH_DDL, TERMINAL_EXECUTION_STATUSES, UNKNOWN_STATUS
+)
+import models  # noqa: F401  (registers every table on Base.metadata)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+def add_column(conn, column):
+    """Add a model column to its table unless it already exists"""
+    table = column.table.name
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        print(f"{column.name} column already exists in {table} table")
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}"))
+    print(f"Added {column.name} column to {table} table")
+
+def add_index(conn, name, table, columns):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+    print(f"Ensured index {name} on {table}")
+
+def parse_details(details):
+    """Parse details written as JSON or as str(dict) by older versions"""
+    if not isinstance(details, str):
+        return details
+    try:
+        return json.loads(details)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(details)
+    except (ValueError, SyntaxError):
+        return details
+
+def create_tables(conn):
+    # Tables added since the database was created (jobs, leases, revoked tokens, ...)
+    Base.metadata.create_all(bind=conn)
+
+def add_n8n_execution_id(conn):
+    table = ExecutionLog.__table__
+    add_column(conn, table.c.n8n_execution_id)
+    add_index(conn, "ix_execution_logs_n8n_execution_id", "execution_logs", "n8n_execution_id")
+
+    # Backfill n8n execution ids and rewrite details as JSON
+    rows = conn.execute(text(
+        "SELECT id, details FROM execution_logs "
+        "WHERE n8n_execution_id IS NULL AND details IS NOT NULL"
+    )).all()
+    updates = []
+    for log_id, details in rows:
+        parsed = json.loads(json.dumps(parse_details(details), default=str))
+        n8n_execution_id = None
+        if isinstance(parsed, dict) and parsed.get("id") is not None:
+            n8n_execution_id = str(parsed["id"])
+        updates.append({"b_id": log_id, "b_execution_id": n8n_execution_id, "b_details": parsed})
+    if updates:
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(n8n_execution_id=bindparam("b_execution_id"), details=bindparam("b_details")),
+            updates
+        )
+    print(f"Backfilled {len(updates)} execution log(s)")
+
+    if conn.dialect.name == "postgresql":
+        # details used to be a TEXT column; every row now holds valid JSON
+        column = next(c for c in inspect(conn).get_columns("execution_logs") if c["name"] == "details")
+        if column["type"].__class__.__name__.upper() == "TEXT":
+            conn.execute(text("ALTER TABLE execution_logs ALTER COLUMN details TYPE JSON USING details::json"))
+
+def add_sync_schedule(conn):
+    # Reconciler bookkeeping; schedule every unfinished run for a sync
+    table = ExecutionLog.__table__
+    add_column(conn, table.c.last_synced_at)
+    add_column(conn, table.c.next_sync_at)
+    add_index(conn, "ix_execution_logs_next_sync_at", "execution_logs", "next_sync_at")
+    conn.execute(
+        update(table)
+        .where(
+            table.c.next_sync_at.is_(None),
+            table.c.n8n_execution_id.isnot(None),
+            table.c.status.notin_(TERMINAL_EXECUTION_STATUSES)
+        )
+        .values(next_sync_at=datetime.utcnow())
+    )
+
+def add_log_keyset_index(conn):
+    add_index(conn, "ix_execution_logs_user_time_id", "execution_logs", "user_id, execution_time DESC, id DESC")
+
+def add_hot_query_indexes(conn):
+    # Ownership-scoped workflow lookups and listings
+    add_index(conn, "ix_workflows_owner_id_id", "workflows", "owner_id, id")
+    # Per-workflow execution history, newest first
+    add_index(
+        conn,
+        "ix_execution_logs_user_workflow_time_id",
+        "execution_logs",
+        "user_id, workflow_id, execution_time DESC, id DESC"
+    )
+    # Foreign key lookups, e.g. when a workflow is deleted
+    add_index(conn, "ix_execution_logs_workflow_id", "execution_logs", "workflow_id")
+
+def backfill_stats(conn):
+    # Seed the dashboard counters from the existing rows
+    UserStats.__table__.create(conn, checkfirst=True)
+    DailyExecutionStats.__table__.create(conn, checkfirst=True)
+    conn.execute(delete(UserStats))
+    conn.execute(delete(DailyExecutionStats))
+    conn.execute(insert(UserStats).from_select(
+        ["user_id", "total_workflows", "active_workflows"],
+        select(
+            Workflow.owner_id,
+            func.count(Workflow.id),
+            func.sum(case((Workflow.is_active.is_(True), 1), else_=0))
+        )
+        .where(Workflow.owner_id.isnot(None))
+        .group_by(Workflow.owner_id)
+    ))
+    if conn.dialect.name == "sqlite":
+        day = func.date(ExecutionLog.execution_time)
     else:
-        print(f"Error adding token column: {e}")
+        day = cast(ExecutionLog.execution_time, Date)
+    status = func.coalesce(ExecutionLog.status, UNKNOWN_STATUS)
+    conn.execute(insert(DailyExecutionStats).from_select(
+        ["user_id", "day", "status", "count"],
+        select(ExecutionLog.user_id, day, status, func.count(ExecutionLog.id))
+        .where(ExecutionLog.user_id.isnot(None), ExecutionLog.execution_time.isnot(None))
+        .group_by(ExecutionLog.user_id, day, status)
+    ))
+
+def add_rollups(conn):
+    # Finish times and the pending flag feed the hourly/daily rollup worker
+    table = ExecutionLog.__table__
+    add_column(conn, table.c.finished_at)
+    add_column(conn, table.c.rollup_pending)
+    Base.metadata.create_all(bind=conn, tables=[HourlyExecutionRollup.__table__, DailyExecutionRollup.__table__])
+    next(index for index in table.indexes if index.name == "ix_execution_logs_rollup_pending").create(conn, checkfirst=True)
+    # Queue the existing history; the worker folds it in batches
+    conn.execute(
+        update(table)
+        .where(table.c.finished_at.is_(None), table.c.status.in_(TERMINAL_EXECUTION_STATUSES))
+        .values(
+            finished_at=func.coalesce(table.c.last_synced_at, table.c.execution_time),
+            rollup_pending=True
+        )
+    )
+
+def add_log_archive(conn):
+    # Per-user retention and the catalogue of archive segments
+    add_column(conn, User.__table__.c.log_retention_days)
+    Base.metadata.create_all(bind=conn, tables=[LogArchiveSegment.__table__])
+
+def add_event_outbox(conn):
+    # Cross-worker delivery of live execution events on SQLite
+    ExecutionEventOutbox.__table__.create(conn, checkfirst=True)
+
+def add_template_search(conn):
+    add_column(conn, Template.__table__.c.updated_at)
+    add_index(conn, "ix_templates_category", "templates", "category")
+    for statement in TEMPLATE_SEARCH_DDL.get(conn.dialect.name, []):
+        conn.execute(text(statement))
+    if conn.dialect.name == "sqlite":
+        # Index the templates that predate the triggers
+        conn.execute(text("INSERT INTO templates_fts(templates_fts) VALUES ('rebuild')"))
+
+def add_template_definitions(conn):
+    TemplateDefinition.__table__.create(conn, checkfirst=True)
+
+def add_workflow_schedules(conn):
+    WorkflowSchedule.__table__.create(conn, checkfirst=True)
+
+def add_execution_job_cascades(conn):
+    # Jobs go with their workflow, and outlive their archived log.
+    # SQLite can't alter constraints, but doesn't enforce them either.
+    if conn.dialect.name != "postgresql":
+        return
+    referred = {"workflows": ("workflow_id", "CASCADE"), "execution_logs": ("log_id", "SET NULL")}
+    for foreign_key in inspect(conn).get_foreign_keys("execution_jobs"):
+        if foreign_key["referred_table"] in referred:
+            conn.execute(text(f"ALTER TABLE execution_jobs DROP CONSTRAINT {foreign_key['name']}"))
+    for table, (column, action) in referred.items():
+        conn.execute(text(
+            f"ALTER TABLE execution_jobs ADD CONSTRAINT execution_jobs_{column}_fkey "
+            f"FOREIGN KEY ({column}) REFERENCES {table} (id) ON DELETE {action}"
+        ))
+
+def add_user_invalidations(conn):
+    # Cross-worker eviction of cached users
+    UserInvalidation.__table__.create(conn, checkfirst=True)
+
+# Append new steps at the end; never renumber or edit an applied step
+MIGRATIONS = [
+    (1, "create_tables", create_tables),
+    (2, "add_n8n_execution_id", add_n8n_execution_id),
+    (3, "add_sync_schedule", add_sync_schedule),
+    (4, "add_log_keyset_index", add_log_keyset_index),
+    (5, "add_hot_query_indexes", add_hot_query_indexes),
+    (6, "backfill_stats", backfill_stats),
+    (7, "add_rollups", add_rollups),
+    (8, "add_log_archive", add_log_archive),
+    (9, "add_event_outbox", add_event_outbox),
+    (10, "add_template_search", add_template_search),
+    (11, "add_template_definitions", add_template_definitions),
+    (12, "add_workflow_schedules", add_workflow_schedules),
+    (13, "add_execution_job_cascades", add_execution_job_cascades),
+    (14, "add_user_invalidations", add_user_invalidations),
+]
+
+def pending_migrations(bind=engine):
+    """Versions not applied yet; all of them for a database never migrated"""
+    with bind.connect() as conn:
+        if not inspect(conn).has_table(schema_migrations.name):
+            return [version for version, _, _ in MIGRATIONS]
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+def migrate(bind=engine):
+    """Apply pending migrations; returns the versions applied"""
+    with bind.begin() as conn:
+        fresh = not inspect(conn).has_table("users")
+        schema_migrations.create(conn, checkfirst=True)
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    done = []
+    if fresh:
+        # The models already describe the latest schema
+        with bind.begin() as conn:
+            Base.metadata.create_all(bind=conn)
+            for version, name, _ in MIGRATIONS:
+                conn.execute(schema_migrations.insert().values(
+                    version=version, name=name, applied_at=datetime.utcnow()
+                ))
+        print(f"Created a fresh schema at version {MIGRATIONS[-1][0]}")
+        return [version for version, _, _ in MIGRATIONS]
+
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
+        # One transaction per step, so a failure leaves earlier steps recorded
+        with bind.begin() as conn:
+            print(f"Applying migration {version}: {name}")
+            step(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        done.append(version)
+    if not done:
+        print("Database schema is up to date")
+    return done
 
-# Close the connection
-conn.close()
+if __name__ == "__main__":
+    migrate()
@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Boolean, ForeignKey, JSON, Index, DDL, event
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
 
+# Execution statuses that n8n will never change again
+TERMINAL_EXECUTION_STATUSES = {"success", "error", "crashed", "canceled", "failed"}
+# Stats bucket for logs without a status
+UNKNOWN_STATUS = "unknown"
+
 class User(Base):
     __tablename__ = "users"
     
@@ -13,13 +18,16 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    token = Column(String, nullable=True)  # Field to store JWT token
+    log_retention_days = Column(Integer, nullable=True)  # None: config.LOG_RETENTION_DAYS; 0: never archived
     
     workflows = relationship("Workflow", back_populates="owner")
     logs = relationship("ExecutionLog", back_populates="user")
 
 class Workflow(Base):
     __tablename__ = "workflows"
+    __table_args__ = (
+        Index("ix_workflows_owner_id_id", "owner_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -33,20 +41,68 @@ class Workflow(Base):
     
     owner = relationship("User", back_populates="workflows")
     logs = relationship("ExecutionLog", back_populates="workflow")
+    schedules = relationship("WorkflowSchedule", back_populates="workflow", cascade="all, delete-orphan")
 
 class ExecutionLog(Base):
     __tablename__ = "execution_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    workflow_id = Column(Integer, ForeignKey("workflows.id"))
+    workflow_id = Column(Integer, ForeignKey("workflows.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     status = Column(String)
     execution_time = Column(DateTime, default=datetime.utcnow)
-    details = Column(Text)
+    n8n_execution_id = Column(String, index=True, nullable=True)
+    details = Column(JSON, nullable=True)
+    last_synced_at = Column(DateTime, nullable=True)
+    next_sync_at = Column(DateTime, index=True, nullable=True)  # NULL once terminal
+    finished_at = Column(DateTime, nullable=True)  # first time the run reached a terminal status
+    rollup_pending = Column(Boolean, default=False)  # finished but not yet folded into rollups
     
     workflow = relationship("Workflow", back_populates="logs")
     user = relationship("User", back_populates="logs")
 
+# Serves the keyset-paginated log listing, newest first
+Index(
+    "ix_execution_logs_user_time_id",
+    ExecutionLog.user_id,
+    ExecutionLog.execution_time.desc(),
+    ExecutionLog.id.desc()
+)
+# Per-workflow execution history and the workflow_id filter on the listing
+Index(
+    "ix_execution_logs_user_workflow_time_id",
+    ExecutionLog.user_id,
+    ExecutionLog.workflow_id,
+    ExecutionLog.execution_time.desc(),
+    ExecutionLog.id.desc()
+)
+# Only the (few) rows still waiting for the rollup worker
+Index(
+    "ix_execution_logs_rollup_pending",
+    ExecutionLog.id,
+    postgresql_where=ExecutionLog.rollup_pending.is_(True),
+    sqlite_where=ExecutionLog.rollup_pending.is_(True)
+)
+
+class ExecutionJob(Base):
+    __tablename__ = "execution_jobs"
+    __table_args__ = (
+        Index("ix_execution_jobs_state_next_attempt", "state", "next_attempt_at"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    log_id = Column(Integer, ForeignKey("execution_logs.id", ondelete="SET NULL"), index=True)
+    workflow_id = Column(Integer, ForeignKey("workflows.id", ondelete="CASCADE"))
+    user_id = Column(Integer, ForeignKey("users.id"))
+    payload = Column(JSON, nullable=True)
+    state = Column(String, default="queued")  # queued, running, done, dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Template(Base):
     __tablename__ = "templates"
     
@@ -54,5 +110,156 @@ class Template(Base):
     name = Column(String, index=True)
     description = Column(Text)
     n8n_workflow_id = Column(String)
-    category = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    category = Column(String, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class TemplateDefinition(Base):
+    """Cached copy of a template's n8n workflow definition"""
+    __tablename__ = "template_definitions"
+
+    template_id = Column(Integer, ForeignKey("templates.id", ondelete="CASCADE"), primary_key=True)
+    n8n_workflow_id = Column(String, nullable=False)
+    definition = Column(JSON, nullable=False)  # nodes, connections and settings
+    n8n_updated_at = Column(String, nullable=True)
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+
+# Keyword search over templates: an FTS5 index kept in sync by triggers on
+# SQLite, a generated tsvector column with a GIN index on Postgres
+TEMPLATE_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5("
+        "name, description, category, content='templates', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS templates_fts_insert AFTER INSERT ON templates BEGIN "
+        "INSERT INTO templates_fts(rowid, name, description, category) "
+        "VALUES (new.id, new.name, new.description, new.category); END",
+        "CREATE TRIGGER IF NOT EXISTS templates_fts_delete AFTER DELETE ON templates BEGIN "
+        "INSERT INTO templates_fts(templates_fts, rowid, name, description, category) "
+        "VALUES ('delete', old.id, old.name, old.description, old.category); END",
+        "CREATE TRIGGER IF NOT EXISTS templates_fts_update AFTER UPDATE ON templates BEGIN "
+        "INSERT INTO templates_fts(templates_fts, rowid, name, description, category) "
+        "VALUES ('delete', old.id, old.name, old.description, old.category); "
+        "INSERT INTO templates_fts(rowid, name, description, category) "
+        "VALUES (new.id, new.name, new.description, new.category); END",
+    ],
+    "postgresql": [
+        "ALTER TABLE templates ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+        "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(description, '') || ' ' || coalesce(category, ''))"
+        ") STORED",
+        "CREATE INDEX IF NOT EXISTS ix_templates_search_vector ON templates USING GIN (search_vector)",
+    ],
+}
+for _dialect, _statements in TEMPLATE_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Template.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+class Lease(Base):
+    __tablename__ = "leases"
+    
+    name = Column(String, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class UserInvalidation(Base):
+    """Users whose cached snapshot went stale; every worker drops them on its next revocation sync"""
+    __tablename__ = "user_invalidations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String, nullable=False)
+    invalidated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class UserStats(Base):
+    """Workflow counters per user, kept current by stats.py"""
+    __tablename__ = "user_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_workflows = Column(Integer, default=0, nullable=False)
+    active_workflows = Column(Integer, default=0, nullable=False)
+
+class DailyExecutionStats(Base):
+    """Execution counts per user, UTC day and current status, kept current by stats.py"""
+    __tablename__ = "daily_execution_stats"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+class RollupColumns:
+    """Execution totals and a fixed latency histogram for one workflow and time bucket"""
+    workflow_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    user_id = Column(Integer)
+    total = Column(Integer, default=0, nullable=False)
+    succeeded = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    duration_sum_ms = Column(Integer, default=0, nullable=False)
+    duration_max_ms = Column(Integer, default=0, nullable=False)
+    histogram = Column(JSON, nullable=False)  # counts per rollups.LATENCY_BOUNDS_MS bin
+
+class HourlyExecutionRollup(RollupColumns, Base):
+    __tablename__ = "execution_rollups_hourly"
+    __table_args__ = (
+        Index("ix_execution_rollups_hourly_user_bucket", "user_id", "bucket_start"),
+    )
+
+class DailyExecutionRollup(RollupColumns, Base):
+    __tablename__ = "execution_rollups_daily"
+    __table_args__ = (
+        Index("ix_execution_rollups_daily_user_bucket", "user_id", "bucket_start"),
+    )
+
+class LogArchiveSegment(Base):
+    """One gzip NDJSON file of compacted execution logs, plus its .idx sidecar"""
+    __tablename__ = "log_archive_segments"
+    __table_args__ = (
+        Index("ix_log_archive_segments_user_ids", "user_id", "first_log_id", "last_log_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    path = Column(String, nullable=False)  # relative to config.LOG_ARCHIVE_DIR
+    first_log_id = Column(Integer, nullable=False)
+    last_log_id = Column(Integer, nullable=False)
+    first_time = Column(DateTime)
+    last_time = Column(DateTime)
+    entry_count = Column(Integer, nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ExecutionEventOutbox(Base):
+    """Execution events for other workers to pick up where LISTEN/NOTIFY is unavailable (SQLite)"""
+    __tablename__ = "execution_event_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class WorkflowSchedule(Base):
+    """A cron schedule that queues runs of a workflow; fired by scheduler.py"""
+    __tablename__ = "workflow_schedules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    workflow_id = Column(Integer, ForeignKey("workflows.id", ondelete="CASCADE"), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    cron = Column(String, nullable=False)
+    timezone = Column(String, nullable=False, default="UTC")
+    payload = Column(JSON, nullable=True)
+    # fire_once, skip or fire_all: what to do with occurrences missed by more than the grace period
+    misfire_policy = Column(String, nullable=False, default="fire_once")
+    is_enabled = Column(Boolean, nullable=False, default=True)
+    # Naive UTC; NULL while disabled, so the due index only holds live schedules
+    next_fire_at = Column(DateTime, nullable=True, index=True)
+    last_fired_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    workflow = relationship("Workflow", back_populates="schedules")
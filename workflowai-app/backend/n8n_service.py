@@ -1,7 +1,61 @@
-import requests
-from typing import Dict, Any, Optional, List
-from config import N8N_BASE_URL, N8N_API_KEY
+import asyncio
+import copy
+import time
+import httpx
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, Hashable, Optional, List
+from config import (
+    N8N_BASE_URL,
+    N8N_API_KEY,
+    N8N_CONNECT_TIMEOUT,
+    N8N_READ_TIMEOUT,
+    N8N_LOOKUP_TIMEOUT,
+    N8N_WRITE_TIMEOUT,
+    N8N_EXECUTE_TIMEOUT,
+    N8N_MAX_CONNECTIONS,
+    N8N_MAX_KEEPALIVE_CONNECTIONS,
+    N8N_RETRY_ATTEMPTS,
+    N8N_RETRY_BASE_SECONDS,
+    N8N_BREAKER_FAILURE_THRESHOLD,
+    N8N_BREAKER_RESET_SECONDS,
+    N8N_MAX_CONCURRENT,
+    N8N_QUEUE_WAIT_SECONDS,
+    N8N_CACHE_SIZE,
+    N8N_WORKFLOW_CACHE_TTL,
+    N8N_EXECUTIONS_CACHE_TTL,
+    N8N_EXECUTION_CACHE_TTL,
+)
 from fastapi import HTTPException
+from cache import TTLCache
+from resilience import CircuitBreaker, ConcurrencyLimiter, backoff
+
+# Gateway errors worth another try; anything else n8n answers would just repeat
+RETRYABLE_STATUSES = {502, 503, 504}
+
+def _retryable(error: httpx.HTTPError) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+# Failures that happen before the request goes out, so n8n never saw it
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class N8NError(HTTPException):
+    """A failed n8n call, as a 502 or 504; upstream_status is what n8n answered, if it did,
+    and maybe_received whether n8n may have acted on a call that got no answer"""
+    def __init__(self, status_code: int, detail: str, upstream_status: Optional[int] = None, maybe_received: bool = False):
+        super().__init__(status_code=status_code, detail=detail)
+        self.upstream_status = upstream_status
+        self.maybe_received = maybe_received
+
+def _as_http_exception(error: httpx.HTTPError) -> HTTPException:
+    maybe_received = not isinstance(error, (httpx.HTTPStatusError, *NOT_SENT_ERRORS))
+    if isinstance(error, httpx.TimeoutException):
+        return N8NError(504, f"Timed out waiting for n8n: {str(error)}", maybe_received=maybe_received)
+    # n8n's own status (e.g. 401 for a bad API key) would be misread as ours
+    upstream_status = error.response.status_code if isinstance(error, httpx.HTTPStatusError) else None
+    return N8NError(502, f"Error communicating with n8n: {str(error)}", upstream_status, maybe_received)
+
+_MISSING = object()
 
 class N8NService:
     def __init__(self):
@@ -10,56 +64,236 @@ class N8NService:
             "X-N8N-API-KEY": N8N_API_KEY,
             "Content-Type": "application/json"
         }
+        self.timeout = self._timeout(N8N_READ_TIMEOUT)
+        self.lookup_timeout = self._timeout(N8N_LOOKUP_TIMEOUT)
+        self.write_timeout = self._timeout(N8N_WRITE_TIMEOUT)
+        self.execute_timeout = self._timeout(N8N_EXECUTE_TIMEOUT)
+        self.limits = httpx.Limits(
+            max_connections=N8N_MAX_CONNECTIONS,
+            max_keepalive_connections=N8N_MAX_KEEPALIVE_CONNECTIONS
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.breaker = CircuitBreaker("n8n", N8N_BREAKER_FAILURE_THRESHOLD, N8N_BREAKER_RESET_SECONDS)
+        self.limiter = ConcurrencyLimiter("n8n", N8N_MAX_CONCURRENT, N8N_QUEUE_WAIT_SECONDS)
+        # Lookup results, and the lookups in flight that identical calls wait on
+        self._reads = TTLCache(N8N_CACHE_SIZE)
+        self._pending: Dict[Hashable, asyncio.Task] = {}
+        self.cache_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    @staticmethod
+    def _timeout(read: float) -> httpx.Timeout:
+        return httpx.Timeout(read, connect=N8N_CONNECT_TIMEOUT, pool=N8N_CONNECT_TIMEOUT)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared connection pool, created lazily inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=f"{self.base_url}/api/v1/",
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """Close the pooled connections (called on app shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def health(self) -> Dict:
+        return {
+            "circuit": self.breaker.snapshot(),
+            "concurrency": self.limiter.snapshot(),
+            "cache": {**self.cache_stats, "size": len(self._reads)}
+        }
+
+    def invalidate(self, workflow_id: str) -> None:
+        """Forget cached lookups of a workflow and its executions, including those in flight"""
+        workflow_id = str(workflow_id)
+
+        def of_workflow(key: Hashable) -> bool:
+            return key[0] in ("workflow", "executions") and key[1] == workflow_id
 
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
-        """Make HTTP request to n8n API"""
-        url = f"{self.base_url}/api/v1/{endpoint}"
+        # Scans at most N8N_CACHE_SIZE keys, and leaves no per-workflow state behind
+        self._reads.pop_where(of_workflow)
+        # Their callers still get the result, but it no longer fills the cache
+        for key in [key for key in self._pending if of_workflow(key)]:
+            del self._pending[key]
+
+    async def _cached(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve a lookup from the cache, or join an identical one already in flight.
+
+        The shared call runs as its own task, so a caller that gives up
+        doesn't cancel it for the others. Errors are not cached. Each
+        caller gets its own copy of the result.
+        """
+        value = self._reads.get(key, _MISSING)
+        if value is not _MISSING:
+            self.cache_stats["hits"] += 1
+            return copy.deepcopy(value)
+        task = self._pending.get(key)
+        if task is None:
+            self.cache_stats["misses"] += 1
+            task = asyncio.create_task(self._fill(key, ttl, fetch))
+            self._pending[key] = task
+            task.add_done_callback(lambda done: self._settle(key, done))
+        else:
+            self.cache_stats["coalesced"] += 1
+        return copy.deepcopy(await asyncio.shield(task))
+
+    async def _write(self, workflow_id: str, *args, **kwargs) -> Dict:
+        """A call that changes a workflow; lookups cached before it finished are dropped"""
+        try:
+            return await self._make_request(*args, **kwargs)
+        finally:
+            self.invalidate(workflow_id)
+
+    async def _fill(self, key: Hashable, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        # Not cached if a write invalidated the lookup while it was in flight
+        if self._pending.get(key) is asyncio.current_task():
+            self._reads.set(key, value, time.time() + ttl)
+        return value
+
+    def _settle(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # Retrieved here in case every caller gave up waiting
+        if not task.cancelled():
+            task.exception()
+
+    async def _make_request(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[Dict] = None,
+        params: Optional[Dict] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        idempotent: Optional[bool] = None
+    ) -> Dict:
+        """Make HTTP request to n8n API.
+
+        Idempotent calls (GETs unless told otherwise) are retried on
+        timeouts, connection errors and gateway errors. Raises a 503 with
+        Retry-After while the circuit is open or every slot is taken, a
+        504 on timeout and a 502 on any other failure.
+        """
+        if idempotent is None:
+            idempotent = method == "GET"
+        attempts = N8N_RETRY_ATTEMPTS if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                return await self._attempt(method, endpoint, data, params, timeout or self.timeout)
+            except httpx.HTTPError as e:
+                if attempt + 1 >= attempts or not _retryable(e):
+                    raise _as_http_exception(e)
+            await asyncio.sleep(backoff(attempt, N8N_RETRY_BASE_SECONDS))
+
+    async def _attempt(self, method, endpoint, data, params, timeout) -> Dict:
+        self.breaker.before_call()
         try:
-            response = requests.request(method, url, headers=self.headers, json=data)
+            async with self.limiter.slot():
+                response = await self.client.request(method, endpoint, json=data, params=params, timeout=timeout)
             response.raise_for_status()
-            return response.json() if response.content else {}
-        except requests.exceptions.RequestException as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error communicating with n8n: {str(e)}"
-            )
+        except httpx.HTTPStatusError as e:
+            # A 4xx still means n8n is up and answering
+            if e.response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_ignored()
+            raise
+        self.breaker.record_success()
+        return response.json() if response.content else {}
 
-    def create_workflow(self, workflow_data: Dict[str, Any]) -> Dict:
+    async def create_workflow(self, workflow_data: Dict[str, Any]) -> Dict:
         """Create a new workflow in n8n"""
-        return self._make_request("POST", "workflows", workflow_data)
+        return await self._make_request("POST", "workflows", workflow_data, timeout=self.write_timeout)
 
-    def get_workflow(self, workflow_id: str) -> Dict:
+    async def get_workflow(self, workflow_id: str) -> Dict:
         """Get workflow details from n8n"""
-        return self._make_request("GET", f"workflows/{workflow_id}")
+        return await self._cached(
+            ("workflow", str(workflow_id)),
+            N8N_WORKFLOW_CACHE_TTL,
+            lambda: self._make_request("GET", f"workflows/{workflow_id}", timeout=self.lookup_timeout)
+        )
 
-    def update_workflow(self, workflow_id: str, workflow_data: Dict[str, Any]) -> Dict:
+    async def update_workflow(self, workflow_id: str, workflow_data: Dict[str, Any]) -> Dict:
         """Update an existing workflow in n8n"""
-        return self._make_request("PUT", f"workflows/{workflow_id}", workflow_data)
+        return await self._write(
+            workflow_id, "PUT", f"workflows/{workflow_id}", workflow_data, timeout=self.write_timeout
+        )
 
-    def delete_workflow(self, workflow_id: str) -> None:
+    async def delete_workflow(self, workflow_id: str) -> None:
         """Delete a workflow from n8n"""
-        self._make_request("DELETE", f"workflows/{workflow_id}")
+        await self._write(workflow_id, "DELETE", f"workflows/{workflow_id}", timeout=self.write_timeout)
 
-    def activate_workflow(self, workflow_id: str) -> Dict:
+    async def activate_workflow(self, workflow_id: str) -> Dict:
         """Activate a workflow in n8n"""
-        return self._make_request("POST", f"workflows/{workflow_id}/activate")
+        return await self._write(
+            workflow_id, "POST", f"workflows/{workflow_id}/activate", timeout=self.write_timeout, idempotent=True
+        )
 
-    def deactivate_workflow(self, workflow_id: str) -> Dict:
+    async def deactivate_workflow(self, workflow_id: str) -> Dict:
         """Deactivate a workflow in n8n"""
-        return self._make_request("POST", f"workflows/{workflow_id}/deactivate")
+        return await self._write(
+            workflow_id, "POST", f"workflows/{workflow_id}/deactivate", timeout=self.write_timeout, idempotent=True
+        )
 
-    def execute_workflow(self, workflow_id: str, execution_data: Optional[Dict] = None) -> Dict:
+    async def execute_workflow(self, workflow_id: str, execution_data: Optional[Dict] = None) -> Dict:
         """Execute a workflow immediately"""
-        return self._make_request("POST", f"workflows/{workflow_id}/execute", execution_data or {})
+        # Invalidates too: the new run belongs in the workflow's execution history
+        return await self._write(
+            workflow_id, "POST", f"workflows/{workflow_id}/execute", execution_data or {}, timeout=self.execute_timeout
+        )
 
-    def get_execution_data(self, execution_id: str) -> Dict:
+    async def get_execution_data(self, execution_id: str) -> Dict:
         """Get execution details of a workflow run"""
-        return self._make_request("GET", f"executions/{execution_id}")
+        return await self._cached(
+            ("execution", execution_id),
+            N8N_EXECUTION_CACHE_TTL,
+            lambda: self._make_request("GET", f"executions/{execution_id}", timeout=self.lookup_timeout)
+        )
+
+    async def list_workflows(self, cursor: Optional[str] = None, limit: int = 100, active: Optional[bool] = None) -> Dict:
+        """One page of workflows: {"data": [...], "nextCursor": ...}"""
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if active is not None:
+            params["active"] = "true" if active else "false"
+        return await self._make_request("GET", "workflows", params=params, timeout=self.lookup_timeout)
 
-    def get_active_workflows(self) -> List[Dict]:
+    async def iter_workflows(self, page_size: int = 250, active: Optional[bool] = None) -> AsyncIterator[List[Dict]]:
+        """Every workflow, a page at a time"""
+        cursor = None
+        while True:
+            page = await self.list_workflows(cursor, page_size, active)
+            yield page.get("data", [])
+            cursor = page.get("nextCursor")
+            if not cursor:
+                return
+
+    async def get_active_workflows(self) -> List[Dict]:
         """Get all active workflows"""
-        return self._make_request("GET", "workflows/active")
+        return [workflow async for page in self.iter_workflows(active=True) for workflow in page]
 
-    def get_workflow_executions(self, workflow_id: str, limit: int = 20) -> List[Dict]:
+    async def get_workflow_executions(self, workflow_id: str, limit: int = 20) -> List[Dict]:
         """Get execution history of a workflow"""
-        return self._make_request("GET", f"workflows/{workflow_id}/executions?limit={limit}")
+        return await self._cached(
+            ("executions", str(workflow_id), limit),
+            N8N_EXECUTIONS_CACHE_TTL,
+            lambda: self._make_request(
+                "GET", f"workflows/{workflow_id}/executions", params={"limit": limit}, timeout=self.lookup_timeout
+            )
+        )
+
+# Shared instance so every router and background worker reuses one connection pool
+n8n = N8NService()
@@ -0,0 +1,157 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from sqlalchemy import select
+from database import AsyncSessionLocal
+from models import ExecutionLog, Workflow, TERMINAL_EXECUTION_STATUSES
+from n8n_service import n8n
+from leases import acquire_lease
+from config import (
+    RECONCILE_MIN_INTERVAL,
+    RECONCILE_MAX_INTERVAL,
+    RECONCILE_BATCH_SIZE,
+    RECONCILE_CONCURRENCY,
+    RECONCILE_ROW_MAX_INTERVAL,
+)
+
+LEASE_NAME = "execution-reconciler"
+
+def next_sync_delay(execution_time: Optional[datetime], now: datetime) -> float:
+    """Poll young executions often and long-running ones rarely"""
+    age = (now - (execution_time or now)).total_seconds()
+    return max(RECONCILE_MIN_INTERVAL, min(age / 10, RECONCILE_ROW_MAX_INTERVAL))
+
+class ExecutionReconciler:
+    """Polls n8n for the status of non-terminal execution logs.
+
+    Only the process holding the reconciler lease polls. Each row carries
+    its own next_sync_at, and the loop itself backs off while there is
+    nothing due, so idle deployments make almost no n8n calls. Runs of
+    deleted workflows are looked up by execution id alone; once n8n no
+    longer knows them either they finish as canceled.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        interval = RECONCILE_MIN_INTERVAL
+        while True:
+            processed = 0
+            try:
+                if await self._acquire():
+                    processed = await self.reconcile_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Execution reconciler error: {str(e)}")
+
+            if processed >= RECONCILE_BATCH_SIZE:
+                interval = 0  # Backlog: go straight to the next batch
+            elif processed:
+                interval = RECONCILE_MIN_INTERVAL
+            else:
+                interval = min(max(interval, RECONCILE_MIN_INTERVAL) * 2, RECONCILE_MAX_INTERVAL)
+            await asyncio.sleep(interval)
+
+    async def _acquire(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=RECONCILE_MAX_INTERVAL * 3)
+
+    async def _load_due(self) -> List[tuple]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ExecutionLog.id, ExecutionLog.n8n_execution_id, Workflow.n8n_workflow_id)
+                .outerjoin(Workflow, Workflow.id == ExecutionLog.workflow_id)
+                .where(ExecutionLog.next_sync_at <= datetime.utcnow())
+                .order_by(ExecutionLog.next_sync_at)
+                .limit(RECONCILE_BATCH_SIZE)
+            )
+            return result.all()
+
+    async def reconcile_batch(self) -> int:
+        """Refresh one batch of due rows; returns how many rows were due"""
+        due = await self._load_due()
+        if not due:
+            return 0
+
+        by_workflow = defaultdict(list)
+        for log_id, n8n_execution_id, n8n_workflow_id in due:
+            if n8n_workflow_id is not None:
+                by_workflow[n8n_workflow_id].append(n8n_execution_id)
+
+        semaphore = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+        found: Dict[str, Dict] = {}
+        missing: Set[str] = set()
+
+        async def fetch_workflow(n8n_workflow_id: str, wanted: List[str]) -> None:
+            # One list call covers every pending run of the workflow
+            async with semaphore:
+                try:
+                    executions = await n8n.get_workflow_executions(n8n_workflow_id, max(len(wanted) * 2, 20))
+                except Exception:
+                    return
+            if isinstance(executions, dict):
+                executions = executions.get("data", [])
+            wanted_ids = set(wanted)
+            for execution in executions:
+                if str(execution.get("id")) in wanted_ids:
+                    found[str(execution["id"])] = execution
+
+        async def fetch_execution(n8n_execution_id: str) -> None:
+            async with semaphore:
+                try:
+                    found[n8n_execution_id] = await n8n.get_execution_data(n8n_execution_id)
+                except Exception as e:
+                    if getattr(e, "upstream_status", None) == 404:
+                        missing.add(n8n_execution_id)
+
+        await asyncio.gather(*[
+            fetch_workflow(n8n_workflow_id, wanted)
+            for n8n_workflow_id, wanted in by_workflow.items()
+            if len(wanted) > 1
+        ])
+        # Single runs, and runs that fell outside the listed window
+        await asyncio.gather(*[
+            fetch_execution(n8n_execution_id)
+            for _, n8n_execution_id, _ in due
+            if n8n_execution_id not in found
+        ])
+
+        await self._apply([log_id for log_id, _, _ in due], found, missing)
+        return len(due)
+
+    async def _apply(self, log_ids: List[int], found: Dict[str, Dict], missing: Set[str]) -> None:
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            for log in await db.scalars(select(ExecutionLog).where(ExecutionLog.id.in_(log_ids))):
+                n8n_execution = found.get(log.n8n_execution_id)
+                if n8n_execution:
+                    log.status = n8n_execution.get("status", log.status)
+                    log.details = n8n_execution
+                    log.last_synced_at = now
+                elif log.workflow_id is None and log.n8n_execution_id in missing:
+                    # n8n dropped the run along with its workflow; nothing left to wait for
+                    log.status = "canceled"
+                    log.details = {"error": "Workflow deleted"}
+                    log.last_synced_at = now
+                if log.status in TERMINAL_EXECUTION_STATUSES:
+                    log.next_sync_at = None
+                else:
+                    log.next_sync_at = now + timedelta(seconds=next_sync_delay(log.execution_time, now))
+            await db.commit()
+
+execution_reconciler = ExecutionReconciler()
@@ -0,0 +1,120 @@
+"""
+Failure isolation for calls to an upstream service.
+
+CircuitBreaker stops calling an upstream after `failure_threshold`
+consecutive failures. While open, calls fail immediately. Once
+`reset_seconds` have passed it is half-open and lets a single probe
+through: success closes it again, failure reopens it for another
+`reset_seconds`.
+
+ConcurrencyLimiter caps the calls in flight. A caller waits at most
+`wait_seconds` for a slot and is shed with a 503 after that, so a slow
+upstream ties up a bounded number of requests instead of every worker.
+"""
+import asyncio
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from fastapi import HTTPException
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+def unavailable(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+def backoff(attempt: int, base: float) -> float:
+    """Full jitter: a random delay up to base * 2^attempt"""
+    return random.uniform(0, base * 2 ** attempt)
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0
+        return max(0.0, self._opened_at + self.reset_seconds - time.monotonic())
+
+    def before_call(self) -> None:
+        """Raise a 503 unless a call may go through now"""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        raise unavailable(
+            f"{self.name} is unavailable; retry later",
+            self.retry_after() or self.reset_seconds
+        )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        # A failed probe reopens it; calls that were already in flight when it opened don't extend it
+        if self._probing or (self._opened_at is None and self.failures >= self.failure_threshold):
+            print(f"Circuit breaker for {self.name} opened after {self.failures} failure(s)")
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def record_ignored(self) -> None:
+        """The call ended without telling us anything about the upstream"""
+        self._probing = False
+
+    def snapshot(self) -> Dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "retry_after": math.ceil(self.retry_after())
+        }
+
+class ConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, wait_seconds: float):
+        self.name = name
+        self.limit = limit
+        self.wait_seconds = wait_seconds
+        self.in_flight = 0
+        self.shed = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait_seconds)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise unavailable(f"Too many requests in flight to {self.name}; retry later", self.wait_seconds)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict:
+        return {"in_flight": self.in_flight, "limit": self.limit, "shed": self.shed}
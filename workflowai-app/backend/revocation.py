@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, List, Optional, Set
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from database import AsyncSessionLocal
+from models import RevokedToken, UserInvalidation
+from leases import acquire_lease
+from cache import TTLCache
+from config import (
+    REVOCATION_BLOOM_CAPACITY,
+    REVOCATION_BLOOM_ERROR_RATE,
+    REVOCATION_SYNC_SECONDS,
+    REVOCATION_PRUNE_SECONDS,
+    USER_CACHE_TTL_SECONDS,
+)
+
+def _epoch(moment: datetime) -> float:
+    """Epoch seconds for a naive UTC datetime"""
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives)"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+class RevocationStore:
+    """Revoked token ids, stored in the revoked_tokens table.
+
+    Each worker keeps a bloom filter of the table, refreshed every
+    REVOCATION_SYNC_SECONDS, so checking a live token is a memory lookup.
+    Only bloom hits (revoked tokens and rare false positives) go to the DB.
+    Expired rows are pruned by whichever worker holds the prune lease.
+
+    The same sync carries user invalidations (deactivation, a new password
+    or settings): rows of the user_invalidations table newer than the last
+    sync are handed to user_listeners, which drop cached snapshots.
+    """
+
+    LEASE_NAME = "token-revocation-prune"
+
+    def __init__(self):
+        self._bloom = BloomFilter(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_ERROR_RATE)
+        self._confirmed = TTLCache(maxsize=REVOCATION_BLOOM_CAPACITY)
+        self._watermark: Optional[datetime] = None
+        self._last_rebuild = datetime.min
+        self._user_watermark: Optional[datetime] = None
+        self._seen_invalidations: Set[int] = set()
+        self.user_listeners: List[Callable[[str], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def is_revoked(self, db, jti: str) -> bool:
+        if self._confirmed.get(jti):
+            return True
+        if jti not in self._bloom:
+            return False
+        expires_at = await db.scalar(
+            select(RevokedToken.expires_at).where(RevokedToken.jti == jti)
+        )
+        if expires_at is None:
+            return False
+        self._confirmed.set(jti, True, expires_at=_epoch(expires_at))
+        return True
+
+    async def revoke(self, db, jti: str, expires_at: datetime) -> None:
+        """Record a revoked token id; it is rejected by this worker immediately"""
+        try:
+            db.add(RevokedToken(jti=jti, expires_at=expires_at, revoked_at=datetime.utcnow()))
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+        self._bloom.add(jti)
+        self._confirmed.set(jti, True, expires_at=_epoch(expires_at))
+
+    def invalidate_user(self, db, email: str) -> None:
+        """Record that a user's cached snapshot is stale (the caller commits);
+        every worker, this one included, drops it on its next sync"""
+        db.add(UserInvalidation(email=email, invalidated_at=datetime.utcnow()))
+        for listener in self.user_listeners:
+            listener(email)
+
+    async def sync(self) -> None:
+        """Pull newly revoked ids into the bloom filter, rebuilding it when due,
+        and drop users invalidated since the last sync"""
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            rebuild = (
+                self._watermark is None
+                or self._bloom.count > self._bloom.capacity
+                or now - self._last_rebuild > timedelta(seconds=REVOCATION_PRUNE_SECONDS)
+            )
+            query = select(RevokedToken.jti, RevokedToken.revoked_at).where(RevokedToken.expires_at > now)
+            if not rebuild:
+                # Overlap the window a little to tolerate clock skew between workers
+                query = query.where(RevokedToken.revoked_at >= self._watermark - timedelta(seconds=5))
+            rows = (await db.execute(query)).all()
+
+            bloom = self._bloom
+            if rebuild:
+                capacity = max(REVOCATION_BLOOM_CAPACITY, len(rows) * 2)
+                bloom = BloomFilter(capacity, REVOCATION_BLOOM_ERROR_RATE)
+                self._last_rebuild = now
+            for jti, revoked_at in rows:
+                bloom.add(jti)
+                if self._watermark is None or revoked_at > self._watermark:
+                    self._watermark = revoked_at
+            if self._watermark is None:
+                self._watermark = now
+            # Swap in one step so concurrent checks never see a half-built filter
+            self._bloom = bloom
+
+            if self._user_watermark is None:
+                # Nothing is cached yet when a worker starts
+                self._user_watermark = now
+            else:
+                await self._sync_users(db)
+
+    async def _sync_users(self, db) -> None:
+        invalidations = (await db.execute(
+            select(UserInvalidation.id, UserInvalidation.email, UserInvalidation.invalidated_at)
+            .where(UserInvalidation.invalidated_at >= self._user_watermark - timedelta(seconds=5))
+        )).all()
+        for invalidation_id, email, invalidated_at in invalidations:
+            # The overlap window returns rows already handled last time
+            if invalidation_id not in self._seen_invalidations:
+                for listener in self.user_listeners:
+                    listener(email)
+            self._user_watermark = max(self._user_watermark, invalidated_at)
+        self._seen_invalidations = {invalidation_id for invalidation_id, _, _ in invalidations}
+
+    async def prune(self) -> None:
+        async with AsyncSessionLocal() as db:
+            if await acquire_lease(db, self.LEASE_NAME, ttl=REVOCATION_PRUNE_SECONDS):
+                now = datetime.utcnow()
+                await db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+                # Every worker has synced long before a cached snapshot would expire anyway
+                stale = now - timedelta(seconds=max(USER_CACHE_TTL_SECONDS, REVOCATION_SYNC_SECONDS) * 2)
+                await db.execute(delete(UserInvalidation).where(UserInvalidation.invalidated_at < stale))
+                await db.commit()
+
+    async def start(self) -> None:
+        await self.sync()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        last_prune = datetime.min
+        while True:
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+            try:
+                if datetime.utcnow() - last_prune > timedelta(seconds=REVOCATION_PRUNE_SECONDS):
+                    await self.prune()
+                    last_prune = datetime.utcnow()
+                await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Token revocation sync error: {str(e)}")
+
+revocation_store = RevocationStore()
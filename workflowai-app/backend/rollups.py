@@ -0,0 +1,316 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Literal, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import event, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal, get_async_db, naive_utc
+from models import (
+    DailyExecutionRollup,
+    ExecutionLog,
+    HourlyExecutionRollup,
+    User,
+    TERMINAL_EXECUTION_STATUSES,
+)
+from leases import acquire_lease, renew_lease
+from auth import get_current_active_user
+from config import ROLLUP_INTERVAL, ROLLUP_BATCH_SIZE
+
+router = APIRouter()
+
+LEASE_NAME = "execution-rollups"
+# Upper bounds (ms) of the latency histogram bins; one more bin holds anything slower.
+# Never change these once rollups exist: stored histograms are positional.
+LATENCY_BOUNDS_MS = [
+    100, 250, 500, 1000, 2500, 5000, 10000, 30000,
+    60000, 120000, 300000, 600000, 1800000, 3600000,
+]
+GRAINS = {
+    "hour": (HourlyExecutionRollup, timedelta(hours=1), timedelta(days=31)),
+    "day": (DailyExecutionRollup, timedelta(days=1), timedelta(days=366)),
+}
+
+@event.listens_for(Session, "before_flush")
+def _mark_finished(session, flush_context, instances):
+    """Queue a run for the rollups the first time it reaches a terminal status"""
+    now = datetime.utcnow()
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, ExecutionLog) and obj.status in TERMINAL_EXECUTION_STATUSES and obj.finished_at is None:
+            obj.finished_at = now
+            obj.rollup_pending = True
+
+def _parse_time(value) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def n8n_duration_ms(details) -> Optional[int]:
+    """Run time from n8n's own startedAt/stoppedAt, when the details carry both"""
+    if isinstance(details, dict):
+        started, stopped = _parse_time(details.get("startedAt")), _parse_time(details.get("stoppedAt"))
+        if started and stopped and (started.tzinfo is None) == (stopped.tzinfo is None):
+            return max(int((stopped - started).total_seconds() * 1000), 0)
+    return None
+
+def execution_duration_ms(execution_time, finished_at, details) -> Tuple[int, bool]:
+    """(duration, measured by n8n); falls back to queue-to-finish time, which includes queueing"""
+    duration = n8n_duration_ms(details)
+    if duration is not None:
+        return duration, True
+    if execution_time and finished_at:
+        return max(int((finished_at - execution_time).total_seconds() * 1000), 0), False
+    return 0, False
+
+def histogram_bin(duration_ms: int) -> int:
+    for index, bound in enumerate(LATENCY_BOUNDS_MS):
+        if duration_ms <= bound:
+            return index
+    return len(LATENCY_BOUNDS_MS)
+
+def percentile(histogram: List[int], p: float, max_ms: int) -> Optional[float]:
+    """Estimate a percentile by interpolating inside the histogram bin that holds it"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = total * p / 100
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lower = LATENCY_BOUNDS_MS[index - 1] if index else 0
+            upper = LATENCY_BOUNDS_MS[index] if index < len(LATENCY_BOUNDS_MS) else max_ms
+            upper = min(upper, max_ms)
+            lower = min(lower, upper)
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return float(max_ms)
+
+def _bucket_start(moment: datetime, grain: str) -> datetime:
+    if grain == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _empty(user_id: int) -> Dict:
+    return {
+        "user_id": user_id,
+        "total": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "duration_sum_ms": 0,
+        "duration_max_ms": 0,
+        "histogram": [0] * (len(LATENCY_BOUNDS_MS) + 1)
+    }
+
+def _merge(into: Dict, other) -> None:
+    get = other.get if isinstance(other, dict) else lambda name: getattr(other, name)
+    for name in ("total", "succeeded", "failed", "duration_sum_ms"):
+        into[name] += get(name)
+    into["duration_max_ms"] = max(into["duration_max_ms"], get("duration_max_ms"))
+    into["histogram"] = [a + b for a, b in zip(into["histogram"], get("histogram"))]
+
+class ExecutionRollupWorker:
+    """Folds finished execution logs into hourly and daily rollup buckets.
+
+    Runs are flagged rollup_pending when they first finish; the lease
+    holder folds them in batches and clears the flag in the same
+    transaction, so every run is counted exactly once. Each batch starts
+    by renewing the lease, so a long drain keeps it and a holder that
+    stalled past it stops; a batch whose rows were cleared by someone
+    else is rolled back. Status edits made after a run was folded are not
+    re-counted.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        # Runs folded by this process, and how many of them had no n8n timings
+        self.folded = 0
+        self.fallbacks = 0
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await self._acquire():
+                    # Drain the backlog, then wait for the next round
+                    while await self.fold_batch() >= ROLLUP_BATCH_SIZE:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Execution rollup error: {str(e)}")
+            await asyncio.sleep(ROLLUP_INTERVAL)
+
+    async def _acquire(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=ROLLUP_INTERVAL * 3)
+
+    async def fold_batch(self) -> int:
+        """Fold one batch of pending runs; returns how many were pending"""
+        async with AsyncSessionLocal() as db:
+            if not await renew_lease(db, LEASE_NAME, ttl=ROLLUP_INTERVAL * 3):
+                await db.rollback()
+                print("Execution rollups lost their lease")
+                return 0
+            rows = (await db.execute(
+                select(
+                    ExecutionLog.id,
+                    ExecutionLog.workflow_id,
+                    ExecutionLog.user_id,
+                    ExecutionLog.status,
+                    ExecutionLog.execution_time,
+                    ExecutionLog.finished_at,
+                    ExecutionLog.details
+                )
+                .where(ExecutionLog.rollup_pending.is_(True))
+                .order_by(ExecutionLog.id)
+                .limit(ROLLUP_BATCH_SIZE)
+            )).all()
+            if not rows:
+                return 0
+
+            folded = {grain: {} for grain in GRAINS}
+            counted = fallbacks = 0
+            for row in rows:
+                if row.workflow_id is None or row.execution_time is None:
+                    continue
+                counted += 1
+                duration, measured = execution_duration_ms(row.execution_time, row.finished_at, row.details)
+                fallbacks += not measured
+                for grain, buckets in folded.items():
+                    key = (row.workflow_id, _bucket_start(row.execution_time, grain))
+                    bucket = buckets.setdefault(key, _empty(row.user_id))
+                    bucket["total"] += 1
+                    bucket["succeeded" if row.status == "success" else "failed"] += 1
+                    bucket["duration_sum_ms"] += duration
+                    bucket["duration_max_ms"] = max(bucket["duration_max_ms"], duration)
+                    bucket["histogram"][histogram_bin(duration)] += 1
+
+            for grain, buckets in folded.items():
+                if buckets:
+                    await self._write_buckets(db, GRAINS[grain][0], buckets)
+
+            cleared = await db.execute(
+                update(ExecutionLog)
+                .where(ExecutionLog.id.in_([row.id for row in rows]), ExecutionLog.rollup_pending.is_(True))
+                .values(rollup_pending=False)
+            )
+            if cleared.rowcount != len(rows):
+                # Another folder got to some of these rows first
+                await db.rollback()
+                print("Execution rollups: batch already folded elsewhere, rolled back")
+                return 0
+            await db.commit()
+        self.folded += counted
+        self.fallbacks += fallbacks
+        if fallbacks:
+            print(f"Execution rollups: {fallbacks} of {counted} run(s) had no n8n start/stop times; used queue-to-finish time")
+        return len(rows)
+
+    def snapshot(self) -> Dict:
+        return {"folded": self.folded, "duration_fallbacks": self.fallbacks}
+
+    async def _write_buckets(self, db: AsyncSession, model, buckets: Dict) -> None:
+        existing = {
+            (bucket.workflow_id, bucket.bucket_start): bucket
+            for bucket in await db.scalars(
+                select(model).where(tuple_(model.workflow_id, model.bucket_start).in_(list(buckets)))
+            )
+        }
+        for (workflow_id, bucket_start), values in buckets.items():
+            bucket = existing.get((workflow_id, bucket_start))
+            if bucket is None:
+                db.add(model(workflow_id=workflow_id, bucket_start=bucket_start, **values))
+                continue
+            merged = _empty(bucket.user_id)
+            _merge(merged, bucket)
+            _merge(merged, values)
+            for name, value in merged.items():
+                setattr(bucket, name, value)
+
+execution_rollups = ExecutionRollupWorker()
+
+class RollupBucket(BaseModel):
+    bucket_start: datetime
+    workflow_id: Optional[int] = None
+    total: int
+    succeeded: int
+    failed: int
+    success_rate: float
+    error_rate: float
+    avg_ms: float
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    p99_ms: Optional[float] = None
+    max_ms: int
+
+def _summarize(bucket_start: datetime, workflow_id: Optional[int], values: Dict) -> Dict:
+    total = values["total"]
+    max_ms = values["duration_max_ms"]
+    return {
+        "bucket_start": bucket_start,
+        "workflow_id": workflow_id,
+        "total": total,
+        "succeeded": values["succeeded"],
+        "failed": values["failed"],
+        "success_rate": values["succeeded"] / total if total else 0.0,
+        "error_rate": values["failed"] / total if total else 0.0,
+        "avg_ms": values["duration_sum_ms"] / total if total else 0.0,
+        "p50_ms": percentile(values["histogram"], 50, max_ms),
+        "p95_ms": percentile(values["histogram"], 95, max_ms),
+        "p99_ms": percentile(values["histogram"], 99, max_ms),
+        "max_ms": max_ms
+    }
+
+@router.get("/rollups/", response_model=List[RollupBucket])
+async def read_rollups(
+    grain: Literal["hour", "day"] = "hour",
+    workflow_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Execution counts, rates and latency percentiles per time bucket.
+
+    Without workflow_id, buckets are merged across all of the user's
+    workflows. Reads only the rollup tables, so cost depends on the
+    number of buckets in the range, not on the size of the log table.
+    """
+    model, step, max_range = GRAINS[grain]
+    since, until = naive_utc(since), naive_utc(until)
+    until = until or datetime.utcnow()
+    since = since or until - step * (24 if grain == "hour" else 30)
+    if since >= until or until - since > max_range:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range must be positive and at most {max_range.days} days for grain={grain}"
+        )
+
+    query = select(model).where(
+        model.user_id == current_user.id,
+        model.bucket_start >= _bucket_start(since, grain),
+        model.bucket_start < until
+    )
+    if workflow_id is not None:
+        query = query.where(model.workflow_id == workflow_id)
+    rows = (await db.scalars(query.order_by(model.bucket_start))).all()
+
+    merged: Dict[datetime, Dict] = {}
+    for row in rows:
+        _merge(merged.setdefault(row.bucket_start, _empty(row.user_id)), row)
+    return [_summarize(bucket_start, workflow_id, values) for bucket_start, values in merged.items()]
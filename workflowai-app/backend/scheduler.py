@@ -0,0 +1,320 @@
+"""
+Cron schedules for workflows.
+
+Every WorkflowSchedule keeps its next fire time (naive UTC) in an indexed
+column. The holder of the scheduler lease fires them: every
+SCHEDULER_REFILL_SECONDS it loads the schedules due within
+SCHEDULER_LOOKAHEAD_SECONDS into a heap, then sleeps until the earliest
+one. A tick only reads the rows about to fire, however many schedules
+there are.
+
+Each batch fires in one transaction that starts by renewing the lease.
+That write proves this process is still the leader and, on SQLite, takes
+the write lock, so a leader that stalled past its lease can't fire an
+occurrence its successor already fired. The transaction re-reads the
+rows, moves next_fire_at on and queues the runs on the execution queue.
+
+Occurrences more than SCHEDULER_MISFIRE_GRACE_SECONDS late follow the
+schedule's misfire policy: fire_once runs once, skip drops them and
+fire_all replays each one (at most SCHEDULER_MAX_CATCHUP). Schedules of
+inactive workflows keep moving on without queueing runs.
+"""
+import asyncio
+import heapq
+import time
+from functools import lru_cache
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, List, Literal, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from croniter import croniter
+from fastapi import APIRouter, Depends, HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, get_async_db
+from models import Lease, Workflow, WorkflowSchedule
+from auth import get_current_active_user
+from execution_queue import execution_queue
+from leases import WORKER_ID, acquire_lease
+from config import (
+    SCHEDULER_FIRE_BATCH_SIZE,
+    SCHEDULER_LEASE_TTL,
+    SCHEDULER_LOAD_LIMIT,
+    SCHEDULER_LOOKAHEAD_SECONDS,
+    SCHEDULER_MAX_CATCHUP,
+    SCHEDULER_MISFIRE_GRACE_SECONDS,
+    SCHEDULER_REFILL_SECONDS,
+    SCHEDULES_MAX_PER_WORKFLOW,
+)
+
+router = APIRouter()
+
+LEASE_NAME = "workflow-scheduler"
+
+def validate_schedule(cron: str, timezone: str) -> None:
+    # Five fields only: croniter's optional sixth (seconds) field would allow per-second runs
+    if len(cron.split()) != 5 or not croniter.is_valid(cron):
+        raise HTTPException(status_code=400, detail="Invalid cron expression; use 'minute hour day month weekday'")
+    try:
+        ZoneInfo(timezone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {timezone}")
+
+@lru_cache(maxsize=4096)
+def next_fire_time(cron: str, timezone: str, after: datetime) -> datetime:
+    """First occurrence strictly after `after`; both naive UTC.
+    Cached: a batch mostly asks for the same few expressions after the same instant."""
+    start = after.replace(tzinfo=dt_timezone.utc).astimezone(ZoneInfo(timezone))
+    return croniter(cron, start).get_next(datetime).astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+def plan_fires(row, now: datetime) -> Tuple[List[datetime], datetime]:
+    """The occurrences to run now and the next fire time, applying the misfire policy"""
+    due = row.next_fire_at
+    if (now - due).total_seconds() <= SCHEDULER_MISFIRE_GRACE_SECONDS or row.misfire_policy == "fire_once":
+        fires = [due]
+    elif row.misfire_policy == "fire_all":
+        fires = [due]
+        while len(fires) < SCHEDULER_MAX_CATCHUP:
+            following = next_fire_time(row.cron, row.timezone, fires[-1])
+            if following > now:
+                break
+            fires.append(following)
+    else:
+        fires = []
+    return fires, next_fire_time(row.cron, row.timezone, now)
+
+class WorkflowScheduler:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._heap: List[Tuple[datetime, int]] = []
+        self._is_leader = False
+
+    def notify(self) -> None:
+        """Reload the heap now, after a schedule was created or changed in this process"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        next_refill = 0.0
+        while True:
+            timeout = SCHEDULER_REFILL_SECONDS
+            try:
+                if self._wakeup.is_set() or time.monotonic() >= next_refill:
+                    self._wakeup.clear()
+                    next_refill = time.monotonic() + SCHEDULER_REFILL_SECONDS
+                    self._is_leader = await self._acquire()
+                    self._heap = await self._load() if self._is_leader else []
+                if self._is_leader:
+                    await self._fire_due()
+                timeout = next_refill - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.utcnow()).total_seconds())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Workflow scheduler error: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _acquire(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=SCHEDULER_LEASE_TTL)
+
+    async def _load(self) -> List[Tuple[datetime, int]]:
+        """Schedules due within the lookahead, earliest first (a sorted list is a valid heap)"""
+        horizon = datetime.utcnow() + timedelta(seconds=SCHEDULER_LOOKAHEAD_SECONDS)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(WorkflowSchedule.next_fire_at, WorkflowSchedule.id)
+                .where(WorkflowSchedule.next_fire_at <= horizon)
+                .order_by(WorkflowSchedule.next_fire_at)
+                .limit(SCHEDULER_LOAD_LIMIT)
+            )).all()
+        return [tuple(row) for row in rows]
+
+    async def _fire_due(self) -> None:
+        now = datetime.utcnow()
+        while self._heap and self._heap[0][0] <= now:
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < SCHEDULER_FIRE_BATCH_SIZE:
+                batch.append(heapq.heappop(self._heap)[1])
+            if not await self._fire(batch, now):
+                print("Workflow scheduler lost its lease")
+                self._is_leader = False
+                self._heap = []
+                return
+
+    async def _fire(self, schedule_ids: List[int], now: datetime) -> bool:
+        """Fire one batch; False if this process is no longer the leader"""
+        table = WorkflowSchedule.__table__
+        async with AsyncSessionLocal() as db:
+            fenced = await db.execute(
+                update(Lease)
+                .where(Lease.name == LEASE_NAME, Lease.holder == WORKER_ID)
+                .values(expires_at=now + timedelta(seconds=SCHEDULER_LEASE_TTL))
+            )
+            if fenced.rowcount != 1:
+                await db.rollback()
+                return False
+            rows = (await db.execute(
+                select(
+                    WorkflowSchedule.id, WorkflowSchedule.workflow_id, WorkflowSchedule.user_id,
+                    WorkflowSchedule.cron, WorkflowSchedule.timezone, WorkflowSchedule.payload,
+                    WorkflowSchedule.misfire_policy, WorkflowSchedule.next_fire_at, Workflow.is_active
+                )
+                .join(Workflow, Workflow.id == WorkflowSchedule.workflow_id)
+                .where(WorkflowSchedule.id.in_(schedule_ids), WorkflowSchedule.next_fire_at <= now)
+            )).all()
+
+            runs, fired, moved = [], [], []
+            for row in rows:
+                try:
+                    fires, next_fire_at = plan_fires(row, now)
+                except Exception as e:
+                    # e.g. a timezone that disappeared from the system database
+                    print(f"Disabling schedule {row.id}: {str(e)}")
+                    fires, next_fire_at = [], None
+                if row.is_active is False:
+                    fires = []
+                runs.extend((row.workflow_id, row.user_id, row.payload) for _ in fires)
+                (fired if fires else moved).append({"b_id": row.id, "b_next": next_fire_at})
+
+            stmt = update(table).where(table.c.id == bindparam("b_id")).values(next_fire_at=bindparam("b_next"))
+            conn = await db.connection()
+            if fired:
+                await conn.execute(stmt.values(last_fired_at=now), fired)
+            if moved:
+                await conn.execute(stmt, moved)
+            if runs:
+                await execution_queue.enqueue_many(db, runs)
+            await db.commit()
+        if runs:
+            execution_queue.notify()
+        return True
+
+workflow_scheduler = WorkflowScheduler()
+
+class ScheduleCreate(BaseModel):
+    cron: str
+    timezone: str = "UTC"
+    payload: Optional[Dict] = None  # execution data of every run
+    misfire_policy: Literal["fire_once", "skip", "fire_all"] = "fire_once"
+    is_enabled: bool = True
+
+class ScheduleUpdate(BaseModel):
+    cron: Optional[str] = None
+    timezone: Optional[str] = None
+    payload: Optional[Dict] = None
+    misfire_policy: Optional[Literal["fire_once", "skip", "fire_all"]] = None
+    is_enabled: Optional[bool] = None
+
+class ScheduleResponse(BaseModel):
+    id: int
+    workflow_id: int
+    cron: str
+    timezone: str
+    payload: Optional[Dict] = None
+    misfire_policy: str
+    is_enabled: bool
+    next_fire_at: Optional[datetime] = None
+    last_fired_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+async def _owned_workflow(db: AsyncSession, workflow_id: int, user_id: int) -> Workflow:
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == user_id))
+    if workflow is None:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return workflow
+
+async def _owned_schedule(db: AsyncSession, workflow_id: int, schedule_id: int, user_id: int) -> WorkflowSchedule:
+    schedule = await db.scalar(select(WorkflowSchedule).where(
+        WorkflowSchedule.id == schedule_id,
+        WorkflowSchedule.workflow_id == workflow_id,
+        WorkflowSchedule.user_id == user_id
+    ))
+    if schedule is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule
+
+def _reschedule(schedule: WorkflowSchedule) -> None:
+    schedule.next_fire_at = (
+        next_fire_time(schedule.cron, schedule.timezone, datetime.utcnow()) if schedule.is_enabled else None
+    )
+
+@router.get("/workflows/{workflow_id}/schedules", response_model=List[ScheduleResponse])
+async def read_schedules(workflow_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_active_user)):
+    await _owned_workflow(db, workflow_id, current_user.id)
+    return (await db.scalars(
+        select(WorkflowSchedule).where(WorkflowSchedule.workflow_id == workflow_id).order_by(WorkflowSchedule.id)
+    )).all()
+
+@router.post("/workflows/{workflow_id}/schedules", response_model=ScheduleResponse, status_code=status.HTTP_201_CREATED)
+async def create_schedule(
+    workflow_id: int,
+    schedule: ScheduleCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Run the workflow on a cron schedule, evaluated in `timezone`"""
+    await _owned_workflow(db, workflow_id, current_user.id)
+    validate_schedule(schedule.cron, schedule.timezone)
+    count = await db.scalar(select(func.count(WorkflowSchedule.id)).where(WorkflowSchedule.workflow_id == workflow_id))
+    if count >= SCHEDULES_MAX_PER_WORKFLOW:
+        raise HTTPException(status_code=400, detail=f"At most {SCHEDULES_MAX_PER_WORKFLOW} schedules per workflow")
+    db_schedule = WorkflowSchedule(workflow_id=workflow_id, user_id=current_user.id, **schedule.dict())
+    _reschedule(db_schedule)
+    db.add(db_schedule)
+    await db.commit()
+    await db.refresh(db_schedule)
+    workflow_scheduler.notify()
+    return db_schedule
+
+@router.put("/workflows/{workflow_id}/schedules/{schedule_id}", response_model=ScheduleResponse)
+async def update_schedule(
+    workflow_id: int,
+    schedule_id: int,
+    schedule_update: ScheduleUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_active_user)
+):
+    db_schedule = await _owned_schedule(db, workflow_id, schedule_id, current_user.id)
+    for field, value in schedule_update.dict(exclude_unset=True).items():
+        # Only the payload can be cleared
+        if value is not None or field == "payload":
+            setattr(db_schedule, field, value)
+    validate_schedule(db_schedule.cron, db_schedule.timezone)
+    _reschedule(db_schedule)
+    await db.commit()
+    await db.refresh(db_schedule)
+    workflow_scheduler.notify()
+    return db_schedule
+
+@router.delete("/workflows/{workflow_id}/schedules/{schedule_id}")
+async def delete_schedule(
+    workflow_id: int,
+    schedule_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_active_user)
+):
+    db_schedule = await _owned_schedule(db, workflow_id, schedule_id, current_user.id)
+    await db.delete(db_schedule)
+    await db.commit()
+    return {"message": "Schedule deleted successfully"}
@@ -0,0 +1,139 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy import event, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models import DailyExecutionStats, ExecutionLog, User, UserStats, Workflow, UNKNOWN_STATUS
+from database import get_async_db
+from auth import get_current_active_user
+
+router = APIRouter()
+
+class DailyCount(BaseModel):
+    day: date
+    status: str
+    count: int
+
+    class Config:
+        orm_mode = True
+
+class StatsResponse(BaseModel):
+    total_workflows: int
+    active_workflows: int
+    executions_today: int
+    executions_today_by_status: Dict[str, int]
+    daily: List[DailyCount]
+
+def _insert(conn, table):
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    return dialect.insert(table)
+
+def _increment(conn, table, keys: Dict, deltas: Dict) -> None:
+    """Atomically add `deltas` to the row identified by `keys`, creating it if needed"""
+    stmt = _insert(conn, table).values(**keys, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + stmt.excluded[column] for column in deltas}
+    )
+    conn.execute(stmt)
+
+def apply_execution_deltas(conn, deltas: Dict[tuple, int]) -> None:
+    """Apply {(user_id, day, status): change} to the daily execution counters"""
+    table = DailyExecutionStats.__table__
+    for (user_id, day, status), change in deltas.items():
+        if change and user_id is not None:
+            _increment(conn, table, {"user_id": user_id, "day": day, "status": status}, {"count": change})
+
+def apply_workflow_deltas(conn, deltas: Dict[int, List[int]]) -> None:
+    """Apply {owner_id: [total change, active change]} to the workflow counters"""
+    table = UserStats.__table__
+    for user_id, (total, active) in deltas.items():
+        if (total or active) and user_id is not None:
+            _increment(
+                conn, table, {"user_id": user_id},
+                {"total_workflows": total, "active_workflows": active}
+            )
+
+def execution_key(user_id: int, execution_time: Optional[datetime], status: Optional[str]) -> tuple:
+    return (user_id, (execution_time or datetime.utcnow()).date(), status or UNKNOWN_STATUS)
+
+def _history(obj, attribute: str):
+    """(old, new) if the attribute changed in this flush, else None"""
+    history = inspect(obj).attrs[attribute].history
+    if not history.added and not history.deleted:
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+@event.listens_for(Session, "after_flush")
+def _update_counters(session, flush_context):
+    """Keep the counters in step with every ORM write of logs and workflows.
+
+    Runs inside the flushing transaction, so counters commit or roll back
+    together with the rows they describe.
+    """
+    executions = defaultdict(int)
+    workflows = defaultdict(lambda: [0, 0])
+
+    for obj in session.new:
+        if isinstance(obj, ExecutionLog):
+            executions[execution_key(obj.user_id, obj.execution_time, obj.status)] += 1
+        elif isinstance(obj, Workflow):
+            workflows[obj.owner_id][0] += 1
+            workflows[obj.owner_id][1] += obj.is_active is not False
+
+    for obj in session.dirty:
+        if isinstance(obj, ExecutionLog):
+            change = _history(obj, "status")
+            if change and change[0] != change[1]:
+                executions[execution_key(obj.user_id, obj.execution_time, change[0])] -= 1
+                executions[execution_key(obj.user_id, obj.execution_time, change[1])] += 1
+        elif isinstance(obj, Workflow):
+            change = _history(obj, "is_active")
+            if change and bool(change[0]) != bool(change[1]):
+                workflows[obj.owner_id][1] += 1 if change[1] else -1
+
+    for obj in session.deleted:
+        if isinstance(obj, ExecutionLog):
+            executions[execution_key(obj.user_id, obj.execution_time, obj.status)] -= 1
+        elif isinstance(obj, Workflow):
+            workflows[obj.owner_id][0] -= 1
+            workflows[obj.owner_id][1] -= bool(obj.is_active)
+
+    if executions or workflows:
+        conn = session.connection()
+        apply_execution_deltas(conn, executions)
+        apply_workflow_deltas(conn, workflows)
+
+@router.get("/stats/", response_model=StatsResponse)
+async def read_stats(
+    days: int = Query(7, ge=1, le=90),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Dashboard numbers, read from the counter tables only"""
+    counters = await db.get(UserStats, current_user.id)
+    today = datetime.utcnow().date()
+    daily = (await db.scalars(
+        select(DailyExecutionStats)
+        .where(
+            DailyExecutionStats.user_id == current_user.id,
+            DailyExecutionStats.day > today - timedelta(days=days),
+            DailyExecutionStats.count != 0
+        )
+        .order_by(DailyExecutionStats.day, DailyExecutionStats.status)
+    )).all()
+
+    today_by_status = {row.status: row.count for row in daily if row.day == today}
+    return {
+        "total_workflows": counters.total_workflows if counters else 0,
+        "active_workflows": counters.active_workflows if counters else 0,
+        "executions_today": sum(today_by_status.values()),
+        "executions_today_by_status": today_by_status,
+        "daily": daily
+    }
@@ -1,19 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from models import Template
-from database import get_db
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+from models import Template, TemplateDefinition
+from database import IS_SQLITE, get_async_db
 from auth import get_current_active_user, get_current_admin_user
+from cache import TTLCache
+from config import TEMPLATE_CACHE_SIZE, TEMPLATE_CACHE_TTL_SECONDS, TEMPLATE_DEFINITION_TTL_SECONDS
+from n8n_service import n8n
+from workflows import WorkflowResponse, create_owned_workflow
 from pydantic import BaseModel
 
 router = APIRouter()
 
+MAX_TEMPLATE_PAGE = 1000
+# Serialized catalogue pages keyed by (catalogue version, query). The version
+# is read from the database on every request, so an edit made through any
+# worker retires every worker's pages at once
+_pages = TTLCache(maxsize=TEMPLATE_CACHE_SIZE, ttl=TEMPLATE_CACHE_TTL_SECONDS)
+# Parts of an n8n workflow that a copy needs
+DEFINITION_KEYS = ("nodes", "connections", "settings")
+
 class TemplateCreate(BaseModel):
     name: str
     description: str
     n8n_workflow_id: str
     category: str
 
+class TemplateInstantiate(BaseModel):
+    name: Optional[str] = None
+    description: Optional[str] = None
+
 class TemplateResponse(BaseModel):
     id: int
     name: str
@@ -24,8 +46,38 @@ class TemplateResponse(BaseModel):
     class Config:
         orm_mode = True
 
+def invalidate_templates() -> None:
+    # Pages of the old version would only age out; free them now
+    _pages.clear()
+
+async def catalogue_version(db: AsyncSession) -> tuple:
+    """Changes with every create (max id), update (max updated_at) and delete (count)"""
+    return tuple((await db.execute(
+        select(func.count(Template.id), func.max(Template.id), func.max(Template.updated_at))
+    )).one())
+
+def _serialize(template: Template) -> dict:
+    return {name: getattr(template, name) for name in TemplateResponse.__annotations__}
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def keyword_filter(terms: List[str]):
+    """Prefix match of every term, through the dialect's full-text index"""
+    if IS_SQLITE:
+        match = " ".join(f'"{term}"*' for term in terms)
+        return Template.id.in_(
+            select(text("rowid")).select_from(text("templates_fts"))
+            .where(text("templates_fts MATCH :match").bindparams(match=match))
+        )
+    query = " & ".join(f"{term}:*" for term in terms)
+    return text("templates.search_vector @@ to_tsquery('simple', :query)").bindparams(query=query)
+
 @router.post("/templates/", response_model=TemplateResponse)
-def create_template(template: TemplateCreate, db: Session = Depends(get_db), current_user = Depends(get_current_admin_user)):
+async def create_template(template: TemplateCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_admin_user)):
     db_template = Template(
         name=template.name,
         description=template.description,
@@ -33,25 +85,57 @@ def create_template(template: TemplateCreate, db: Session = Depends(get_db), cur
         category=template.category
     )
     db.add(db_template)
-    db.commit()
-    db.refresh(db_template)
+    await db.commit()
+    await db.refresh(db_template)
+    invalidate_templates()
     return db_template
 
 @router.get("/templates/", response_model=List[TemplateResponse])
-def read_templates(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    templates = db.query(Template).offset(skip).limit(limit).all()
-    return templates
+async def read_templates(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_TEMPLATE_PAGE),
+    category: Optional[str] = None,
+    q: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Public catalogue, optionally filtered by category and keywords.
+
+    Pages are served from an in-memory cache of serialized JSON with a
+    strong ETag; a matching If-None-Match gets an empty 304. A cheap
+    aggregate query checks that the catalogue hasn't changed since.
+    """
+    terms = tuple(re.findall(r"\w+", q.lower())) if q else ()
+    key = (await catalogue_version(db), skip, limit, category, terms)
+    cached = _pages.get(key)
+    if cached is None:
+        query = select(Template)
+        if category is not None:
+            query = query.where(Template.category == category)
+        if terms:
+            query = query.where(keyword_filter(list(terms)))
+        templates = (await db.scalars(query.order_by(Template.id).offset(skip).limit(limit))).all()
+        body = json.dumps([_serialize(template) for template in templates]).encode()
+        cached = (body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        # The page was read after the version, so it is never older than its key
+        _pages.set(key, cached)
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/templates/{template_id}", response_model=TemplateResponse)
-def read_template(template_id: int, db: Session = Depends(get_db)):
-    template = db.query(Template).filter(Template.id == template_id).first()
+async def read_template(template_id: int, db: AsyncSession = Depends(get_async_db)):
+    template = await db.scalar(select(Template).where(Template.id == template_id))
     if template is None:
         raise HTTPException(status_code=404, detail="Template not found")
     return template
 
 @router.put("/templates/{template_id}", response_model=TemplateResponse)
-def update_template(template_id: int, template: TemplateCreate, db: Session = Depends(get_db), current_user = Depends(get_current_admin_user)):
-    db_template = db.query(Template).filter(Template.id == template_id).first()
+async def update_template(template_id: int, template: TemplateCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_admin_user)):
+    db_template = await db.scalar(select(Template).where(Template.id == template_id))
     if db_template is None:
         raise HTTPException(status_code=404, detail="Template not found")
     
@@ -59,16 +143,75 @@ def update_template(template_id: int, template: TemplateCreate, db: Session = De
     db_template.description = template.description
     db_template.n8n_workflow_id = template.n8n_workflow_id
     db_template.category = template.category
+    # Fetch the definition again on next use, the admin may have changed it in n8n
+    await db.execute(delete(TemplateDefinition).where(TemplateDefinition.template_id == template_id))
     
-    db.commit()
-    db.refresh(db_template)
+    await db.commit()
+    await db.refresh(db_template)
+    invalidate_templates()
     return db_template
 
 @router.delete("/templates/{template_id}")
-def delete_template(template_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_admin_user)):
-    template = db.query(Template).filter(Template.id == template_id).first()
+async def delete_template(template_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_admin_user)):
+    template = await db.scalar(select(Template).where(Template.id == template_id))
     if template is None:
         raise HTTPException(status_code=404, detail="Template not found")
-    db.delete(template)
-    db.commit()
-    return {"message": "Template deleted successfully"}
\ No newline at end of file
+    await db.execute(delete(TemplateDefinition).where(TemplateDefinition.template_id == template_id))
+    await db.delete(template)
+    await db.commit()
+    invalidate_templates()
+    return {"message": "Template deleted successfully"}
+
+async def get_definition(db: AsyncSession, template: Template) -> Dict:
+    """The template's n8n definition, read from n8n only when the cached copy is missing or stale.
+    The workflow sync drops copies whose n8n workflow changed (its updatedAt moved on)."""
+    cached = await db.get(TemplateDefinition, template.id)
+    now = datetime.utcnow()
+    if (
+        cached is not None
+        and cached.n8n_workflow_id == template.n8n_workflow_id
+        and now - cached.fetched_at < timedelta(seconds=TEMPLATE_DEFINITION_TTL_SECONDS)
+    ):
+        return cached.definition
+
+    n8n_workflow = await n8n.get_workflow(template.n8n_workflow_id)
+    definition = {key: n8n_workflow[key] for key in DEFINITION_KEYS if key in n8n_workflow}
+    if cached is None:
+        cached = TemplateDefinition(template_id=template.id)
+        db.add(cached)
+    cached.n8n_workflow_id = template.n8n_workflow_id
+    cached.definition = definition
+    cached.n8n_updated_at = n8n_workflow.get("updatedAt")
+    cached.fetched_at = now
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request cached it first
+        await db.rollback()
+    return definition
+
+@router.post("/templates/{template_id}/instantiate", response_model=WorkflowResponse)
+async def instantiate_template(
+    template_id: int,
+    options: Optional[TemplateInstantiate] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Create a workflow for the current user from a copy of the template's n8n workflow"""
+    template = await db.scalar(select(Template).where(Template.id == template_id))
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    options = options or TemplateInstantiate()
+    name = options.name or f"My {template.name} Workflow"
+    description = template.description if options.description is None else options.description
+    definition = await get_definition(db, template)
+
+    try:
+        return await create_owned_workflow(db, current_user.id, name, description, definition)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create workflow from template: {str(e)}"
+        )
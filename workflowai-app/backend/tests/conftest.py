@@ -0,0 +1,170 @@
+"""
+Shared fixtures for the backend tests.
+
+Tests run against a scratch SQLite database (migrated once per session,
+emptied after every test) with foreign keys enforced like PostgreSQL
+does, and against a fake n8n behind httpx.MockTransport. One event loop
+serves the whole session, so pooled aiosqlite connections stay usable.
+Background workers are never started; tests drive them directly.
+
+    cd backend && pytest
+"""
+import asyncio
+import itertools
+import os
+import shutil
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="workflowai-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'test.db')}"
+os.environ["LOG_ARCHIVE_DIR"] = os.path.join(_scratch, "archive")
+os.environ["N8N_WEBHOOK_SECRET"] = "test-webhook-secret"
+
+import httpx
+import pytest
+from sqlalchemy import event, text
+from database import Base, SessionLocal, engine, async_engine
+from migration import migrate
+from models import ExecutionLog, User, Workflow
+
+def _enforce_foreign_keys(dbapi_connection, connection_record):
+    dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+event.listen(engine, "connect", _enforce_foreign_keys)
+event.listen(async_engine.sync_engine, "connect", _enforce_foreign_keys)
+
+import main  # registers every router and ORM hook
+import auth
+import templates
+from n8n_service import n8n
+from revocation import revocation_store
+from resilience import CircuitBreaker
+
+_n8n_ids = itertools.count(1)
+
+class FakeN8N:
+    """Answers the n8n API calls the app makes; tests override `routes`.
+
+    A route maps (method, path suffix) to a response, an exception to
+    raise, or a callable taking the request.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.routes = {}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        path = request.url.path.removeprefix("/api/v1/")
+        for (method, suffix), answer in self.routes.items():
+            if request.method == method and path.endswith(suffix):
+                if callable(answer) and not isinstance(answer, httpx.Response):
+                    answer = answer(request)
+                if isinstance(answer, Exception):
+                    raise answer
+                return answer
+        if request.method == "POST" and path == "workflows":
+            return httpx.Response(200, json={"id": f"n8n-{next(_n8n_ids)}"})
+        if request.method == "POST" and path.endswith("/execute"):
+            return httpx.Response(200, json={"id": f"exec-{next(_n8n_ids)}"})
+        return httpx.Response(200, json={})
+
+    def calls(self, method: str, suffix: str) -> list:
+        return [r for r in self.requests if r.method == method and r.url.path.endswith(suffix)]
+
+@pytest.fixture(scope="session")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(async_engine.dispose())
+    loop.close()
+    engine.dispose()
+    shutil.rmtree(_scratch, ignore_errors=True)
+
+@pytest.fixture(scope="session", autouse=True)
+def schema(loop):
+    migrate(engine)
+
+@pytest.fixture
+def run(loop):
+    """Run a coroutine on the session's event loop"""
+    return loop.run_until_complete
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+    # Ids of the emptied tables get handed out again
+    revocation_store._user_watermark = None
+    revocation_store._seen_invalidations = set()
+    templates._pages.clear()
+    n8n._reads.clear()
+    n8n._pending.clear()
+    shutil.rmtree(os.environ["LOG_ARCHIVE_DIR"], ignore_errors=True)
+
+@pytest.fixture
+def fake_n8n(run):
+    fake = FakeN8N()
+    n8n._client = httpx.AsyncClient(base_url=f"{n8n.base_url}/api/v1/", transport=httpx.MockTransport(fake))
+    n8n.breaker = CircuitBreaker("n8n", n8n.breaker.failure_threshold, n8n.breaker.reset_seconds)
+    yield fake
+    run(n8n.close())
+
+@pytest.fixture
+def db():
+    """A sync session for arranging and checking rows"""
+    with SessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def make_user(db):
+    def make(email="ada@example.com", **columns):
+        user = User(email=email, username=email.split("@")[0], hashed_password="x", **columns)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+@pytest.fixture
+def make_workflow(db):
+    def make(user, name="Workflow", **columns):
+        columns.setdefault("n8n_workflow_id", f"n8n-{next(_n8n_ids)}")
+        workflow = Workflow(name=name, description="", owner_id=user.id, **columns)
+        db.add(workflow)
+        db.commit()
+        return workflow
+    return make
+
+@pytest.fixture
+def make_log(db):
+    def make(user, workflow=None, **columns):
+        log = ExecutionLog(user_id=user.id, workflow_id=workflow.id if workflow else None, **columns)
+        db.add(log)
+        db.commit()
+        return log
+    return make
+
+@pytest.fixture
+def client(run):
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+    yield client
+    run(client.aclose())
+
+@pytest.fixture
+def auth_headers():
+    def headers(user):
+        token = auth.create_access_token({"sub": user.email})
+        return {"Authorization": f"Bearer {token}"}
+    return headers
+
+@pytest.fixture
+def query():
+    """Rows of a raw SQL query, read outside any test session"""
+    def rows(sql: str, **params) -> list:
+        with engine.connect() as conn:
+            return conn.execute(text(sql), params).all()
+    return rows
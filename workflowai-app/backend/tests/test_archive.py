@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from archive import LEASE_NAME, log_compactor
+from database import AsyncSessionLocal
+from leases import acquire_lease
+from config import LOG_RETENTION_DAYS
+
+OLD = datetime.utcnow() - timedelta(days=LOG_RETENTION_DAYS + 10)
+
+def old_logs(make_log, user, workflow, count, folded=True):
+    # A finished_at already set keeps the run out of the rollups' queue, as if folded
+    return [
+        make_log(
+            user, workflow, status="success", execution_time=OLD + timedelta(minutes=i),
+            finished_at=OLD + timedelta(minutes=i) if folded else None
+        )
+        for i in range(count)
+    ]
+
+def test_expired_logs_move_to_the_archive_and_stay_readable(run, client, make_user, make_workflow, make_log, auth_headers, query):
+    user = make_user()
+    workflow = make_workflow(user)
+    ids = [log.id for log in old_logs(make_log, user, workflow, 3)]
+    recent = make_log(user, workflow, status="success", execution_time=datetime.utcnow()).id
+
+    assert run(log_compactor._acquire())
+    assert run(log_compactor.compact_batch()) == 3
+
+    assert [row[0] for row in query("SELECT id FROM execution_logs")] == [recent]
+    [(first, last, entries)] = query("SELECT first_log_id, last_log_id, entry_count FROM log_archive_segments")
+    assert (first, last, entries) == (ids[0], ids[-1], 3)
+    response = run(client.get(f"/api/logs/{ids[1]}", headers=auth_headers(user)))
+    assert response.status_code == 200
+    assert response.json()["workflow_id"] == workflow.id
+
+def test_a_retention_of_zero_keeps_logs_in_the_database(run, make_user, make_workflow, make_log):
+    user = make_user(log_retention_days=0)
+    old_logs(make_log, user, make_workflow(user), 3)
+
+    assert run(log_compactor._acquire())
+    assert run(log_compactor.compact_batch()) == 0
+
+def test_runs_not_yet_folded_wait_for_the_rollups(run, make_user, make_workflow, make_log):
+    user = make_user()
+    old_logs(make_log, user, make_workflow(user), 3, folded=False)
+
+    assert run(log_compactor._acquire())
+    assert run(log_compactor.compact_batch()) == 0
+
+def test_compaction_without_the_lease_does_nothing(run, make_user, make_workflow, make_log, query):
+    user = make_user()
+    old_logs(make_log, user, make_workflow(user), 3)
+
+    async def taken_elsewhere():
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=60, holder="other-host:1")
+
+    assert run(taken_elsewhere())
+    assert run(log_compactor.compact_batch()) == 0
+    assert query("SELECT COUNT(*) FROM execution_logs")[0][0] == 3
@@ -0,0 +1,43 @@
+from datetime import datetime
+from sqlalchemy import text
+import auth
+from database import engine
+from revocation import revocation_store
+
+def test_authenticated_requests_use_the_cached_user(run, client, make_user, auth_headers):
+    user = make_user()
+    headers = auth_headers(user)
+    assert run(client.get("/users/me/", headers=headers)).status_code == 200
+
+    with engine.begin() as conn:
+        conn.execute(text("delete from users"))
+    # Served from the snapshot, no user lookup
+    assert run(client.get("/users/me/", headers=headers)).json()["email"] == user.email
+
+def test_changes_made_by_another_worker_reach_the_cache_on_sync(run, client, make_user, auth_headers):
+    user = make_user()
+    headers = auth_headers(user)
+    run(revocation_store.sync())
+    assert run(client.get("/users/me/", headers=headers)).status_code == 200
+
+    # Another worker deactivates the user and records the invalidation
+    with engine.begin() as conn:
+        conn.execute(text("update users set is_active = 0 where id = :id"), {"id": user.id})
+        conn.execute(
+            text("insert into user_invalidations (email, invalidated_at) values (:email, :now)"),
+            {"email": user.email, "now": datetime.utcnow()}
+        )
+    run(revocation_store.sync())
+
+    assert run(client.get("/users/me/", headers=headers)).status_code == 400
+
+def test_logout_revokes_the_token_and_invalidates_the_user(run, client, make_user, auth_headers, query):
+    user = make_user()
+    headers = auth_headers(user)
+    run(client.get("/users/me/", headers=headers))
+
+    run(client.post("/auth/logout", headers=headers))
+
+    assert auth._user_cache.get(user.email) is None
+    assert query("select email from user_invalidations") == [(user.email,)]
+    assert run(client.get("/users/me/", headers=headers)).status_code == 401
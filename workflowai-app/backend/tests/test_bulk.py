@@ -0,0 +1,65 @@
+import httpx
+import pytest
+from sqlalchemy import text
+from database import engine
+
+def bulk(run, client, headers, action, workflow_ids, **body):
+    response = run(client.post(
+        "/api/workflows/bulk", json={"action": action, "workflow_ids": workflow_ids, **body}, headers=headers
+    ))
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.fixture
+def undeletable():
+    """Make the database refuse to delete one workflow row"""
+    created = []
+
+    def make(workflow_id):
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TRIGGER keep_workflow BEFORE DELETE ON workflows WHEN OLD.id = {int(workflow_id)} "
+                "BEGIN SELECT RAISE(ABORT, 'workflow is locked'); END"
+            ))
+        created.append(workflow_id)
+
+    yield make
+    if created:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TRIGGER keep_workflow"))
+
+def test_a_failing_delete_does_not_take_the_batch_with_it(run, client, make_user, make_workflow, make_log, auth_headers, fake_n8n, undeletable, query):
+    user = make_user()
+    workflows = [make_workflow(user) for _ in range(3)]
+    make_log(user, workflows[0], status="success")
+    workflows = [workflow.id for workflow in workflows]
+    undeletable(workflows[1])
+
+    result = bulk(run, client, auth_headers(user), "delete", workflows + [999])
+
+    assert (result["succeeded"], result["failed"]) == (2, 2)
+    assert [r["status_code"] for r in result["results"]] == [200, 500, 200, 404]
+    assert "workflow is locked" in result["results"][1]["detail"]
+    assert [row[0] for row in query("SELECT id FROM workflows")] == [workflows[1]]
+    # The deleted workflow's history stays
+    assert query("SELECT workflow_id FROM execution_logs") == [(None,)]
+
+def test_n8n_errors_are_reported_per_workflow(run, client, make_user, make_workflow, auth_headers, fake_n8n, query):
+    user = make_user()
+    kept, refused = make_workflow(user), make_workflow(user, n8n_workflow_id="n8n-refused")
+    fake_n8n.routes[("POST", "n8n-refused/activate")] = httpx.Response(404, json={"message": "not found"})
+
+    result = bulk(run, client, auth_headers(user), "activate", [kept.id, refused.id])
+
+    assert [r["ok"] for r in result["results"]] == [True, False]
+    assert query("SELECT id FROM workflows WHERE is_active")[0][0] == kept.id
+
+def test_bulk_execute_queues_one_run_per_workflow(run, client, make_user, make_workflow, auth_headers, query):
+    user = make_user()
+    workflows = [make_workflow(user).id for _ in range(3)]
+
+    result = bulk(run, client, auth_headers(user), "execute", workflows, execution_data={"x": 1})
+
+    assert result["succeeded"] == 3
+    jobs = query("SELECT workflow_id, state FROM execution_jobs ORDER BY workflow_id")
+    assert jobs == [(workflow_id, "queued") for workflow_id in workflows]
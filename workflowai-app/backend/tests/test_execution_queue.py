@@ -0,0 +1,167 @@
+import asyncio
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from database import AsyncSessionLocal, SessionLocal, engine
+from execution_queue import ExecutionQueue, _retryable
+from models import ExecutionJob
+from n8n_service import _as_http_exception
+from config import EXECUTION_MAX_ATTEMPTS, EXECUTION_MAX_PER_USER, EXECUTION_VISIBILITY_TIMEOUT
+
+REQUEST = httpx.Request("POST", "http://n8n.test/api/v1/workflows/1/execute")
+
+def status_error(code: int) -> httpx.HTTPStatusError:
+    return httpx.HTTPStatusError("n8n error", request=REQUEST, response=httpx.Response(code, request=REQUEST))
+
+@pytest.fixture
+def queue():
+    return ExecutionQueue(concurrency=10)
+
+@pytest.fixture
+def enqueue(run, queue):
+    def enqueue(workflow, user, count=1):
+        async def go():
+            async with AsyncSessionLocal() as session:
+                logs = await queue.enqueue_many(session, [(workflow.id, user.id, {"n": i}) for i in range(count)])
+                await session.commit()
+                return [log.id for log in logs]
+        return run(go())
+    return enqueue
+
+def set_jobs(**values):
+    assignments = ", ".join(f"{name} = :{name}" for name in values)
+    with engine.begin() as conn:
+        conn.execute(text(f"update execution_jobs set {assignments}"), values)
+
+def skip_backoff():
+    set_jobs(next_attempt_at=datetime.utcnow() - timedelta(seconds=1))
+
+@pytest.mark.parametrize("error, retryable", [
+    # n8n never saw these, so sending again can't start a second run
+    (httpx.ConnectError("refused", request=REQUEST), True),
+    (httpx.ConnectTimeout("connect", request=REQUEST), True),
+    (httpx.PoolTimeout("pool", request=REQUEST), True),
+    # n8n may already be running these
+    (httpx.ReadTimeout("read", request=REQUEST), False),
+    (httpx.RemoteProtocolError("dropped", request=REQUEST), False),
+    # n8n answered
+    (status_error(500), True),
+    (status_error(503), True),
+    (status_error(429), True),
+    (status_error(400), False),
+    (status_error(404), False),
+])
+def test_retryable_n8n_errors(error, retryable):
+    assert _retryable(_as_http_exception(error)) is retryable
+
+def test_retryable_local_errors():
+    # Circuit breaker and load shedding refuse before calling n8n
+    assert _retryable(HTTPException(status_code=503, detail="busy"))
+    assert not _retryable(ValueError("bad payload"))
+
+def test_claim_takes_every_users_oldest_job_first(run, queue, enqueue, make_user, make_workflow):
+    busy, quiet = make_user("busy@example.com"), make_user("quiet@example.com")
+    enqueue(make_workflow(busy), busy, count=6)
+    enqueue(make_workflow(quiet), quiet)
+
+    claimed = run(queue._claim(2))
+
+    with SessionLocal() as session:
+        jobs = [session.get(ExecutionJob, job_id) for job_id in claimed]
+        oldest_busy = min(job.id for job in session.query(ExecutionJob).filter_by(user_id=busy.id))
+    assert sorted(job.user_id for job in jobs) == sorted([busy.id, quiet.id])
+    assert oldest_busy in claimed
+
+def test_claim_caps_running_jobs_per_user(run, queue, enqueue, make_user, make_workflow, query):
+    user = make_user()
+    enqueue(make_workflow(user), user, count=EXECUTION_MAX_PER_USER + 3)
+
+    assert len(run(queue._claim(50))) == EXECUTION_MAX_PER_USER
+    assert run(queue._claim(50)) == []
+    assert query("select count(*) from execution_jobs where state = 'running'") == [(EXECUTION_MAX_PER_USER,)]
+
+def test_concurrent_dispatchers_never_claim_the_same_job(run, enqueue, make_user, make_workflow):
+    for index in range(4):
+        user = make_user(f"user{index}@example.com")
+        enqueue(make_workflow(user), user, count=3)
+    first, second = ExecutionQueue(), ExecutionQueue()
+    first.worker_id, second.worker_id = "worker-a", "worker-b"
+
+    async def both():
+        return await asyncio.gather(first._claim(8), second._claim(8))
+
+    claimed_a, claimed_b = run(both())
+
+    assert not set(claimed_a) & set(claimed_b)
+    assert len(claimed_a) + len(claimed_b) == 12
+
+def test_run_hands_the_log_to_the_reconciler(run, queue, enqueue, make_user, make_workflow, fake_n8n, query):
+    user = make_user()
+    workflow = make_workflow(user)
+    (log_id,) = enqueue(workflow, user)
+    (job_id,) = run(queue._claim(1))
+
+    run(queue._run(job_id))
+
+    assert query("select state, attempts from execution_jobs") == [("done", 1)]
+    status, n8n_execution_id, next_sync_at = query(
+        "select status, n8n_execution_id, next_sync_at from execution_logs where id = :id", id=log_id
+    )[0]
+    assert status == "started"
+    assert n8n_execution_id.startswith("exec-")
+    assert next_sync_at is not None
+    assert len(fake_n8n.calls("POST", f"workflows/{workflow.n8n_workflow_id}/execute")) == 1
+
+def test_gateway_errors_back_off_until_the_job_is_dead(run, queue, enqueue, make_user, make_workflow, fake_n8n, query):
+    user = make_user()
+    workflow = make_workflow(user)
+    enqueue(workflow, user)
+    fake_n8n.routes[("POST", "/execute")] = httpx.Response(502, json={"message": "bad gateway"})
+
+    for attempt in range(1, EXECUTION_MAX_ATTEMPTS + 1):
+        skip_backoff()
+        (job_id,) = run(queue._claim(1))
+        run(queue._run(job_id))
+        state, attempts, next_attempt_at = query("select state, attempts, next_attempt_at from execution_jobs")[0]
+        assert attempts == attempt
+        if attempt < EXECUTION_MAX_ATTEMPTS:
+            assert state == "queued"
+            assert query("select status from execution_logs") == [("queued",)]
+            assert run(queue._claim(1)) == []  # still backing off
+
+    assert state == "dead"
+    assert query("select status from execution_logs") == [("failed",)]
+    assert len(fake_n8n.calls("POST", "/execute")) == EXECUTION_MAX_ATTEMPTS
+
+@pytest.mark.parametrize("answer", [
+    httpx.Response(400, json={"message": "workflow has no trigger"}),
+    httpx.ReadTimeout("n8n took too long"),
+])
+def test_refused_or_ambiguous_runs_are_sent_once(run, queue, enqueue, make_user, make_workflow, fake_n8n, query, answer):
+    user = make_user()
+    enqueue(make_workflow(user), user)
+    fake_n8n.routes[("POST", "/execute")] = answer
+
+    (job_id,) = run(queue._claim(1))
+    run(queue._run(job_id))
+
+    assert query("select state, attempts from execution_jobs") == [("dead", 1)]
+    assert query("select status from execution_logs") == [("failed",)]
+    assert len(fake_n8n.calls("POST", "/execute")) == 1
+
+def test_stale_jobs_are_requeued_until_their_attempts_run_out(run, queue, enqueue, make_user, make_workflow, query):
+    user = make_user()
+    enqueue(make_workflow(user), user)
+    stale = datetime.utcnow() - timedelta(seconds=EXECUTION_VISIBILITY_TIMEOUT + 1)
+
+    for attempt in range(1, EXECUTION_MAX_ATTEMPTS + 1):
+        assert len(run(queue._claim(1))) == 1
+        # The worker running it died
+        set_jobs(locked_at=stale)
+        run(queue._requeue_stale())
+
+    assert query("select state, attempts from execution_jobs") == [("dead", EXECUTION_MAX_ATTEMPTS)]
+    assert query("select status from execution_logs") == [("failed",)]
+    assert run(queue._claim(1)) == []
@@ -0,0 +1,61 @@
+import json
+from datetime import datetime, timedelta
+from archive import log_compactor
+from config import LOG_RETENTION_DAYS
+
+OLD = datetime.utcnow() - timedelta(days=LOG_RETENTION_DAYS + 10)
+
+def export(run, client, headers, **params):
+    response = run(client.get("/api/logs/export", params=params, headers=headers))
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+def test_an_export_resumes_after_any_row(run, client, make_user, make_workflow, make_log, auth_headers):
+    user = make_user()
+    workflow = make_workflow(user)
+    archived = [
+        make_log(user, workflow, status="success", execution_time=OLD + timedelta(minutes=i), finished_at=OLD).id
+        for i in range(3)
+    ]
+    live = [make_log(user, workflow, status="success", execution_time=datetime.utcnow()).id for _ in range(2)]
+    assert run(log_compactor._acquire())
+    assert run(log_compactor.compact_batch()) == 3
+    headers = auth_headers(user)
+
+    rows = export(run, client, headers)
+
+    # Database rows first, then the archive
+    assert [row["id"] for row in rows] == live + archived
+    for position in range(len(rows)):
+        rest = export(run, client, headers, cursor=rows[position]["cursor"])
+        assert [row["id"] for row in rest] == [row["id"] for row in rows[position + 1:]]
+
+def test_archived_rows_are_filtered_like_database_ones(run, client, make_user, make_workflow, make_log, auth_headers):
+    user = make_user()
+    first, second = make_workflow(user), make_workflow(user)
+    wanted = make_log(user, first, status="failed", execution_time=OLD, finished_at=OLD).id
+    make_log(user, second, status="failed", execution_time=OLD, finished_at=OLD)
+    make_log(user, first, status="success", execution_time=OLD, finished_at=OLD)
+    make_log(user, first, status="failed", execution_time=datetime.utcnow())
+    assert run(log_compactor._acquire())
+    assert run(log_compactor.compact_batch()) == 3
+
+    rows = export(run, client, auth_headers(user), workflow_id=first.id, status="failed", until=OLD + timedelta(days=1))
+
+    assert [row["id"] for row in rows] == [wanted]
+
+def test_csv_exports_start_with_a_header_only_once(run, client, make_user, make_log, auth_headers):
+    user = make_user()
+    make_log(user, status="success", details={"a": 1})
+    headers = auth_headers(user)
+
+    first = run(client.get("/api/logs/export", params={"format": "csv"}, headers=headers)).text.splitlines()
+    assert first[0].startswith("id,workflow_id,status")
+    cursor = first[1].rsplit(",", 1)[1]
+
+    resumed = run(client.get("/api/logs/export", params={"format": "csv", "cursor": cursor}, headers=headers))
+    assert resumed.text == ""
+
+def test_a_malformed_export_cursor_is_refused(run, client, make_user, auth_headers):
+    response = run(client.get("/api/logs/export", params={"cursor": "eHwxfDI="}, headers=auth_headers(make_user())))
+    assert response.status_code == 400
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from logs import NEXT_CURSOR_HEADER
+
+START = datetime(2026, 1, 1, 12, 0)
+
+def read_all(run, client, headers, **params):
+    """Every page of the listing, following X-Next-Cursor"""
+    pages = []
+    while True:
+        response = run(client.get("/api/logs/", params=params, headers=headers))
+        assert response.status_code == 200
+        pages.append([log["id"] for log in response.json()])
+        if NEXT_CURSOR_HEADER not in response.headers:
+            return pages
+        params = {**params, "cursor": response.headers[NEXT_CURSOR_HEADER]}
+
+def test_pages_walk_newest_first_without_gaps_or_repeats(run, client, make_user, make_workflow, make_log, auth_headers):
+    user = make_user()
+    workflow = make_workflow(user)
+    # Pairs share an execution_time, so the id breaks ties
+    logs = [make_log(user, workflow, status="success", execution_time=START + timedelta(minutes=i // 2)) for i in range(7)]
+
+    pages = read_all(run, client, auth_headers(user), limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    expected = sorted(logs, key=lambda log: (log.execution_time, log.id), reverse=True)
+    assert sum(pages, []) == [log.id for log in expected]
+
+def test_filters_apply_on_the_server(run, client, make_user, make_workflow, make_log, auth_headers):
+    user, other = make_user(), make_user("other@example.com")
+    first, second = make_workflow(user), make_workflow(user)
+    wanted = make_log(user, first, status="failed", execution_time=START)
+    make_log(user, first, status="success", execution_time=START)
+    make_log(user, second, status="failed", execution_time=START)
+    make_log(user, first, status="failed", execution_time=START - timedelta(days=1))
+    make_log(other, make_workflow(other), status="failed", execution_time=START)
+
+    # Offsets in the bounds are converted to the naive UTC the column holds
+    pages = read_all(
+        run, client, auth_headers(user),
+        workflow_id=first.id, status="failed", since="2026-01-01T13:00:00+01:00", until="2026-01-01T12:00:01Z"
+    )
+
+    assert pages == [[wanted.id]]
+
+def test_a_tampered_cursor_is_refused(run, client, make_user, auth_headers):
+    response = run(client.get("/api/logs/", params={"cursor": "bm90IGEgY3Vyc29y"}, headers=auth_headers(make_user())))
+    assert response.status_code == 400
+
+def test_logs_outlive_their_workflow(run, client, make_user, make_workflow, make_log, auth_headers, fake_n8n):
+    user = make_user()
+    workflow = make_workflow(user)
+    log = make_log(user, workflow, status="success")
+    headers = auth_headers(user)
+
+    assert run(client.delete(f"/api/workflows/{workflow.id}", headers=headers)).status_code == 200
+
+    assert run(client.get(f"/api/logs/{log.id}", headers=headers)).json()["workflow_id"] is None
+    assert [entry["workflow_id"] for entry in run(client.get("/api/logs/", headers=headers)).json()] == [None]
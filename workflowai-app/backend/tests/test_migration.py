@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from database import engine
+from migration import MIGRATIONS, add_n8n_execution_id, migrate, parse_details, pending_migrations
+
+def test_parse_details_reads_json_and_python_reprs():
+    assert parse_details('{"id": "7"}') == {"id": "7"}
+    # Older versions stored str(dict)
+    assert parse_details("{'id': 7, 'finished': True}") == {"id": 7, "finished": True}
+    assert parse_details("Workflow not found") == "Workflow not found"
+    assert parse_details({"id": 1}) == {"id": 1}
+
+def test_backfill_indexes_execution_ids_of_old_logs(make_user, query):
+    user = make_user()
+    with engine.begin() as conn:
+        conn.execute(
+            text("insert into execution_logs (user_id, status, details) values (:user_id, :status, :details)"),
+            [
+                {"user_id": user.id, "status": "success", "details": "{'id': 42, 'status': 'success'}"},
+                {"user_id": user.id, "status": "failed", "details": "Workflow not found"},
+            ]
+        )
+        add_n8n_execution_id(conn)
+
+    assert query("select n8n_execution_id, details from execution_logs order by id") == [
+        ("42", '{"id": 42, "status": "success"}'),
+        (None, '"Workflow not found"'),
+    ]
+
+@pytest.fixture
+def scratch_engine(tmp_path):
+    """A second, empty database"""
+    scratch = create_engine(f"sqlite:///{tmp_path / 'scratch.db'}")
+    yield scratch
+    scratch.dispose()
+
+def test_a_fresh_database_is_stamped_current(scratch_engine):
+    assert pending_migrations(scratch_engine) == [version for version, _, _ in MIGRATIONS]
+
+    assert migrate(scratch_engine) == [version for version, _, _ in MIGRATIONS]
+
+    assert pending_migrations(scratch_engine) == []
+    assert migrate(scratch_engine) == []
+
+def test_an_older_database_runs_only_the_missing_steps(scratch_engine):
+    migrate(scratch_engine)
+    with scratch_engine.begin() as conn:
+        # Back to version 13
+        conn.execute(text("drop table user_invalidations"))
+        conn.execute(text("delete from schema_migrations where version = 14"))
+
+    assert pending_migrations(scratch_engine) == [14]
+    assert migrate(scratch_engine) == [14]
+    assert inspect(scratch_engine).has_table("user_invalidations")
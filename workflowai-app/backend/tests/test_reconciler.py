@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+import httpx
+from reconciler import execution_reconciler, next_sync_delay
+from config import RECONCILE_MIN_INTERVAL, RECONCILE_ROW_MAX_INTERVAL
+
+def due():
+    return datetime.utcnow() - timedelta(seconds=1)
+
+def test_young_runs_are_polled_often_and_old_ones_rarely():
+    now = datetime.utcnow()
+    assert next_sync_delay(now, now) == RECONCILE_MIN_INTERVAL
+    assert next_sync_delay(now - timedelta(minutes=5), now) == 30
+    assert next_sync_delay(now - timedelta(days=2), now) == RECONCILE_ROW_MAX_INTERVAL
+
+def test_finished_runs_leave_the_polling_set(run, make_user, make_workflow, make_log, fake_n8n, query):
+    user = make_user()
+    workflow = make_workflow(user)
+    log = make_log(user, workflow, status="started", n8n_execution_id="41", next_sync_at=due())
+    fake_n8n.routes[("GET", "executions/41")] = httpx.Response(200, json={"id": "41", "status": "success"})
+
+    assert run(execution_reconciler.reconcile_batch()) == 1
+
+    status, next_sync_at, finished_at, rollup_pending = query(
+        "select status, next_sync_at, finished_at, rollup_pending from execution_logs where id = :id", id=log.id
+    )[0]
+    assert (status, next_sync_at, rollup_pending) == ("success", None, 1)
+    assert finished_at is not None
+    assert run(execution_reconciler.reconcile_batch()) == 0
+
+def test_running_runs_back_off(run, make_user, make_workflow, make_log, fake_n8n, query):
+    user = make_user()
+    started = datetime.utcnow() - timedelta(hours=1)
+    make_log(user, make_workflow(user), status="started", n8n_execution_id="41", execution_time=started, next_sync_at=due())
+    fake_n8n.routes[("GET", "executions/41")] = httpx.Response(200, json={"id": "41", "status": "running"})
+
+    run(execution_reconciler.reconcile_batch())
+
+    status, next_sync_at = query("select status, next_sync_at from execution_logs")[0]
+    assert status == "running"
+    delay = (datetime.fromisoformat(next_sync_at) - datetime.utcnow()).total_seconds()
+    assert RECONCILE_ROW_MAX_INTERVAL - 5 < delay <= RECONCILE_ROW_MAX_INTERVAL
+
+def test_runs_of_one_workflow_share_a_list_call(run, make_user, make_workflow, make_log, fake_n8n, query):
+    user = make_user()
+    workflow = make_workflow(user)
+    for execution_id in ("41", "42", "43"):
+        make_log(user, workflow, status="started", n8n_execution_id=execution_id, next_sync_at=due())
+    fake_n8n.routes[("GET", f"workflows/{workflow.n8n_workflow_id}/executions")] = httpx.Response(200, json={"data": [
+        {"id": "41", "status": "success"}, {"id": "42", "status": "error"}, {"id": "43", "status": "running"},
+    ]})
+
+    run(execution_reconciler.reconcile_batch())
+
+    assert query("select status from execution_logs order by id") == [("success",), ("error",), ("running",)]
+    assert len(fake_n8n.requests) == 1
+
+def test_runs_of_deleted_workflows_are_still_reconciled(run, make_user, make_log, fake_n8n, query):
+    user = make_user()
+    make_log(user, None, status="started", n8n_execution_id="41", next_sync_at=due())
+    make_log(user, None, status="started", n8n_execution_id="42", next_sync_at=due())
+    make_log(user, None, status="started", n8n_execution_id="43", next_sync_at=due())
+    fake_n8n.routes[("GET", "executions/41")] = httpx.Response(200, json={"id": "41", "status": "success"})
+    # n8n deletes a workflow's executions along with it
+    fake_n8n.routes[("GET", "executions/42")] = httpx.Response(404, json={"message": "Not found"})
+    fake_n8n.routes[("GET", "executions/43")] = httpx.Response(500, json={"message": "boom"})
+
+    assert run(execution_reconciler.reconcile_batch()) == 3
+
+    rows = query("select n8n_execution_id, status, next_sync_at is null, details from execution_logs order by id")
+    assert rows[0][:3] == ("41", "success", 1)
+    assert rows[1] == ("42", "canceled", 1, '{"error": "Workflow deleted"}')
+    # A failed lookup is not proof the run is gone; try again later
+    assert rows[2][:3] == ("43", "started", 0)
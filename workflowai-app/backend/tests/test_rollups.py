@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from database import AsyncSessionLocal
+from leases import acquire_lease
+from rollups import LATENCY_BOUNDS_MS, LEASE_NAME, execution_rollups, histogram_bin, percentile
+
+START = datetime(2026, 1, 1, 12, 0)
+
+def timed(ms):
+    """Details carrying n8n's own start and stop times"""
+    stopped = START + timedelta(milliseconds=ms)
+    return {"startedAt": START.isoformat() + "Z", "stoppedAt": stopped.isoformat() + "Z"}
+
+def test_bins_are_inclusive_upper_bounds():
+    assert histogram_bin(0) == 0
+    assert histogram_bin(100) == 0
+    assert histogram_bin(101) == 1
+    assert histogram_bin(LATENCY_BOUNDS_MS[-1] + 1) == len(LATENCY_BOUNDS_MS)
+
+def test_percentiles_interpolate_inside_their_bin():
+    histogram = [0] * (len(LATENCY_BOUNDS_MS) + 1)
+    histogram[0], histogram[1] = 50, 50  # half up to 100ms, half in 100-250ms
+
+    assert percentile(histogram, 50, max_ms=250) == 100
+    assert percentile(histogram, 75, max_ms=250) == 175
+    assert percentile(histogram, 100, max_ms=250) == 250
+    # The open-ended last bin is capped by the slowest run seen
+    histogram[-1] = 100
+    assert percentile(histogram, 100, max_ms=4000000) == 4000000
+    assert percentile([0] * len(histogram), 50, max_ms=0) is None
+
+def test_each_finished_run_is_folded_once(run, make_user, make_workflow, make_log, query):
+    user = make_user()
+    workflow = make_workflow(user)
+    make_log(user, workflow, status="success", execution_time=START, details=timed(80))
+    make_log(user, workflow, status="failed", execution_time=START + timedelta(minutes=5), details=timed(200))
+    make_log(user, workflow, status="started", execution_time=START)
+
+    assert run(execution_rollups._acquire())
+    assert run(execution_rollups.fold_batch()) == 2
+    assert run(execution_rollups.fold_batch()) == 0
+
+    for table in ("execution_rollups_hourly", "execution_rollups_daily"):
+        [(total, succeeded, failed, duration_max)] = query(
+            f"SELECT total, succeeded, failed, duration_max_ms FROM {table}"
+        )
+        assert (total, succeeded, failed, duration_max) == (2, 1, 1, 200)
+    assert query("SELECT COUNT(*) FROM execution_logs WHERE rollup_pending")[0][0] == 0
+
+def test_a_batch_without_the_lease_folds_nothing(run, make_user, make_workflow, make_log, query):
+    user = make_user()
+    make_log(user, make_workflow(user), status="success", execution_time=START)
+
+    async def taken_elsewhere():
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=60, holder="other-host:1")
+
+    assert run(taken_elsewhere())
+    assert run(execution_rollups.fold_batch()) == 0
+
+    assert query("SELECT COUNT(*) FROM execution_rollups_hourly")[0][0] == 0
+    assert query("SELECT COUNT(*) FROM execution_logs WHERE rollup_pending")[0][0] == 1
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from scheduler import next_fire_time, plan_fires, validate_schedule
+from config import SCHEDULER_MAX_CATCHUP, SCHEDULER_MISFIRE_GRACE_SECONDS
+
+DUE = datetime(2026, 3, 2, 9, 0)
+
+def schedule(policy, cron="*/5 * * * *"):
+    return SimpleNamespace(cron=cron, timezone="UTC", misfire_policy=policy, next_fire_at=DUE)
+
+@pytest.mark.parametrize("policy", ["fire_once", "skip", "fire_all"])
+def test_an_occurrence_within_the_grace_period_fires_once(policy):
+    now = DUE + timedelta(seconds=SCHEDULER_MISFIRE_GRACE_SECONDS)
+
+    assert plan_fires(schedule(policy), now) == ([DUE], DUE + timedelta(minutes=5))
+
+def test_late_occurrences_follow_the_misfire_policy():
+    now = DUE + timedelta(minutes=12)  # the 09:00, 09:05 and 09:10 runs were missed
+    following = DUE + timedelta(minutes=15)
+
+    assert plan_fires(schedule("fire_once"), now) == ([DUE], following)
+    assert plan_fires(schedule("skip"), now) == ([], following)
+    assert plan_fires(schedule("fire_all"), now) == ([DUE + timedelta(minutes=m) for m in (0, 5, 10)], following)
+
+def test_catching_up_is_capped():
+    fires, following = plan_fires(schedule("fire_all"), DUE + timedelta(days=1, seconds=30))
+
+    assert len(fires) == SCHEDULER_MAX_CATCHUP
+    assert following == DUE + timedelta(days=1, minutes=5)
+
+def test_fire_times_follow_the_schedule_timezone():
+    # 09:00 in Paris is 08:00 UTC in winter and 07:00 UTC once summer time starts
+    assert next_fire_time("0 9 * * *", "Europe/Paris", datetime(2026, 3, 27, 12, 0)) == datetime(2026, 3, 28, 8, 0)
+    assert next_fire_time("0 9 * * *", "Europe/Paris", datetime(2026, 3, 28, 12, 0)) == datetime(2026, 3, 29, 7, 0)
+
+@pytest.mark.parametrize("cron, timezone", [
+    ("* * * * * *", "UTC"),  # seconds field
+    ("61 * * * *", "UTC"),
+    ("0 9 * * *", "Mars/Olympus"),
+])
+def test_invalid_schedules_are_refused(cron, timezone):
+    with pytest.raises(HTTPException) as raised:
+        validate_schedule(cron, timezone)
+    assert raised.value.status_code == 400
@@ -0,0 +1,35 @@
+from models import Template
+
+def add_template(db, name):
+    template = Template(name=name, description="", n8n_workflow_id="n8n-1", category="sales")
+    db.add(template)
+    db.commit()
+    return template
+
+def names(response):
+    return [template["name"] for template in response.json()]
+
+def test_unchanged_pages_answer_not_modified(run, client, db):
+    add_template(db, "Lead intake")
+    first = run(client.get("/api/templates/"))
+
+    again = run(client.get("/api/templates/", headers={"If-None-Match": first.headers["ETag"]}))
+
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+
+def test_changes_made_by_another_worker_show_up_at_once(run, client, db):
+    # Rows written here bypass this process's invalidate_templates, like another worker's would
+    template = add_template(db, "Lead intake")
+    assert names(run(client.get("/api/templates/"))) == ["Lead intake"]
+
+    add_template(db, "Invoice reminder")
+    assert names(run(client.get("/api/templates/"))) == ["Lead intake", "Invoice reminder"]
+
+    template.name = "Lead routing"
+    db.commit()
+    assert names(run(client.get("/api/templates/"))) == ["Lead routing", "Invoice reminder"]
+
+    db.delete(template)
+    db.commit()
+    assert names(run(client.get("/api/templates/"))) == ["Invoice reminder"]
@@ -0,0 +1,74 @@
+import hashlib
+import hmac
+import json
+import pytest
+import webhooks
+from webhooks import SIGNATURE_HEADER, execution_events
+
+URL = "/api/webhooks/n8n/executions"
+
+def signed(events, secret="test-webhook-secret"):
+    body = json.dumps(events).encode()
+    signature = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return {"content": body, "headers": {SIGNATURE_HEADER: signature, "Content-Type": "application/json"}}
+
+@pytest.fixture(autouse=True)
+def empty_buffer():
+    execution_events._pending.clear()
+    yield
+    execution_events._pending.clear()
+
+def test_unsigned_or_forged_events_are_rejected(run, client):
+    event = {"executionId": "41", "status": "success"}
+    assert run(client.post(URL, json=event)).status_code == 401
+    assert run(client.post(URL, **signed(event, secret="guessed"))).status_code == 401
+    assert len(execution_events) == 0
+
+def test_webhook_is_off_without_its_own_secret(run, client, monkeypatch):
+    monkeypatch.setattr(webhooks, "N8N_WEBHOOK_SECRET", "")
+    event = {"executionId": "41", "status": "success"}
+    # Not even a signature made with an empty key gets through
+    assert run(client.post(URL, **signed(event, secret=""))).status_code == 404
+
+def test_events_need_an_execution_id_and_a_status(run, client):
+    assert run(client.post(URL, **signed({"executionId": "41"}))).status_code == 422
+    assert run(client.post(URL, **signed(["not an object"]))).status_code == 422
+
+def test_completion_finishes_the_run_and_keeps_n8n_timings(run, client, make_user, make_workflow, make_log, query):
+    user = make_user()
+    started = {"id": "41", "startedAt": "2026-01-01T10:00:00.000Z", "stoppedAt": "2026-01-01T10:00:02.500Z"}
+    log = make_log(user, make_workflow(user), status="started", n8n_execution_id="41", details=started)
+
+    response = run(client.post(URL, **signed({"executionId": 41, "status": "success", "mode": "trigger"})))
+    assert response.status_code == 202
+    run(execution_events.flush())
+
+    status, details, next_sync_at, rollup_pending = query(
+        "select status, details, next_sync_at, rollup_pending from execution_logs where id = :id", id=log.id
+    )[0]
+    assert (status, next_sync_at, rollup_pending) == ("success", None, 1)
+    assert json.loads(details) == {**started, "executionId": "41", "status": "success", "mode": "trigger"}
+    # The bulk update moves the stats counters the ORM hooks would have
+    assert query("select status, count from daily_execution_stats where user_id = :id order by status", id=user.id) == [
+        ("started", 0), ("success", 1)
+    ]
+
+def test_repeated_deliveries_collapse_into_the_latest(run, client, make_user, make_workflow, make_log, query):
+    user = make_user()
+    make_log(user, make_workflow(user), status="started", n8n_execution_id="41")
+    events = [{"executionId": "41", "status": "running"}, {"executionId": "41", "status": "error"}]
+
+    assert run(client.post(URL, **signed(events))).json() == {"accepted": 2}
+    assert len(execution_events) == 1
+    run(execution_events.flush())
+
+    assert query("select status from execution_logs") == [("error",)]
+
+def test_events_for_unknown_runs_change_nothing(run, client, make_user, make_workflow, make_log, query):
+    user = make_user()
+    make_log(user, make_workflow(user), status="started", n8n_execution_id="41")
+
+    run(client.post(URL, **signed({"executionId": "99", "status": "success"})))
+    run(execution_events.flush())
+
+    assert query("select status from execution_logs") == [("started",)]
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import APIRouter, HTTPException, Request, status
+from collections import defaultdict
+from sqlalchemy import select, update, bindparam, case, func
+from database import AsyncSessionLocal
+from models import ExecutionLog, TERMINAL_EXECUTION_STATUSES
+from stats import apply_execution_deltas, execution_key
+from live import execution_event, publish_execution_events
+from config import (
+    N8N_WEBHOOK_SECRET,
+    WEBHOOK_FLUSH_INTERVAL,
+    WEBHOOK_FLUSH_BATCH_SIZE,
+    WEBHOOK_BUFFER_MAX,
+)
+
+router = APIRouter()
+
+SIGNATURE_HEADER = "X-Webhook-Signature"
+
+def verify_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Check an `sha256=<hex>` HMAC of the raw request body"""
+    if not signature or not N8N_WEBHOOK_SECRET:
+        return False
+    expected = hmac.new(N8N_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature.removeprefix("sha256="), expected)
+
+class ExecutionEventBuffer:
+    """Collects completion events in memory and writes them in batches.
+
+    Events are keyed by n8n execution id, so repeated deliveries for the
+    same run collapse into one row update. Events that arrive before the
+    execution worker has stored the n8n execution id match no row; the
+    reconciler picks those runs up instead.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Dict] = {}
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, n8n_execution_id: str, event: Dict) -> None:
+        self._pending[n8n_execution_id] = event
+        if len(self._pending) >= WEBHOOK_FLUSH_BATCH_SIZE and self._flush_now is not None:
+            self._flush_now.set()
+
+    async def start(self) -> None:
+        self._flush_now = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=WEBHOOK_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Webhook buffer flush error: {str(e)}")
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        events, self._pending = self._pending, {}
+        try:
+            await self._write(events)
+        except Exception:
+            # Put the batch back without clobbering anything newer
+            for n8n_execution_id, event in events.items():
+                self._pending.setdefault(n8n_execution_id, event)
+            raise
+
+    async def _write(self, events: Dict[str, Dict]) -> None:
+        now = datetime.utcnow()
+        table = ExecutionLog.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .values(status=bindparam("b_status"), details=bindparam("b_details"), last_synced_at=now)
+        )
+        async with AsyncSessionLocal() as db:
+            conn = await db.connection()
+            # Bulk Core updates skip the ORM flush hooks, so move the stats
+            # counters and announce the status changes here
+            current = await conn.execute(
+                select(
+                    table.c.id, table.c.workflow_id, table.c.user_id, table.c.execution_time,
+                    table.c.status, table.c.n8n_execution_id, table.c.details
+                )
+                .where(table.c.n8n_execution_id.in_(list(events)))
+                .with_for_update()
+            )
+            terminal, running = [], []
+            deltas = defaultdict(int)
+            changes = []
+            for log_id, workflow_id, user_id, execution_time, old_status, n8n_execution_id, details in current:
+                event = events[n8n_execution_id]
+                new_status = event["status"]
+                # Merge into what the execute call stored, keeping n8n's startedAt/stoppedAt
+                merged = {**details, **event} if isinstance(details, dict) else event
+                params = {"b_id": log_id, "b_status": new_status, "b_details": merged}
+                (terminal if new_status in TERMINAL_EXECUTION_STATUSES else running).append(params)
+                if new_status != old_status:
+                    deltas[execution_key(user_id, execution_time, old_status)] -= 1
+                    deltas[execution_key(user_id, execution_time, new_status)] += 1
+                    changes.append(execution_event(
+                        log_id, workflow_id, user_id, new_status, execution_time, previous_status=old_status
+                    ))
+
+            if terminal:
+                # Finished runs drop out of the reconciler's polling set and,
+                # the first time they finish, queue up for the rollups
+                await conn.execute(stmt.values(
+                    next_sync_at=None,
+                    finished_at=func.coalesce(table.c.finished_at, now),
+                    rollup_pending=case((table.c.finished_at.is_(None), True), else_=table.c.rollup_pending)
+                ), terminal)
+            if running:
+                await conn.execute(stmt, running)
+            await conn.run_sync(apply_execution_deltas, deltas)
+            await conn.run_sync(publish_execution_events, changes)
+            await db.commit()
+
+execution_events = ExecutionEventBuffer()
+
+def parse_event(event: Dict) -> Dict:
+    n8n_execution_id = event.get("executionId") or event.get("execution_id") or event.get("id")
+    event_status = event.get("status")
+    if n8n_execution_id is None or not isinstance(event_status, str):
+        raise HTTPException(status_code=422, detail="Each event needs an executionId and a status")
+    return {**event, "executionId": str(n8n_execution_id)}
+
+@router.post("/webhooks/n8n/executions", status_code=status.HTTP_202_ACCEPTED)
+async def receive_execution_events(request: Request):
+    """Accept one execution-completion event, or a list of them, from n8n"""
+    if not N8N_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Execution webhook is not configured")
+    body = await request.body()
+    if not verify_signature(body, request.headers.get(SIGNATURE_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be JSON")
+    raw_events: List[Dict] = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(event, dict) for event in raw_events):
+        raise HTTPException(status_code=422, detail="Events must be JSON objects")
+    events = [parse_event(event) for event in raw_events]
+
+    if len(execution_events) + len(events) > WEBHOOK_BUFFER_MAX:
+        raise HTTPException(
+            status_code=503,
+            detail="Webhook buffer is full, retry later",
+            headers={"Retry-After": "1"}
+        )
+    for event in events:
+        execution_events.add(event["executionId"], event)
+    return {"accepted": len(events)}
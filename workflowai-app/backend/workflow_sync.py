@@ -0,0 +1,182 @@
+"""
+Periodic repair of Workflow.is_active drift against n8n.
+
+The flag drifts whenever an activation reaches n8n but our commit does
+not, or the other way round. Once per WORKFLOW_SYNC_INTERVAL the lease
+holder reads every workflow row, pages through n8n's workflow list and
+diffs the two in memory. Mismatched flags are corrected in batched
+UPDATEs; rows whose n8n workflow is gone and n8n workflows nobody owns
+are only reported, never deleted.
+
+The same listing carries each workflow's updatedAt, so cached template
+definitions whose n8n workflow was edited since they were fetched are
+dropped, and the next instantiation reads the new one.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from database import AsyncSessionLocal
+from models import Template, TemplateDefinition, Workflow
+from n8n_service import n8n
+from leases import acquire_lease
+from stats import apply_workflow_deltas
+from auth import get_current_admin_user
+from config import WORKFLOW_SYNC_BATCH_SIZE, WORKFLOW_SYNC_INTERVAL, WORKFLOW_SYNC_PAGE_SIZE
+
+router = APIRouter()
+
+LEASE_NAME = "workflow-sync"
+
+class WorkflowSync:
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.last_report: Optional[Dict] = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                if await self.acquire():
+                    await self.sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Workflow sync error: {getattr(e, 'detail', None) or str(e)}")
+            await asyncio.sleep(WORKFLOW_SYNC_INTERVAL)
+
+    async def acquire(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            return await acquire_lease(db, LEASE_NAME, ttl=WORKFLOW_SYNC_INTERVAL * 3)
+
+    async def sync(self) -> Dict:
+        """One full sweep; returns and keeps a report of what it found"""
+        # Rows are read before n8n is listed: a user change landing in between
+        # then fails the compare-and-set in _correct instead of being undone
+        async with AsyncSessionLocal() as db:
+            local = (await db.execute(select(Workflow.id, Workflow.n8n_workflow_id, Workflow.is_active))).all()
+            template_ids = set((await db.scalars(select(Template.n8n_workflow_id))).all())
+            definitions = (await db.execute(select(
+                TemplateDefinition.template_id, TemplateDefinition.n8n_workflow_id, TemplateDefinition.n8n_updated_at
+            ))).all()
+
+        remote: Dict[str, bool] = {}
+        updated_at: Dict[str, str] = {}
+        async for page in n8n.iter_workflows(WORKFLOW_SYNC_PAGE_SIZE):
+            for workflow in page:
+                remote[str(workflow["id"])] = bool(workflow.get("active"))
+                updated_at[str(workflow["id"])] = workflow.get("updatedAt")
+
+        activate, deactivate, missing = [], [], []
+        for workflow_id, n8n_workflow_id, is_active in local:
+            active = remote.get(str(n8n_workflow_id))
+            if active is None:
+                missing.append(workflow_id)
+            elif active != (is_active is not False):
+                (activate if active else deactivate).append(workflow_id)
+        known = {str(n8n_workflow_id) for _, n8n_workflow_id, _ in local} | {str(i) for i in template_ids}
+
+        activated = await self._correct(activate, True)
+        deactivated = await self._correct(deactivate, False)
+        stale = [
+            (template_id, n8n_workflow_id, fetched_updated_at)
+            for template_id, n8n_workflow_id, fetched_updated_at in definitions
+            if updated_at.get(str(n8n_workflow_id)) not in (None, fetched_updated_at)
+        ]
+        stale_definitions = await self._drop_definitions(stale)
+        report = {
+            "finished_at": datetime.utcnow(),
+            "workflows": len(local),
+            "n8n_workflows": len(remote),
+            "activated": activated,
+            "deactivated": deactivated,
+            "missing_in_n8n": missing,
+            "orphaned_in_n8n": sorted(n8n_workflow_id for n8n_workflow_id in remote if n8n_workflow_id not in known),
+            "stale_template_definitions": stale_definitions
+        }
+        self.last_report = report
+        print(
+            f"Workflow sync: {report['activated']} activated, {report['deactivated']} deactivated, "
+            f"{len(missing)} missing in n8n, {len(report['orphaned_in_n8n'])} orphaned in n8n, "
+            f"{stale_definitions} stale template definition(s)"
+        )
+        return report
+
+    async def _correct(self, workflow_ids: List[int], active: bool) -> int:
+        """Set is_active on rows still holding the value that was compared; returns rows changed"""
+        table = Workflow.__table__
+        observed = table.c.is_active.is_(False) if active else table.c.is_active.isnot(False)
+        changed = 0
+        for start in range(0, len(workflow_ids), WORKFLOW_SYNC_BATCH_SIZE):
+            batch = workflow_ids[start:start + WORKFLOW_SYNC_BATCH_SIZE]
+            async with AsyncSessionLocal() as db:
+                conn = await db.connection()
+                owners = (await conn.execute(
+                    update(table)
+                    .where(table.c.id.in_(batch), observed)
+                    .values(is_active=active)
+                    .returning(table.c.owner_id)
+                )).scalars().all()
+                # Core updates skip the ORM flush hooks that keep the counters
+                deltas = defaultdict(lambda: [0, 0])
+                for owner_id in owners:
+                    deltas[owner_id][1] += 1 if active else -1
+                await conn.run_sync(apply_workflow_deltas, deltas)
+                await db.commit()
+            changed += len(owners)
+        return changed
+
+    async def _drop_definitions(self, stale: List) -> int:
+        """Delete cached template definitions still holding the copy that was compared"""
+        if not stale:
+            return 0
+        dropped = 0
+        async with AsyncSessionLocal() as db:
+            for template_id, n8n_workflow_id, fetched_updated_at in stale:
+                # A request may have refetched it meanwhile; leave that copy alone
+                result = await db.execute(
+                    delete(TemplateDefinition).where(
+                        TemplateDefinition.template_id == template_id,
+                        TemplateDefinition.n8n_workflow_id == n8n_workflow_id,
+                        TemplateDefinition.n8n_updated_at.is_(None) if fetched_updated_at is None
+                        else TemplateDefinition.n8n_updated_at == fetched_updated_at
+                    )
+                )
+                dropped += result.rowcount
+                # The next fetch has to reach n8n, not this process's lookup cache
+                n8n.invalidate(n8n_workflow_id)
+            await db.commit()
+        return dropped
+
+workflow_sync = WorkflowSync()
+
+class WorkflowSyncReport(BaseModel):
+    finished_at: datetime
+    workflows: int
+    n8n_workflows: int
+    activated: int
+    deactivated: int
+    missing_in_n8n: List[int]
+    orphaned_in_n8n: List[str]
+    stale_template_definitions: int
+
+@router.post("/workflow-sync/", response_model=WorkflowSyncReport)
+async def run_workflow_sync(current_user = Depends(get_current_admin_user)):
+    """Run a sweep now instead of waiting for the next interval"""
+    if not await workflow_sync.acquire():
+        raise HTTPException(status_code=409, detail="Another instance is running the workflow sync")
+    return await workflow_sync.sync()
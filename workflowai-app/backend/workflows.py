@@ -1,15 +1,18 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict
-from models import Workflow, ExecutionLog
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, List, Literal, Optional, Dict
+from models import Workflow, ExecutionLog, TERMINAL_EXECUTION_STATUSES
+from database import get_async_db
 from auth import get_current_active_user
 from pydantic import BaseModel, Field
-from n8n_service import N8NService
+from n8n_service import n8n
+from execution_queue import execution_queue
+from config import WORKFLOW_BULK_CONCURRENCY, WORKFLOW_BULK_MAX
 from datetime import datetime
 
 router = APIRouter()
-n8n = N8NService()
 
 class WorkflowBase(BaseModel):
     name: str
@@ -38,7 +41,7 @@ class WorkflowResponse(BaseModel):
 
 class ExecutionLogCreate(BaseModel):
     status: str
-    details: Optional[str] = None
+    details: Optional[Any] = None
 
 class ExecutionLogResponse(BaseModel):
     id: int
@@ -46,52 +49,59 @@ class ExecutionLogResponse(BaseModel):
     user_id: int
     status: str
     execution_time: datetime
-    details: Optional[str] = None
+    n8n_execution_id: Optional[str] = None
+    details: Optional[Any] = None
+    last_synced_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
 
-@router.post("/workflows/", response_model=WorkflowResponse)
-async def create_workflow(workflow: WorkflowCreate, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
+async def create_owned_workflow(db: AsyncSession, owner_id: int, name: str, description: str, definition: Dict) -> Workflow:
+    """Create the workflow in n8n from `definition` (nodes, connections, ...), then our record"""
+    n8n_workflow = await n8n.create_workflow({"name": name, **definition})
     try:
-        # Create workflow in n8n
-        n8n_workflow = n8n.create_workflow({
-            "name": workflow.name,
-            "nodes": workflow.workflow_data.get("nodes", []),
-            "connections": workflow.workflow_data.get("connections", {})
-        })
-        
-        # Create workflow in our database
         db_workflow = Workflow(
-            name=workflow.name,
-            description=workflow.description,
+            name=name,
+            description=description,
             n8n_workflow_id=n8n_workflow["id"],
-            owner_id=current_user.id
+            owner_id=owner_id
         )
         db.add(db_workflow)
-        db.commit()
-        db.refresh(db_workflow)
+        await db.commit()
+        await db.refresh(db_workflow)
         return db_workflow
-    except Exception as e:
+    except Exception:
         # If database operation fails, try to clean up n8n workflow
-        if "n8n_workflow" in locals():
-            try:
-                n8n.delete_workflow(n8n_workflow["id"])
-            except:
-                pass
+        try:
+            await n8n.delete_workflow(n8n_workflow["id"])
+        except Exception:
+            pass
+        raise
+
+@router.post("/workflows/", response_model=WorkflowResponse)
+async def create_workflow(workflow: WorkflowCreate, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_active_user)):
+    try:
+        return await create_owned_workflow(db, current_user.id, workflow.name, workflow.description, {
+            "nodes": workflow.workflow_data.get("nodes", []),
+            "connections": workflow.workflow_data.get("connections", {})
+        })
+    except HTTPException:
+        # n8n unavailable (503), timed out (504) or failed (502)
+        raise
+    except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create workflow: {str(e)}"
         )
 
 @router.get("/workflows/", response_model=List[WorkflowResponse])
-def read_workflows(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
-    workflows = db.query(Workflow).filter(Workflow.owner_id == current_user.id).offset(skip).limit(limit).all()
+async def read_workflows(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_active_user)):
+    workflows = (await db.scalars(select(Workflow).where(Workflow.owner_id == current_user.id).offset(skip).limit(limit))).all()
     return workflows
 
 @router.get("/workflows/{workflow_id}", response_model=WorkflowResponse)
-async def read_workflow(workflow_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+async def read_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_active_user)):
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     return workflow
@@ -100,18 +110,18 @@ async def read_workflow(workflow_id: int, db: Session = Depends(get_db), current
 async def update_workflow(
     workflow_id: int,
     workflow_update: WorkflowUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     # Get the workflow
-    db_workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+    db_workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if db_workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
 
     try:
         # Update n8n workflow if workflow_data is provided
         if workflow_update.workflow_data:
-            n8n.update_workflow(db_workflow.n8n_workflow_id, {
+            await n8n.update_workflow(db_workflow.n8n_workflow_id, {
                 "name": workflow_update.name or db_workflow.name,
                 "nodes": workflow_update.workflow_data.get("nodes", []),
                 "connections": workflow_update.workflow_data.get("connections", {})
@@ -125,134 +135,237 @@ async def update_workflow(
         if workflow_update.is_active is not None:
             db_workflow.is_active = workflow_update.is_active
             if workflow_update.is_active:
-                n8n.activate_workflow(db_workflow.n8n_workflow_id)
+                await n8n.activate_workflow(db_workflow.n8n_workflow_id)
             else:
-                n8n.deactivate_workflow(db_workflow.n8n_workflow_id)
+                await n8n.deactivate_workflow(db_workflow.n8n_workflow_id)
 
-        db.commit()
-        db.refresh(db_workflow)
+        await db.commit()
+        await db.refresh(db_workflow)
         return db_workflow
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update workflow: {str(e)}")
 
 @router.delete("/workflows/{workflow_id}")
-async def delete_workflow(workflow_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+async def delete_workflow(workflow_id: int, db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_active_user)):
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
 
     try:
         # Delete from n8n first
-        n8n.delete_workflow(workflow.n8n_workflow_id)
-        # Then delete from our database
-        db.delete(workflow)
-        db.commit()
+        await n8n.delete_workflow(workflow.n8n_workflow_id)
+        # Then delete from our database, with its queued and finished jobs
+        await execution_queue.discard(db, [workflow.id])
+        await db.delete(workflow)
+        await db.commit()
         return {"message": "Workflow deleted successfully"}
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete workflow: {str(e)}")
 
-@router.post("/workflows/{workflow_id}/execute")
+@router.post("/workflows/{workflow_id}/execute", status_code=status.HTTP_202_ACCEPTED)
 async def execute_workflow(
     workflow_id: int,
     execution_data: Dict = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
 
     try:
-        # Execute workflow in n8n
-        execution = n8n.execute_workflow(workflow.n8n_workflow_id, execution_data)
-        
-        # Log the execution
-        log = ExecutionLog(
-            workflow_id=workflow.id,
-            user_id=current_user.id,
-            status="started",
-            details=str(execution)
-        )
-        db.add(log)
-        db.commit()
-        
-        return {
-            "message": "Workflow execution started",
-            "execution_id": execution.get("id"),
-            "log_id": log.id
-        }
+        # Queue the run; the execution workers hand it to n8n
+        log = await execution_queue.enqueue(db, workflow, current_user.id, execution_data)
+        log_id = log.id
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to queue workflow execution: {str(e)}")
+
+    execution_queue.notify()
+    return {
+        "message": "Workflow execution queued",
+        "status": "queued",
+        "log_id": log_id
+    }
+
+class BulkWorkflowRequest(BaseModel):
+    action: Literal["activate", "deactivate", "delete", "execute"]
+    workflow_ids: List[int]
+    execution_data: Optional[Dict] = None  # input of every run, for "execute"
+
+class BulkWorkflowResult(BaseModel):
+    workflow_id: int
+    ok: bool
+    status_code: int
+    detail: Optional[str] = None
+    log_id: Optional[int] = None
+
+class BulkWorkflowResponse(BaseModel):
+    action: str
+    succeeded: int
+    failed: int
+    results: List[BulkWorkflowResult]
+
+async def _n8n_fan_out(call, workflows: List[Workflow]) -> Dict[int, HTTPException]:
+    """Run `call` on the n8n id of every workflow, WORKFLOW_BULK_CONCURRENCY at a time.
+    Returns the error of each workflow whose call failed."""
+    semaphore = asyncio.Semaphore(WORKFLOW_BULK_CONCURRENCY)
+    errors: Dict[int, HTTPException] = {}
+
+    async def run(workflow: Workflow) -> None:
+        async with semaphore:
+            try:
+                await call(workflow.n8n_workflow_id)
+            except HTTPException as e:
+                errors[workflow.id] = e
+            except Exception as e:
+                errors[workflow.id] = HTTPException(status_code=502, detail=f"Error communicating with n8n: {str(e)}")
+
+    await asyncio.gather(*[run(workflow) for workflow in workflows])
+    return errors
+
+async def _apply_bulk(
+    db: AsyncSession,
+    user_id: int,
+    action: str,
+    workflow_ids: List[int],
+    owned: Dict[int, Workflow],
+    execution_data: Optional[Dict] = None
+) -> Dict:
+    """Apply `action` to the owned workflows and commit every change at once
+    (deletes are isolated from each other by savepoints)"""
+    results = {
+        workflow_id: {"workflow_id": workflow_id, "ok": False, "status_code": 404, "detail": "Workflow not found"}
+        for workflow_id in workflow_ids
+        if workflow_id not in owned
+    }
+    workflows = list(owned.values())
+
+    if action == "execute":
+        logs = await execution_queue.enqueue_many(db, [(workflow.id, user_id, execution_data) for workflow in workflows])
+        for workflow, log in zip(workflows, logs):
+            results[workflow.id] = {"workflow_id": workflow.id, "ok": True, "status_code": 202, "log_id": log.id}
+    else:
+        call = {
+            "activate": n8n.activate_workflow,
+            "deactivate": n8n.deactivate_workflow,
+            "delete": n8n.delete_workflow
+        }[action]
+        errors = await _n8n_fan_out(call, workflows)
+        for workflow in workflows:
+            error = errors.get(workflow.id)
+            if error is not None:
+                results[workflow.id] = {
+                    "workflow_id": workflow.id, "ok": False, "status_code": error.status_code, "detail": error.detail
+                }
+                continue
+            if action == "delete":
+                # One savepoint per workflow, so a row that can't be deleted doesn't take the batch with it
+                try:
+                    async with db.begin_nested():
+                        await execution_queue.discard(db, [workflow.id])
+                        await db.delete(workflow)
+                except Exception as e:
+                    results[workflow.id] = {
+                        "workflow_id": workflow.id, "ok": False, "status_code": 500,
+                        "detail": f"Failed to delete workflow: {str(e)}"
+                    }
+                    continue
+            else:
+                workflow.is_active = action == "activate"
+            results[workflow.id] = {"workflow_id": workflow.id, "ok": True, "status_code": 200}
+
+    try:
+        await db.commit()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to execute workflow: {str(e)}")
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to save bulk {action}: {str(e)}")
+    if action == "execute" and workflows:
+        execution_queue.notify()
+
+    ordered = [results[workflow_id] for workflow_id in workflow_ids]
+    succeeded = sum(result["ok"] for result in ordered)
+    return {"action": action, "succeeded": succeeded, "failed": len(ordered) - succeeded, "results": ordered}
+
+@router.post("/workflows/bulk", response_model=BulkWorkflowResponse)
+async def bulk_workflows(
+    request: BulkWorkflowRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Activate, deactivate, delete or execute many workflows in one request.
+
+    Always 200: each id gets its own result, with the status code the
+    single-workflow endpoint would have returned.
+    """
+    workflow_ids = list(dict.fromkeys(request.workflow_ids))
+    if len(workflow_ids) > WORKFLOW_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {WORKFLOW_BULK_MAX} workflows per request")
+    owned = {}
+    if workflow_ids:
+        owned = {workflow.id: workflow for workflow in (await db.scalars(
+            select(Workflow).where(Workflow.owner_id == current_user.id, Workflow.id.in_(workflow_ids))
+        )).all()}
+    return await _apply_bulk(db, current_user.id, request.action, workflow_ids, owned, request.execution_data)
+
+@router.post("/workflows/pause-all", response_model=BulkWorkflowResponse)
+async def pause_all_workflows(db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_active_user)):
+    """Deactivate every active workflow of the current user"""
+    workflows = (await db.scalars(
+        select(Workflow).where(Workflow.owner_id == current_user.id, Workflow.is_active.isnot(False))
+    )).all()
+    owned = {workflow.id: workflow for workflow in workflows}
+    return await _apply_bulk(db, current_user.id, "deactivate", list(owned), owned)
 
 @router.get("/workflows/{workflow_id}/executions", response_model=List[ExecutionLogResponse])
 async def get_workflow_executions(
     workflow_id: int,
     limit: int = 20,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
 
-    try:
-        # Get executions from both n8n and our database
-        n8n_executions = n8n.get_workflow_executions(workflow.n8n_workflow_id, limit)
-        
-        # Get execution logs from our database
-        db_logs = db.query(ExecutionLog).filter(
-            ExecutionLog.workflow_id == workflow_id,
-            ExecutionLog.user_id == current_user.id
-        ).order_by(ExecutionLog.execution_time.desc()).limit(limit).all()
-        
-        # Update execution logs with n8n status if available
-        for log in db_logs:
-            for n8n_exec in n8n_executions:
-                if str(n8n_exec.get("id")) in log.details:
-                    log.status = n8n_exec.get("status", log.status)
-                    log.details = str(n8n_exec)
-                    db.add(log)
-        
-        db.commit()
-        return db_logs
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get workflow executions: {str(e)}")
+    # Statuses are kept fresh by the background reconciler, so this is a plain DB read
+    db_logs = (await db.scalars(select(ExecutionLog).where(
+        ExecutionLog.workflow_id == workflow_id,
+        ExecutionLog.user_id == current_user.id
+    ).order_by(ExecutionLog.execution_time.desc()).limit(limit))).all()
+    return db_logs
 
 @router.get("/workflows/{workflow_id}/executions/{execution_id}", response_model=ExecutionLogResponse)
 async def get_execution_details(
     workflow_id: int,
     execution_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     # Check if workflow exists and belongs to user
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
     # Get execution log
-    execution = db.query(ExecutionLog).filter(
+    execution = await db.scalar(select(ExecutionLog).where(
         ExecutionLog.id == execution_id,
         ExecutionLog.workflow_id == workflow_id,
         ExecutionLog.user_id == current_user.id
-    ).first()
+    ))
     
     if execution is None:
         raise HTTPException(status_code=404, detail="Execution log not found")
     
-    try:
-        # Try to get updated status from n8n
-        n8n_execution = n8n.get_execution_data(execution.details.get("id"))
-        if n8n_execution:
-            execution.status = n8n_execution.get("status", execution.status)
-            execution.details = str(n8n_execution)
-            db.add(execution)
-            db.commit()
-    except:
-        pass  # If n8n data can't be fetched, return existing log data
-    
     return execution
 
 @router.post("/workflows/{workflow_id}/executions/{execution_id}", response_model=ExecutionLogResponse)
@@ -260,20 +373,20 @@ async def update_execution_status(
     workflow_id: int,
     execution_id: int,
     log_update: ExecutionLogCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     # Check if workflow exists and belongs to user
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
+    workflow = await db.scalar(select(Workflow).where(Workflow.id == workflow_id, Workflow.owner_id == current_user.id))
     if workflow is None:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
     # Get execution log
-    execution = db.query(ExecutionLog).filter(
+    execution = await db.scalar(select(ExecutionLog).where(
         ExecutionLog.id == execution_id,
         ExecutionLog.workflow_id == workflow_id,
         ExecutionLog.user_id == current_user.id
-    ).first()
+    ))
     
     if execution is None:
         raise HTTPException(status_code=404, detail="Execution log not found")
@@ -282,40 +395,11 @@ async def update_execution_status(
     execution.status = log_update.status
     if log_update.details:
         execution.details = log_update.details
+    if execution.status in TERMINAL_EXECUTION_STATUSES:
+        execution.next_sync_at = None
     
     db.add(execution)
-    db.commit()
-    db.refresh(execution)
+    await db.commit()
+    await db.refresh(execution)
     
     return execution
-def read_workflow(workflow_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
-    if workflow is None:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    return workflow
-
-@router.put("/workflows/{workflow_id}", response_model=WorkflowResponse)
-def update_workflow(workflow_id: int, workflow: WorkflowUpdate, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
-    db_workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
-    if db_workflow is None:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    
-    if workflow.name is not None:
-        db_workflow.name = workflow.name
-    if workflow.description is not None:
-        db_workflow.description = workflow.description
-    if workflow.is_active is not None:
-        db_workflow.is_active = workflow.is_active
-    
-    db.commit()
-    db.refresh(db_workflow)
-    return db_workflow
-
-@router.delete("/workflows/{workflow_id}")
-def delete_workflow(workflow_id: int, db: Session = Depends(get_db), current_user = Depends(get_current_active_user)):
-    workflow = db.query(Workflow).filter(Workflow.id == workflow_id, Workflow.owner_id == current_user.id).first()
-    if workflow is None:
-        raise HTTPException(status_code=404, detail="Workflow not found")
-    db.delete(workflow)
-    db.commit()
-    return {"message": "Workflow deleted successfully"}
\ No newline at end of file
@@ -74,10 +74,27 @@ document.addEventListener('DOMContentLoaded', async function() {
         }, 1000);
     }
     
-    // Load execution logs
+    // Load execution logs, then keep them current from the live stream
     loadLogs();
+    subscribeToExecutions();
 });
 
+// Reload the logs when the server pushes an update for this workflow
+function subscribeToExecutions() {
+    if (!workflowId || !window.EventSource) return;
+    let pending = null;
+    const refresh = () => {
+        // Coalesce bursts of events into one reload
+        clearTimeout(pending);
+        pending = setTimeout(loadLogs, 500);
+    };
+    const source = new EventSource(`${CONFIG.API_BASE_URL}/api/executions/stream`, { withCredentials: true });
+    source.addEventListener('execution', event => {
+        if (String(JSON.parse(event.data).workflow_id) === String(workflowId)) refresh();
+    });
+    source.addEventListener('resync', refresh);
+}
+
 // Set up tab switching functionality
 function setupTabs() {
     document.querySelectorAll('.workflow-tab').forEach(tab => {
@@ -372,7 +389,10 @@ function showAlert(message, type) {
 // Load execution logs
 async function loadLogs() {
     try {
-        const response = await fetch(`${CONFIG.API_BASE_URL}/api/logs/`, {
+        // The API filters by workflow and returns the newest logs first
+        const params = new URLSearchParams({ limit: 10 });
+        if (workflowId) params.set('workflow_id', workflowId);
+        const response = await fetch(`${CONFIG.API_BASE_URL}/api/logs/?${params}`, {
             credentials: 'include'  // This will include cookies with the request
         });
         
@@ -391,18 +411,18 @@ async function loadLogs() {
     }
 }
 
+// Format log details, which the API returns as JSON
+function formatLogDetails(details) {
+    if (details === null || details === undefined || details === '') return 'No details provided';
+    return typeof details === 'string' ? details : JSON.stringify(details);
+}
+
 // Render logs in the execution logs container
 function renderLogs(logs) {
     const logsContainer = document.querySelector('.execution-logs');
     if (!logsContainer) return;
     
-    // Filter logs for this specific workflow if we have a workflowId
-    let filteredLogs = logs;
-    if (workflowId) {
-        filteredLogs = logs.filter(log => log.workflow_id == workflowId);
-    }
-    
-    if (filteredLogs.length === 0) {
+    if (logs.length === 0) {
         logsContainer.innerHTML = `
             <div class="log-entry">
                 <span class="log-timestamp">${new Date().toLocaleString()}</span>
@@ -413,13 +433,7 @@ function renderLogs(logs) {
         return;
     }
     
-    // Sort logs by ID (newest first)
-    filteredLogs.sort((a, b) => b.id - a.id);
-    
-    // Limit to 10 most recent logs
-    const recentLogs = filteredLogs.slice(0, 10);
-    
-    logsContainer.innerHTML = recentLogs.map(log => {
+    logsContainer.innerHTML = logs.map(log => {
         const statusClass = log.status === 'success' ? 'log-success' : 
                            log.status === 'error' ? 'log-error' : 'log-warning';
         const statusIcon = log.status === 'success' ? 'check-circle' : 
@@ -429,7 +443,7 @@ function renderLogs(logs) {
             <div class="log-entry">
                 <span class="log-timestamp">${log.execution_time || new Date().toLocaleString()}</span>
                 <i class="fas fa-${statusIcon} ${statusClass}"></i>
-                <span>${log.details || 'No details provided'}</span>
+                <span>${formatLogDetails(log.details)}</span>
             </div>
         `;
     }).join('');
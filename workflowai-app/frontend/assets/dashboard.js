@@ -43,6 +43,21 @@ async function loadDashboardContent() {
     console.log('Loading dashboard content...');
     await loadWorkflows();
     await loadStats();
+    subscribeToExecutions();
+}
+
+// Refresh the counters when the server pushes an execution update, instead of polling
+function subscribeToExecutions() {
+    if (!window.EventSource) return;
+    let pending = null;
+    const refresh = () => {
+        // Coalesce bursts of events into one reload
+        clearTimeout(pending);
+        pending = setTimeout(loadStats, 500);
+    };
+    const source = new EventSource(`${CONFIG.API_BASE_URL}/api/executions/stream`, { withCredentials: true });
+    source.addEventListener('execution', refresh);
+    source.addEventListener('resync', refresh);
 }
 
 // Main initialization function
@@ -301,12 +316,11 @@ async function loadStats() {
         });
 
         if (response.ok) {
-            const workflows = await response.json();
-            const totalWorkflows = workflows.length;
-            const activeWorkflows = workflows.filter(w => w.is_active).length;
-            document.getElementById('totalWorkflows').textContent = totalWorkflows;
-            document.getElementById('activeWorkflows').textContent = activeWorkflows;
-            document.getElementById('executionsToday').textContent = '0'; // Placeholder
+            // Counters are maintained by the backend; nothing to aggregate here
+            const stats = await response.json();
+            document.getElementById('totalWorkflows').textContent = stats.total_workflows;
+            document.getElementById('activeWorkflows').textContent = stats.active_workflows;
+            document.getElementById('executionsToday').textContent = stats.executions_today;
         }
     } catch (error) {
         console.error('Error loading stats:', error);
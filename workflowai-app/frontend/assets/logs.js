@@ -36,6 +36,12 @@ async function loadLogs() {
     }
 }
 
+// Format log details, which the API returns as JSON
+function formatLogDetails(details) {
+    if (details === null || details === undefined || details === '') return 'No details provided';
+    return typeof details === 'string' ? details : JSON.stringify(details);
+}
+
 // Function to render logs in the container
 function renderLogs(logs) {
     const container = document.getElementById('logsContainer');
@@ -69,9 +75,9 @@ function renderLogs(logs) {
                         <i class="fas fa-${statusIcon}"></i> ${log.status.charAt(0).toUpperCase() + log.status.slice(1)}
                     </span>
                 </td>
-                <td>Workflow #${log.workflow_id}</td>
+                <td>${log.workflow_id != null ? `Workflow #${log.workflow_id}` : 'Deleted workflow'}</td>
                 <td>${log.execution_time || 'N/A'}</td>
-                <td>${log.details || 'No details provided'}</td>
+                <td>${formatLogDetails(log.details)}</td>
             </tr>
         `;
     }).join('');
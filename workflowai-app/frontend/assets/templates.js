@@ -3,6 +3,13 @@ document.addEventListener('DOMContentLoaded', function() {
     // Authentication is now handled via cookies
     // No need to check localStorage for token
     loadTemplates();
+
+    const searchBtn = document.getElementById('searchTemplatesBtn');
+    if (searchBtn) searchBtn.addEventListener('click', loadTemplates);
+    const searchInput = document.getElementById('templateSearch');
+    if (searchInput) searchInput.addEventListener('keydown', e => { if (e.key === 'Enter') loadTemplates(); });
+    const categoryFilter = document.getElementById('categoryFilter');
+    if (categoryFilter) categoryFilter.addEventListener('change', loadTemplates);
 });
 
 // Load templates from backend
@@ -16,8 +23,15 @@ async function loadTemplates() {
         return;
     }
     
+    // Search and category filtering happen on the server
+    const params = new URLSearchParams();
+    const keywords = document.getElementById('templateSearch')?.value.trim();
+    const category = document.getElementById('categoryFilter')?.value;
+    if (keywords) params.set('q', keywords);
+    if (category) params.set('category', category);
+    
     try {
-        const response = await fetch(`${CONFIG.API_BASE_URL}/api/templates/`, {
+        const response = await fetch(`${CONFIG.API_BASE_URL}/api/templates/?${params}`, {
             credentials: 'include'  // Include cookies for authentication
         });
         
@@ -101,49 +115,33 @@ function previewTemplate(templateId) {
     showAlert('Template preview would open in a modal. In a real implementation, this would show template details.', 'info');
 }
 
-// Use template - create a new workflow based on this template
+// Use template - the server copies the template's n8n workflow into a new workflow
 async function useTemplate(templateId) {
-    const alert = document.getElementById('alert');
-    
     try {
-        // First, get the template details
-        const templateResponse = await fetch(`${CONFIG.API_BASE_URL}/api/templates/${templateId}`);
+        const workflowResponse = await fetch(`${CONFIG.API_BASE_URL}/api/templates/${templateId}/instantiate`, {
+            method: 'POST',
+            credentials: 'include',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({})
+        });
         
-        if (templateResponse.ok) {
-            const template = await templateResponse.json();
-            
-            // Create a new workflow based on this template
-            const workflowResponse = await fetch(`${CONFIG.API_BASE_URL}/api/workflows/`, {
-                method: 'POST',
-                credentials: 'include',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    name: `My ${template.name} Workflow`,
-                    description: template.description,
-                    n8n_workflow_id: template.n8n_workflow_id
-                })
-            });
+        if (workflowResponse.ok) {
+            const workflow = await workflowResponse.json();
+            showAlert(`Template added to your workflows as "${workflow.name}"!`, 'success');
             
-            if (workflowResponse.ok) {
-                const workflow = await workflowResponse.json();
-                showAlert(`Template "${template.name}" added to your workflows!`, 'success');
-                
-                // Optionally redirect to the new workflow
-                setTimeout(() => {
-                    window.location.href = `/builder.html?id=${workflow.id}`;
-                }, 2000);
-            } else if (workflowResponse.status === 401) {
-                // Token expired or invalid
-                // Remove access token from cookies
-                document.cookie = 'access_token=; expires=Thu, 01 Jan 1970 00:00:00 UTC; path=/;';
-                window.location.href = '/login.html';
-            } else {
-                throw new Error('Failed to create workflow from template');
-            }
+            // Optionally redirect to the new workflow
+            setTimeout(() => {
+                window.location.href = `/builder.html?id=${workflow.id}`;
+            }, 2000);
+        } else if (workflowResponse.status === 401) {
+            // Token expired or invalid
+            // Remove access token from cookies
+            document.cookie = 'access_token=; expires=Thu, 01 Jan 1970 00:00:00 UTC; path=/;';
+            window.location.href = '/login.html';
         } else {
-            throw new Error('Failed to load template');
+            throw new Error('Failed to create workflow from template');
         }
     } catch (error) {
         console.error('Error using template:', error);